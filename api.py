@@ -0,0 +1,304 @@
+"""Local HTTP JSON API over the CVS calculations, for systems that don't drive the UI.
+
+    python api.py --port 8765 --workers 4
+
+Endpoints:
+
+``POST /v1/evaluate``
+    ``{"sites": [{...}, ...], "fields": [...]}`` evaluates every site in one
+    vectorized ``engine.evaluate_sites`` call (the same math as the app and
+    ``batch.py``). A site uses the ``engine.SITE_DEFAULTS`` input names and
+    flattened header columns (``flare1_dev_3in``), or ``"headers": {"vent1":
+    [[...sizes...], ...one row per field...]}`` in the project file layout;
+    anything missing takes the app's default and ``null`` means "not given".
+    A ``control_device_model`` without ``cd_capacity`` is filled from the
+    catalog. ``site_id`` is echoed back. ``fields`` limits the results (e.g.
+    ``["total_ppivfr", "flare1_red_capacity"]``). A bare site object is
+    accepted as a batch of one. Returns ``{"results": [...]}`` in input
+    order.
+
+``GET /v1/inputs``
+    Input names and defaults, the header layout and the result names.
+
+``GET /health``
+    ``{"status": "ok"}``.
+
+The server needs nothing beyond the standard library and numpy. The parent
+process binds the port, warms the engine with one evaluation and forks
+``--workers`` processes that accept on the shared socket (a worker that dies
+is replaced). Each worker serves connections on threads with HTTP/1.1
+keep-alive. Import-time work is limited to the standard library, numpy and
+``engine``; the catalog (pandas) loads on the first request that needs it.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import engine
+import projects
+
+MAX_BODY = 16 * 1024 * 1024
+ID_FIELDS = ("site_id", "control_device_model")
+HEADER_COLUMNS = {header: engine.header_columns(header) for header in engine.HEADERS}
+INPUT_NAMES = set(engine.SITE_DEFAULTS).union(*HEADER_COLUMNS.values())
+RESULT_NAMES = []  # filled by warm()
+
+
+class RequestError(ValueError):
+    """A request the API can't evaluate; reported as 400 with its message."""
+
+
+def _float(name, value):
+    if value is None:
+        return np.nan
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise RequestError(f"{name}: expected a number, got {json.dumps(value)[:40]}")
+    try:
+        return float(value)
+    except ValueError:
+        raise RequestError(f"{name}: expected a number, got {value!r}") from None
+
+
+def site_columns(sites):
+    """Input columns (name -> array) for a list of site dicts; only the names some site gives."""
+    n = len(sites)
+    columns = {}
+    blocks = {}  # header -> ((n, fields × sizes) block, sites that gave the grid)
+    for i, site in enumerate(sites):
+        if not isinstance(site, dict):
+            raise RequestError(f"sites[{i}]: expected an object")
+        headers = site.get("headers") or {}
+        if not isinstance(headers, dict):
+            raise RequestError(f"sites[{i}].headers: expected an object of header grids")
+        for header, grid in headers.items():
+            if header not in HEADER_COLUMNS:
+                raise RequestError(f"sites[{i}].headers: unknown header {header!r}")
+            try:
+                grid = np.asarray(grid, dtype=float).reshape(len(projects.HEADER_FIELDS) * engine.N_SIZES)
+            except (TypeError, ValueError):
+                raise RequestError(f"sites[{i}].headers.{header}: expected {len(projects.HEADER_FIELDS)} rows of "
+                                   f"{engine.N_SIZES} numbers") from None
+            if header not in blocks:
+                blocks[header] = (np.zeros((n, grid.size)), np.zeros(n, dtype=bool))
+            blocks[header][0][i] = grid
+            blocks[header][1][i] = True
+        for name, value in site.items():
+            if name in ID_FIELDS or name == "headers":
+                continue
+            if name not in INPUT_NAMES:
+                raise RequestError(f"sites[{i}]: unknown input {name!r}")
+            column = columns.get(name)
+            if column is None:
+                column = columns[name] = np.full(n, engine.SITE_DEFAULTS.get(name, 0.0), dtype=float)
+            column[i] = _float(name, value)
+    for header, (block, given) in blocks.items():
+        for k, name in enumerate(HEADER_COLUMNS[header]):
+            # Where a site gave the grid it wins over flattened columns.
+            columns[name] = np.where(given, block[:, k], columns[name]) if name in columns else block[:, k]
+    _fill_from_catalog(sites, columns)
+    return columns
+
+
+def _fill_from_catalog(sites, columns):
+    wanted = [i for i, site in enumerate(sites)
+              if site.get("control_device_model") and ("cd_capacity" not in columns or
+                                                       np.isnan(columns["cd_capacity"][i]))]
+    if not wanted:
+        return
+    import catalog  # pandas; only loaded when a request names a model
+
+    devices = catalog.frame()
+    for i in wanted:
+        key = str(sites[i]["control_device_model"]).strip().lower()
+        if key not in devices.index:
+            continue
+        device = devices.loc[key]
+        for catalog_column, site_column in catalog.SITE_COLUMNS.items():
+            column = columns.get(site_column)
+            if column is None:
+                column = columns[site_column] = np.full(len(sites), engine.SITE_DEFAULTS[site_column], dtype=float)
+            if site_column == "cd_capacity" or site_column not in sites[i]:
+                column[i] = float(device[catalog_column])
+
+
+def _json_number(value):
+    return value if value == value and value not in (float("inf"), float("-inf")) else None
+
+
+def evaluate(body):
+    """Results for a parsed ``/v1/evaluate`` request body."""
+    if isinstance(body, dict) and "sites" in body:
+        sites, fields = body["sites"], body.get("fields")
+    elif isinstance(body, dict):
+        sites, fields = [body], None
+    else:
+        raise RequestError("expected an object with a \"sites\" list")
+    if not isinstance(sites, list):
+        raise RequestError("\"sites\" must be a list")
+    fields = RESULT_NAMES if fields is None else fields
+    unknown = [name for name in fields if name not in RESULT_NAMES] if isinstance(fields, list) else [fields]
+    if unknown:
+        raise RequestError(f"unknown result field(s): {', '.join(map(str, unknown))}")
+    if not sites:
+        return []
+    results = engine.evaluate_sites(site_columns(sites), len(sites))
+    # One tolist() per field, then rows: far cheaper than indexing arrays per site.
+    lists = [[_json_number(v) for v in np.broadcast_to(results[name], (len(sites),)).tolist()] for name in fields]
+    rows = [dict(zip(fields, row)) for row in zip(*lists)]
+    for site, row in zip(sites, rows):
+        if "site_id" in site:
+            row["site_id"] = site["site_id"]
+    return rows
+
+
+def inputs_info():
+    return {
+        "inputs": {name: _json_number(float(value)) for name, value in engine.SITE_DEFAULTS.items()},
+        "headers": engine.HEADERS,
+        "header_layout": {"fields": projects.HEADER_FIELDS, "sizes": engine.SIZE_SLUGS},
+        "results": RESULT_NAMES,
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so a client pays for the connection once
+    # Buffer each response into one write and send it at once (Nagle plus
+    # delayed ACK would otherwise hold the body back ~40 ms).
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    server_version = "cvs-api"
+    access_log = False
+
+    def _send(self, status, payload, started=None):
+        data = json.dumps(payload, separators=(",", ":"), allow_nan=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if started is not None:
+            self.send_header("Server-Timing", f"calc;dur={(time.perf_counter() - started) * 1000:.3f}")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "ok", "pid": os.getpid()})
+        elif self.path == "/v1/inputs":
+            self._send(200, inputs_info())
+        else:
+            self._send(404, {"error": f"no such endpoint: GET {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/v1/evaluate":
+            self._send(404, {"error": f"no such endpoint: POST {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # Without a usable length the rest of the stream can't be framed.
+            self.close_connection = True
+            self._send(400, {"error": "invalid Content-Length"})
+            return
+        if length > MAX_BODY:
+            self.close_connection = True
+            self._send(413, {"error": f"request body over {MAX_BODY} bytes"})
+            return
+        started = time.perf_counter()
+        try:
+            body = json.loads(self.rfile.read(length) or b"null")
+            self._send(200, {"results": evaluate(body)}, started)
+        except json.JSONDecodeError as exc:
+            self._send(400, {"error": f"invalid JSON: {exc}"})
+        except RequestError as exc:
+            self._send(400, {"error": str(exc)})
+        except Exception as exc:
+            traceback.print_exc()
+            self._send(500, {"error": f"internal error: {type(exc).__name__}"})
+
+    def log_message(self, format, *args):
+        if self.access_log:
+            super().log_message(format, *args)
+
+
+def warm():
+    """Do the first evaluation before forking, so workers start hot."""
+    RESULT_NAMES[:] = list(engine.evaluate_sites({}, 1))
+    evaluate({"sites": [{"oil_production": 1.0, "headers": {"flare1": np.ones((len(projects.HEADER_FIELDS),
+                                                                               engine.N_SIZES)).tolist()}}]})
+
+
+def serve(host="127.0.0.1", port=8765, workers=None, access_log=False):
+    """Serve until interrupted; ``workers`` processes (default: CPU count) share the socket."""
+    Handler.access_log = access_log
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    warm()
+    workers = workers or os.cpu_count() or 1
+    print(f"Serving on http://{host}:{server.server_address[1]} with {workers} worker(s)", file=sys.stderr)
+    if workers == 1 or not hasattr(os, "fork"):
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    def start_worker():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os._exit(0)
+        return pid
+
+    children = {start_worker() for _ in range(workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            # Replace a worker that died.
+            children.add(start_worker())
+    server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the CVS calculations as a local JSON API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--access-log", action="store_true", help="log every request to stderr")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers, args.access_log)
+
+
+if __name__ == "__main__":
+    main()
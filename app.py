@@ -1,13 +1,41 @@
 import streamlit as st
+import altair as alt
 import pandas as pd
-import math
+import numpy as np
+import functools
+import io
+import os
+import time
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from streamlit_mermaid import st_mermaid
 
+import engine
+import header_grid
+import optimizer
+import montecarlo
+import sweeps
+import scenarios
+import headroom
+import network
+import scada
+import transient
+import projects
+import reports
+import portfolio
+import promax
+import catalog
+import depgraph
+import pfd
+import stagecache
+import perf
+
 st.set_page_config(page_title="Closed Vent System Calculator", layout="wide")
+perf.start_run()
 st.title("Closed Vent System Assessment Tool")
 
 # Setup Tabs
-tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9 = st.tabs([
+(tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9, tab10, tab11, tab12, tab13, tab14, tab15, tab16,
+ tab17, *debug_tab) = st.tabs([
     "🛢 Tank Layout",
     "🌊 Main Process",
     "➕ Add to Main Process",
@@ -16,65 +44,333 @@ tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9 = st.tabs([
     "🌬 FlareVent",
     "Flare1",
     "📊 Summary of Results",
-    "📈 Process Flow Diagram"
-])
+    "📈 Process Flow Diagram",
+    "📐 Header Sizing",
+    "🎲 Uncertainty",
+    "🔀 What-If",
+    "🕸 Vent Network",
+    "📡 SCADA History",
+    "⏱ Dump Transient",
+    "🗂 Portfolio",
+    "🔁 Scenarios",
+] + (["🐞 Performance"] if perf.ENABLED else []))
+
+# -----------------------------
+# Widget state
+# -----------------------------
+# Input widgets are keyed by these names and seeded here once, so a project
+# load can set them all with one session_state update.
+PROMAX_TEXT_KEYS = {
+    "promax_flash": "promax_flash_text",
+    "promax_mw": "promax_mw_text",
+    "promax_water_flash": "promax_water_flash_text",
+    "promax_water_mw": "promax_water_mw_text",
+}
+UI_DEFAULTS = {
+    "cd_model": "Steffes SVG-3B4",
+    "tank_notes": "~ tank pressure assumed based on operator input",
+    **pfd.DEFAULTS,
+}
+WIDGET_DEFAULTS = {
+    **{name: value for name, value in engine.SITE_DEFAULTS.items() if name not in PROMAX_TEXT_KEYS},
+    **{key: "" for key in PROMAX_TEXT_KEYS.values()},
+    **UI_DEFAULTS,
+}
+for _key, _value in WIDGET_DEFAULTS.items():
+    st.session_state.setdefault(_key, _value)
+
+# Each tab (and each header panel) is an st.fragment, so an edit only reruns
+# the fragment it belongs to. Inputs that feed the graph call publish() when
+# edited: if the edit changes a value shown outside its tab (SHARED_VALUES),
+# the views of those values (SHARED_VIEWS) rerun with the edited fragment.
+# The analysis tabs read the graph when they next run.
+SHARED_VALUES = [
+    "oil_ppivfr", "water_ppivfr", "other_ppivfr", "total_ppivfr", "total_thermal_ppivfr",
+    "thief_prv_input", "design_pressure",
+    *(f"{header}_{value}" for header in engine.HEADERS for value in ("total_nps", "capacity")),
+    "flare1_le_ft", "flare1_wfittings_ft", "flare1_red_capacity", "capacity_margin",
+]
+SHARED_VIEWS = ["summary_tab", "pfd_tab"]
+
+# -----------------------------
+# Vent header inputs (shared by Tabs 4–7)
+# -----------------------------
+HEADER_COLUMN_CONFIG = {
+    label: st.column_config.NumberColumn(f"{label} Pipe", min_value=0.0, format="%.2f")
+    for label in engine.PIPE_LABELS
+}
+
+
+def header_grid_state(header):
+    """A header's inputs as one (rows × sizes) array, the session's copy of record."""
+    return st.session_state.setdefault(f"header_{header}", header_grid.empty_header_grid())
+
+
+def set_header_grid(header, grid):
+    """Replace a header's inputs from outside its editor (e.g. loading a project)."""
+    st.session_state[f"header_{header}"] = np.asarray(grid, dtype=float)
+    # A fresh editor key drops the old editor's pending edits.
+    st.session_state[f"header_rev_{header}"] = st.session_state.get(f"header_rev_{header}", 0) + 1
+
+
+def _merge_header_edits(header, editor_key, fragment):
+    edits = st.session_state[editor_key]["edited_rows"]
+    st.session_state[f"header_{header}"] = header_grid.apply_edits(header_grid_state(header), edits)
+    publish(fragment)
+
+
+def shared_values():
+    return tuple(float(value) for value in site_graph().get(*SHARED_VALUES))
+
+
+def publish(fragment):
+    """on_change for a graph input in ``fragment``: also rerun SHARED_VIEWS if the edit changed a shared value.
+
+    Otherwise it returns and only ``fragment`` reruns, as for any widget in it.
+    """
+    inputs, headers = session_inputs(st.session_state)
+    site_graph().set(**inputs, **{f"header_{header}": grid for header, grid in headers.items()})
+    values = shared_values()
+    if st.session_state.get("shared_values") != values:
+        st.session_state["shared_values"] = values
+        st.rerun([fragment, *SHARED_VIEWS])
+
+
+def site_graph():
+    """The session's calculation graph: tabs set its inputs and read derived values from it."""
+    if "graph" not in st.session_state:
+        st.session_state["graph"] = depgraph.site_graph()
+    return st.session_state["graph"]
+
+
+def header_inputs(header, fragment):
+    """Render one header as a single grid (sizes × inputs) and feed it to the graph."""
+    st.markdown("<div style='background-color:#f0f0f0; padding: 4px; border-radius: 6px'><b>Developed Length, Fittings, Knockouts / Expansions and Specialty Valves</b></div>", unsafe_allow_html=True)
+    editor_key = f"grid_{header}_{st.session_state.get(f'header_rev_{header}', 0)}"
+    st.data_editor(
+        header_grid.grid_frame(header_grid_state(header)),
+        key=editor_key,
+        column_config=HEADER_COLUMN_CONFIG,
+        num_rows="fixed",
+        height=(len(header_grid.HEADER_ROWS) + 1) * 35 + 3,
+        on_change=_merge_header_edits,
+        args=(header, editor_key, fragment),
+    )
+
+    # All eight sizes in one vectorized pass
+    graph = site_graph()
+    graph.set(**{f"header_{header}": header_grid_state(header)})
+    total_pipe, total_pipe_nps = graph.get(f"{header}_total_pipe", f"{header}_total_pipe_nps")
+    st.dataframe(header_grid.header_results_frame(total_pipe, total_pipe_nps).style.format("{:.2f}"))
+
+
+# -----------------------------
+# Project files (sidebar)
+# -----------------------------
+def session_inputs(state):
+    """The inputs and header grids in ``state`` (st.session_state, or the session's state object)."""
+    inputs = {name: state[name] if name in state else default for name, default in engine.SITE_DEFAULTS.items()}
+    inputs["promax_flash"], inputs["promax_mw"] = engine.parse_promax(
+        state["promax_flash_text"], state["promax_mw_text"])
+    inputs["promax_water_flash"], inputs["promax_water_mw"] = engine.parse_promax(
+        state["promax_water_flash_text"], state["promax_water_mw_text"])
+    headers = {header: state[f"header_{header}"] if f"header_{header}" in state else header_grid.empty_header_grid()
+               for header in engine.HEADERS}
+    return inputs, headers
+
+
+def current_project(state):
+    """The inputs, header grids and display values in ``state`` as a project dict."""
+    inputs, headers = session_inputs(state)
+    return projects.new_project(inputs, headers, {key: state[key] for key in UI_DEFAULTS},
+                                state["scenarios"] if "scenarios" in state else None)
+
+
+def _load_project(uploader_key):
+    upload = st.session_state.get(uploader_key)
+    if upload is None:
+        st.session_state["project_message"] = ("warning", "Choose a project file first.")
+        return
+    start = time.perf_counter()
+    try:
+        inputs, headers, ui = projects.loads(upload.getvalue())
+        named = projects.loads_scenarios(upload.getvalue())
+    except projects.ProjectError as exc:
+        st.session_state["project_message"] = ("error", str(exc))
+        return
+    values = {}
+    for name, value in inputs.items():
+        if name in PROMAX_TEXT_KEYS:
+            values[PROMAX_TEXT_KEYS[name]] = "" if np.isnan(value) else repr(float(value))
+        else:
+            values[name] = type(engine.SITE_DEFAULTS[name])(value)
+    for key, default in UI_DEFAULTS.items():
+        try:
+            values[key] = type(default)(ui.get(key, default))
+        except (TypeError, ValueError):
+            values[key] = default  # display-only; a bad value isn't worth refusing the file
+    st.session_state.update(values)
+    for header, grid in headers.items():
+        set_header_grid(header, grid)
+    set_scenarios(named)
+    elapsed = (time.perf_counter() - start) * 1000
+    st.session_state["project_message"] = ("success", f"Loaded {upload.name} in {elapsed:.0f} ms.")
+    st.session_state["project_loaded"] = True
+
+
+@functools.lru_cache(maxsize=16)
+def project_report(project_text, fmt):
+    """A report of the project, cached by its JSON so repeated downloads render it once."""
+    inputs, headers, ui = projects.loads(project_text)
+    return reports.render(inputs, headers, ui, fmt, "site")
+
+
+@st.fragment
+@perf.timed()
+def project_panel():
+    st.subheader("💾 Project")
+    if st.session_state.pop("project_loaded", False):
+        # The load came from this fragment; rerun the whole app so every tab shows it.
+        st.rerun()
+    # Built on click, so an edit in a tab needs no rerun here. The data runs
+    # on another thread, where st.session_state isn't available; the
+    # session's state object is.
+    state = get_script_run_ctx().session_state
+    st.download_button("Save project", lambda: projects.dumps(current_project(state)),
+                       file_name=f"site{projects.SUFFIX}", mime="application/json")
+    st.download_button("Report (PDF)", lambda: project_report(projects.dumps(current_project(state)), "pdf"),
+                       file_name="site.pdf", mime="application/pdf")
+    st.download_button("Report (XLSX)", lambda: project_report(projects.dumps(current_project(state)), "xlsx"),
+                       file_name="site.xlsx",
+                       mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    st.file_uploader("Project file", type=["json"], key="project_upload")
+    st.button("Load project", on_click=_load_project, args=("project_upload",))
+    if "project_message" in st.session_state:
+        kind, text = st.session_state["project_message"]
+        getattr(st, kind)(text)
+
+
+def summary_totals():
+    """Total PPIVFR and design pressure from the graph (Tab 1's design pressure, clamped at 0)."""
+    total_ppivfr, design_pressure = site_graph().get("total_ppivfr", "design_pressure")
+    return float(total_ppivfr), float(design_pressure)
+
+
+def header_summary(header):
+    """Total 3" NPS length and capacity of a header as plain floats."""
+    total_nps_sum, capacity = site_graph().get(f"{header}_total_nps", f"{header}_capacity")
+    return float(total_nps_sum), float(capacity)
+
 
 # -----------------------------
 # Tab 1: Tank Layout
 # -----------------------------
-with tab1:
+@st.fragment(key="tank_layout_tab")
+@perf.timed()
+def tank_layout_tab():
     st.header("Tank Layout")
 
     st.subheader("Oil & Water Tank Setup")
     col1, col2 = st.columns(2)
     with col1:
-        oil_tank_qty = st.number_input("Oil Tank Quantity", min_value=0, value=7)
-        oil_tank_size = st.selectbox("Oil Tank Size (bbl)", options=[210, 300, 400, 500, 750, 1000], index=3)
-        oil_tank_rating = st.number_input("Lowest Oil Tank Rating (oz)", min_value=0.0, value=16.0)
-
-        oil_scfh = oil_tank_qty * oil_tank_size if oil_tank_qty else 0
+        oil_tank_qty = st.number_input("Oil Tank Quantity", min_value=0, key="oil_tank_qty",
+                                       on_change=publish, args=("tank_layout_tab",))
+        oil_tank_size = st.selectbox("Oil Tank Size (bbl)", options=engine.TANK_SIZES, key="oil_tank_size",
+                                     on_change=publish, args=("tank_layout_tab",))
+        oil_tank_rating = st.number_input("Lowest Oil Tank Rating (oz)", min_value=0.0, key="oil_tank_rating")
+
+        graph = site_graph()
+        graph.set(oil_tank_qty=oil_tank_qty, oil_tank_size=oil_tank_size)
+        oil_scfh = int(graph["oil_tank_scfh"])
         st.markdown("#### Oil SCFH")
         st.metric("Oil Tanks SCFH", f"{oil_scfh}")
 
     with col2:
-        water_tank_qty = st.number_input("Water Tank Quantity", min_value=0, value=4)
-        water_tank_size = st.selectbox("Water Tank Size (bbl)", options=[210, 300, 400, 500, 750, 1000], index=3)
-        water_tank_rating = st.number_input("Lowest Water Tank Rating (oz)", min_value=0.0, value=16.0)
-
-        water_scfh = water_tank_size * 0.6 * water_tank_qty if water_tank_qty else 0
+        water_tank_qty = st.number_input("Water Tank Quantity", min_value=0, key="water_tank_qty",
+                                         on_change=publish, args=("tank_layout_tab",))
+        water_tank_size = st.selectbox("Water Tank Size (bbl)", options=engine.TANK_SIZES, key="water_tank_size",
+                                       on_change=publish, args=("tank_layout_tab",))
+        water_tank_rating = st.number_input("Lowest Water Tank Rating (oz)", min_value=0.0, key="water_tank_rating")
+
+        graph.set(water_tank_qty=water_tank_qty, water_tank_size=water_tank_size)
+        water_scfh = float(graph["water_tank_scfh"])
         st.markdown("#### Water SCFH")
         st.metric("Water Tanks SCFH", f"{water_scfh}")
 
     # Total PPIVFR row below both
-    total_thermal_ppivfr = (oil_scfh + water_scfh) * 24 / 1_000_000
+    total_thermal_ppivfr = float(graph["total_thermal_ppivfr"])
     st.markdown("#### Total Thermal PPIVFR")
     st.metric("Total Thermal PPIVFR", f"{total_thermal_ppivfr:.5f} mmscfd")
-    st.session_state["total_thermal_ppivfr"] = total_thermal_ppivfr
 
     st.markdown("### Pressure Inputs")
     col3, col4 = st.columns(2)
     with col3:
-        thief_prv_input = st.number_input("Minimum Thief Hatch/PRV (osig)", min_value=0.0, value=8.0)
-        st.session_state["thief_prv_input"] = thief_prv_input
+        thief_prv_input = st.number_input("Minimum Thief Hatch/PRV (osig)", min_value=0.0, key="thief_prv_input",
+                                          on_change=publish, args=("tank_layout_tab",))
     with col4:
-        leaking_safety = st.number_input("Leaking Safety Factor (osig)", min_value=0.0, value=2.0)
-        st.session_state["leaking_safety"] = leaking_safety
+        leaking_safety = st.number_input("Leaking Safety Factor (osig)", min_value=0.0, key="leaking_safety",
+                                         on_change=publish, args=("tank_layout_tab",))
 
-    design_pressure = (thief_prv_input - leaking_safety) * 0.9
+    graph.set(thief_prv_input=thief_prv_input, leaking_safety=leaking_safety)
+    design_pressure = float(graph["design_pressure_unclamped"])
     st.metric("Design Pressure", f"{design_pressure:.2f} osig")
 
     if design_pressure < 0:
         st.warning("⚠️ Leaking Safety Factor is greater than PRV — design pressure may be invalid.")
 
     st.markdown("### Notes")
-    st.text_area("Assumptions / Observations", "~ tank pressure assumed based on operator input", height=80)
+    st.text_area("Assumptions / Observations", height=80, key="tank_notes")
+
+
+with tab1:
+    tank_layout_tab()
 
 
 # -----------------------------
 # Tab 2: Main Process
 # -----------------------------
-with tab2:
+def _pick_promax_site(directory):
+    streams = promax.shared(directory).lookup(st.session_state["promax_site"] or "")
+    values = {}
+    for (stream, field), name in promax.SITE_COLUMNS.items():
+        value = streams.get(stream, {}).get(field, np.nan)
+        values[PROMAX_TEXT_KEYS[name]] = "" if np.isnan(value) else repr(float(value))
+    # Runs before the rerun, so the PROMAX inputs below render with the site's values.
+    st.session_state.update(values)
+    publish("main_process_tab")
+
+
+def promax_import():
+    """Fill the PROMAX inputs from a site's entry in a directory of PROMAX exports."""
+    with st.expander("Import from PROMAX exports"):
+        c1, c2 = st.columns([2, 1])
+        with c1:
+            directory = st.text_input("PROMAX Export Folder", value=os.environ.get("CVS_PROMAX_DIR", ""),
+                                      key="promax_dir")
+        if not directory or not os.path.isdir(directory):
+            st.caption("Point this at a folder of PROMAX exports (see README) to look sites up by ID.")
+            return
+        index = promax.shared(directory)
+        with c2:
+            st.write("")
+            if st.button("Rescan Folder", key="promax_rescan"):
+                counts = index.refresh()
+                st.toast(f"{counts['parsed']:,} parsed, {counts['unchanged']:,} unchanged, "
+                         f"{counts['removed']:,} removed, {counts['errors']:,} failed")
+        site = st.selectbox(f"Site ({len(index.sites()):,} indexed)", index.sites(), index=None, key="promax_site",
+                            placeholder="Pick a site to fill the PROMAX inputs", on_change=_pick_promax_site,
+                            args=(directory,))
+        for stream, record in sorted(index.lookup(site).items() if site else []):
+            st.caption(f"{stream.title()}: {os.path.basename(record['path'])}")
+            if record["composition"]:
+                st.dataframe(pd.Series(record["composition"], name="mol %").to_frame(), height=180)
+
+
+@st.fragment(key="main_process_tab")
+@perf.timed()
+def main_process_tab():
     st.header("Main Process – Oil & Water PPIVFR (Surge Adjusted)")
+    promax_import()
     oil_col, water_col = st.columns(2)
 
     # -----------------------------
@@ -82,303 +378,122 @@ with tab2:
     # -----------------------------
     with oil_col:
         st.subheader("Oil Section")
-        oil_production = st.number_input("Oil Production (bbl/day)", min_value=0.0, value=350.0)
-        oil_pressure = st.number_input("Oil Pressure - Last Stage (psig)", min_value=0.0, value=5.0)
-        surge_percent = st.number_input("Surge Percent (%)", min_value=0.0, value=30.0)
-        promax_flash = st.text_input("PROMAX Flash (SCF/BBL) [optional]", value="")
-        promax_mw = st.text_input("PROMAX Vapor MW [optional]", value="")
-
-        base_flash = 12.0
-        default_mw = 28.97
-        default_vapor_mw = 46.0
-
-        try:
-            promax_flash_val = float(promax_flash)
-            promax_mw_val = float(promax_mw) if promax_mw else default_vapor_mw
-            flash_working = (base_flash + promax_flash_val) * math.sqrt(promax_mw_val / default_mw)
-            flash_source = "PROMAX"
-        except:
-            flash_working = (base_flash + oil_pressure * 1.15 * 1.5) * math.sqrt(default_vapor_mw / default_mw)
-            flash_source = "Pressure-based"
-
-        oil_flowrate = oil_production / 34.2
-        adjusted_bbl_per_day = ((oil_flowrate * surge_percent / 100) + oil_flowrate) * 34.2
-        oil_ppivfr = flash_working * adjusted_bbl_per_day / 1_000_000
+        oil_production = st.number_input("Oil Production (bbl/day)", min_value=0.0, key="oil_production",
+                                         on_change=publish, args=("main_process_tab",))
+        oil_pressure = st.number_input("Oil Pressure - Last Stage (psig)", min_value=0.0, key="oil_pressure",
+                                       on_change=publish, args=("main_process_tab",))
+        surge_percent = st.number_input("Surge Percent (%)", min_value=0.0, key="surge_percent",
+                                        on_change=publish, args=("main_process_tab",))
+        promax_flash = st.text_input("PROMAX Flash (SCF/BBL) [optional]", key="promax_flash_text",
+                                     on_change=publish, args=("main_process_tab",))
+        promax_mw = st.text_input("PROMAX Vapor MW [optional]", key="promax_mw_text",
+                                  on_change=publish, args=("main_process_tab",))
+
+        promax_flash_val, promax_mw_val = engine.parse_promax(promax_flash, promax_mw)
+        graph = site_graph()
+        graph.set(oil_production=oil_production, oil_pressure=oil_pressure, surge_percent=surge_percent,
+                  promax_flash=promax_flash_val, promax_mw=promax_mw_val)
+        flash_working = float(graph["flash_working"])
+        flash_source = "Pressure-based" if np.isnan(promax_flash_val) else "PROMAX"
+
+        oil_flowrate = float(graph["oil_flowrate"])
+        adjusted_bbl_per_day = float(graph["oil_adjusted_bbl"])
+        oil_ppivfr = float(graph["oil_ppivfr"])
 
         st.write(f"**Flash + Working Volume (Oil)**: {flash_working:.2f} SCF/BBL ({flash_source})")
         st.write(f"**Oil Flowrate**: {oil_flowrate:.2f} GPM")
         st.write(f"**Adjusted BBL/day (with surge)**: {adjusted_bbl_per_day:.2f}")
         st.metric("Oil PPIVFR (mmscfd, SG=1)", f"{oil_ppivfr:.5f}")
-        st.session_state["oil_ppivfr"] = oil_ppivfr
+        st.session_state.update(promax_flash=promax_flash_val, promax_mw=promax_mw_val)
     # -----------------------------
     # Water Section
     # -----------------------------
     with water_col:
         st.subheader("Water Section")
-        water_production = st.number_input("Water Production (bbl/day)", min_value=0.0, value=700.0)
-        water_pressure = st.number_input("Water Pressure - First Stage (psig)", min_value=0.0, value=120.0)
-        water_surge_percent = st.number_input("Surge Percent (Water) (%)", min_value=0.0, value=30.0)
-        promax_water_flash = st.text_input("PROMAX Flash for Water (SCF/BBL) [optional]", value="")
-        promax_water_mw = st.text_input("PROMAX Vapor MW for Water [optional]", value="")
-
-        water_base_flash = 6.0
-        carryover_flash = 4.0
-        default_water_mw = 46.0
-
-        try:
-            promax_water_flash_val = float(promax_water_flash)
-            promax_water_mw_val = float(promax_water_mw) if promax_water_mw else default_water_mw
-            flash_working_water = (water_base_flash + promax_water_flash_val) * math.sqrt(promax_water_mw_val / default_mw)
-            flash_source_water = "PROMAX"
-        except:
-            flash_working_water = (water_base_flash + carryover_flash) * math.sqrt(default_water_mw / default_mw)
-            flash_source_water = "Calculated"
-
-        water_flowrate = water_production / 34.2
-        adjusted_bbl_per_day_water = ((water_flowrate * water_surge_percent / 100) + water_flowrate) * 34.2
-        water_ppivfr = flash_working_water * adjusted_bbl_per_day_water / 1_000_000
+        water_production = st.number_input("Water Production (bbl/day)", min_value=0.0, key="water_production",
+                                           on_change=publish, args=("main_process_tab",))
+        water_pressure = st.number_input("Water Pressure - First Stage (psig)", min_value=0.0, key="water_pressure")
+        water_surge_percent = st.number_input("Surge Percent (Water) (%)", min_value=0.0, key="water_surge_percent",
+                                              on_change=publish, args=("main_process_tab",))
+        promax_water_flash = st.text_input("PROMAX Flash for Water (SCF/BBL) [optional]", key="promax_water_flash_text",
+                                           on_change=publish, args=("main_process_tab",))
+        promax_water_mw = st.text_input("PROMAX Vapor MW for Water [optional]", key="promax_water_mw_text",
+                                        on_change=publish, args=("main_process_tab",))
+
+        promax_water_flash_val, promax_water_mw_val = engine.parse_promax(promax_water_flash, promax_water_mw)
+        graph.set(water_production=water_production, water_surge_percent=water_surge_percent,
+                  promax_water_flash=promax_water_flash_val, promax_water_mw=promax_water_mw_val)
+        flash_working_water = float(graph["water_flash_working"])
+        flash_source_water = "Calculated" if np.isnan(promax_water_flash_val) else "PROMAX"
+
+        water_flowrate = float(graph["water_flowrate"])
+        adjusted_bbl_per_day_water = float(graph["water_adjusted_bbl"])
+        water_ppivfr = float(graph["water_ppivfr"])
 
         st.write(f"**Flash + Working Volume (Water)**: {flash_working_water:.2f} SCF/BBL ({flash_source_water})")
         st.write(f"**Water Flowrate**: {water_flowrate:.2f} GPM")
         st.write(f"**Adjusted BBL/day (with surge)**: {adjusted_bbl_per_day_water:.2f}")
         st.metric("Water PPIVFR (mmscfd, SG=1)", f"{water_ppivfr:.5f}")
-        st.session_state["water_ppivfr"] = water_ppivfr
+        st.session_state.update(promax_water_flash=promax_water_flash_val, promax_water_mw=promax_water_mw_val)
+
+
+with tab2:
+    main_process_tab()
+
+
 # -----------------------------
 # Tab 3: Add to Main Process
 # -----------------------------
-with tab3:
+@st.fragment(key="add_to_main_process_tab")
+@perf.timed()
+def add_to_main_process_tab():
     st.header("➕ Add to Main Process")
     col1, col2, col3 = st.columns(3)
     with col1:
-        am_liq_flow = st.number_input("Liquid Flowrate (GPM)", min_value=0.0, value=0.00500, step=0.001)
+        am_liq_flow = st.number_input("Liquid Flowrate (GPM)", min_value=0.0, step=0.001, key="am_liq_flow",
+                                      on_change=publish, args=("add_to_main_process_tab",))
         
     with col2:
-        am_bp_pres = st.number_input("Liquid Bubble Point Pressure (PSIG)", min_value=0.0, value=0.00500, step=0.001)
+        am_bp_pres = st.number_input("Liquid Bubble Point Pressure (PSIG)", min_value=0.0, step=0.001, key="am_bp_pres",
+                                     on_change=publish, args=("add_to_main_process_tab",))
 
     with col3:
-        am_src_drw_tk = st.checkbox("Check box if source is drawing from tank",0)
+        am_src_drw_tk = st.checkbox("Check box if source is drawing from tank", key="am_src_drw_tk",
+                                    on_change=publish, args=("add_to_main_process_tab",))
         
     am_working = 4 # SCF/BBL   
-    if am_src_drw_tk == 1:
-        am_flash = am_bp_pres * 1.5
-    else:
-        am_flash = am_bp_pres * 0
-    
-    other_ppivfr = am_flash * am_liq_flow
+    graph = site_graph()
+    graph.set(am_liq_flow=am_liq_flow, am_bp_pres=am_bp_pres, am_src_drw_tk=am_src_drw_tk)
+    other_ppivfr = float(graph["other_ppivfr"])
     st.markdown("This section will allow you to define additional process sources that contribute to total PPIVFR (e.g., LACT, Recirc, Vapor Return).")
     st.info("🛠 Hello world")
-    st.session_state["other_ppivfr"] = other_ppivfr
-   # -----------------------------
-# Tab 4: MAIN TANK VENT
-# -----------------------------
-with tab4:
-    st.header('🌬 MAIN TANK VENT HEADER1 (Full Range)')
 
-    # --------- Summary Box ---------
-    st.subheader("Summary")
-    summary_lengths = []
-    total_nps_sum = 0
-    capacity = ""
 
-    summary_placeholder = st.empty()
-
-    id_configs = [
-        {"label": '1.5"', "id_in": 1.338},
-        {"label": '2"', "id_in": 2.067},
-        {"label": '3"', "id_in": 3.068},
-        {"label": '4"', "id_in": 4.026},
-        {"label": '6"', "id_in": 6.070},
-        {"label": '8"', "id_in": 7.981},
-        {"label": '10"', "id_in": 10.020},
-        {"label": '12"', "id_in": 11.938},
-    ]
-
-    col_sets = st.columns(len(id_configs))
-
-    for config, col in zip(id_configs, col_sets):
-        with col:
-            label = config["label"]
-            ID_in = config["id_in"]
-
-            st.markdown(f"### {label} Pipe")
-            st.markdown("<div style='background-color:#f0f0f0; padding: 4px; border-radius: 6px'><b>Developed Length</b></div>", unsafe_allow_html=True)
-            developed_length = st.number_input(f"{label} Developed Length (ft)", min_value=0.0, value=0.0, step=1.0, key=f"dev_{label}")
-
-            st.markdown("---")
-            def fitting_input(tag, multiplier):
-                qty = st.number_input(f"{label} {tag} (qty)", min_value=0, value=0, step=1, key=f"{tag}_{label}")
-                return qty * (1 / 12) * ID_in * multiplier
-
-            fittings = [
-                ("Tee, Flow thru run", 20),
-                ("Tee, Flow thru branch", 60),
-                ("Elbow, 90° Threaded", 30),
-                ("Elbow, 45° Threaded", 16),
-                ("Elbow, 90° (R/D ~3)", 14),
-                ("Elbow, 45° (R/D ~3)", 9.9),
-                ("Gate Valve", 8),
-                ("Globe Valve", 340),
-                ("Ball Valve", 3),
-                ("Butterfly Valve", 45),
-                ("Check Valve", 100),
-                ("Entrance / Exit", 1)
-            ]
-            total_le_fittings = sum(fitting_input(name, mult) for name, mult in fittings)
-
-            st.markdown("<hr style='margin-top: 20px; margin-bottom: 6px'>", unsafe_allow_html=True)
-            st.markdown(f"**{label} Knockouts / Expansions**")
-            def knockout_le(diam):
-                if diam == 0:
-                    return 0.0
-                if diam > ID_in:
-                    return (1 / 12) * ID_in * ((1 - ((ID_in**2) / (diam**2))) ** 2)
-                else:
-                    return (1 / 12) * ID_in * 0.5 * (1 - ((diam**2) / (ID_in**2)))
-
-            knockout_le_total = 0
-            for i in range(3):
-                d = st.number_input(f"{label} Knockout {i+1} Diameter (in)", min_value=0.0, value=0.0, key=f"kdiam{i}_{label}")
-                knockout_le_total += knockout_le(d)
-
-            st.markdown("<hr style='margin-top: 20px; margin-bottom: 6px'>", unsafe_allow_html=True)
-            st.markdown(f"**{label} Specialty Valves / Components**")
-            def specialty_valve_le(cv):
-                if cv == 0:
-                    return 0.0
-                numerator = 100 * 891 * (ID_in ** 5)
-                denominator = (12 * (1 + (3.6 / ID_in) + 0.03 * ID_in)) * (cv ** 2)
-                return numerator / denominator
-
-            specialty_le_total = 0
-            for i in range(3):
-                cv = st.number_input(f"{label} Specialty Valve {i+1} Cv", min_value=0.0, value=0.0, key=f"cv{i}_{label}")
-                specialty_le_total += specialty_valve_le(cv)
-
-            total_pipe = developed_length + total_le_fittings + knockout_le_total + specialty_le_total
-
-            numerator = total_pipe * (1 + (3.6 / ID_in) + (0.03 * ID_in)) * (3.068 ** 5)
-            denominator = (ID_in ** 5) * (1 + (3.6 / 3.068) + (0.03 * 3.068))
-            total_pipe_nps = numerator / denominator
+with tab3:
+    add_to_main_process_tab()
 
-            summary_lengths.append(total_pipe_nps if total_pipe_nps > 0 else 0.0)
 
-            st.metric(f"{label} Total Header Length (ft)", f"{total_pipe:.2f}")
-            st.metric(f"{label} Total Length (ft) of 3\" NPS", f"{total_pipe_nps:.2f}")
+# -----------------------------
+# Tabs 4–6: MAIN TANK VENT, MAIN TANK VENT HEADER2, FlareVent
+# -----------------------------
+def vent_header_tab(header, title):
+    """Tabs 4–6: one fragment per header, keyed so its grid's edits can rerun it by name."""
+    @st.fragment(key=f"{header}_tab")
+    @perf.timed(f"vent_header_tab[{header}]")
+    def tab():
+        vent_header(header, title)
+    tab()
 
-    total_nps_sum = sum(summary_lengths)
-    if total_nps_sum == 0:
-        capacity = ""
-    else:
-        capacity = math.sqrt((0.22437 * (3.068 ** 5)) / (total_nps_sum * (1 + (3.6 / 3.068) + (0.03 * 3.068))))
 
-    with summary_placeholder.container():
-        c1, c2 = st.columns(2)
-        with c1:
-            st.metric("Total Length (ft) of 3\" NPS", f"{total_nps_sum:.2f}")
-        with c2:
-            st.metric("Capacity (MMSCFD/SQRT(psi))", f"{capacity:.5f}" if capacity else "")
-            
-# ----------------------------- 
-# Tab 5: MAIN TANK VENT HEADER2
-# -----------------------------
-with tab5:
-    st.header('🌬 MAIN TANK VENT HEADER2 (Full Range)')
+def vent_header(header, title):
+    st.header(title)
 
+    # --------- Summary Box ---------
     st.subheader("Summary")
-    summary_lengths = []
-    total_nps_sum = 0
-    capacity = ""
-
     summary_placeholder = st.empty()
 
-    id_configs = [
-        {"label": '1.5"', "id_in": 1.338},
-        {"label": '2"', "id_in": 2.067},
-        {"label": '3"', "id_in": 3.068},
-        {"label": '4"', "id_in": 4.026},
-        {"label": '6"', "id_in": 6.070},
-        {"label": '8"', "id_in": 7.981},
-        {"label": '10"', "id_in": 10.020},
-        {"label": '12"', "id_in": 11.938},
-    ]
-
-    col_sets = st.columns(len(id_configs))
-
-    for config, col in zip(id_configs, col_sets):
-        with col:
-            label = config["label"]
-            ID_in = config["id_in"]
-
-            st.markdown(f"### {label} Pipe")
-            st.markdown("<div style='background-color:#f0f0f0; padding: 4px; border-radius: 6px'><b>Developed Length</b></div>", unsafe_allow_html=True)
-            developed_length = st.number_input(f"{label} Developed Length (ft)", min_value=0.0, value=0.0, step=1.0, key=f"dev_{label}_vent2")
-
-            st.markdown("---")
-            def fitting_input(tag, multiplier):
-                qty = st.number_input(f"{label} {tag} (qty)", min_value=0, value=0, step=1, key=f"{tag}_{label}_vent2")
-                return qty * (1 / 12) * ID_in * multiplier
-
-            fittings = [
-                ("Tee, Flow thru run", 20),
-                ("Tee, Flow thru branch", 60),
-                ("Elbow, 90° Threaded", 30),
-                ("Elbow, 45° Threaded", 16),
-                ("Elbow, 90° (R/D ~3)", 14),
-                ("Elbow, 45° (R/D ~3)", 9.9),
-                ("Gate Valve", 8),
-                ("Globe Valve", 340),
-                ("Ball Valve", 3),
-                ("Butterfly Valve", 45),
-                ("Check Valve", 100),
-                ("Entrance / Exit", 1)
-            ]
-            total_le_fittings = sum(fitting_input(name, mult) for name, mult in fittings)
-
-            st.markdown("<hr style='margin-top: 20px; margin-bottom: 6px'>", unsafe_allow_html=True)
-            st.markdown(f"**{label} Knockouts / Expansions**")
-            def knockout_le(diam):
-                if diam == 0:
-                    return 0.0
-                if diam > ID_in:
-                    return (1 / 12) * ID_in * ((1 - ((ID_in**2) / (diam**2))) ** 2)
-                else:
-                    return (1 / 12) * ID_in * 0.5 * (1 - ((diam**2) / (ID_in**2)))
-
-            knockout_le_total = 0
-            for i in range(3):
-                d = st.number_input(f"{label} Knockout {i+1} Diameter (in)", min_value=0.0, value=0.0, key=f"kdiam{i}_{label}_vent2")
-                knockout_le_total += knockout_le(d)
-
-            st.markdown("<hr style='margin-top: 20px; margin-bottom: 6px'>", unsafe_allow_html=True)
-            st.markdown(f"**{label} Specialty Valves / Components**")
-            def specialty_valve_le(cv):
-                if cv == 0:
-                    return 0.0
-                numerator = 100 * 891 * (ID_in ** 5)
-                denominator = (12 * (1 + (3.6 / ID_in) + 0.03 * ID_in)) * (cv ** 2)
-                return numerator / denominator
-
-            specialty_le_total = 0
-            for i in range(3):
-                cv = st.number_input(f"{label} Specialty Valve {i+1} Cv", min_value=0.0, value=0.0, key=f"cv{i}_{label}_vent2")
-                specialty_le_total += specialty_valve_le(cv)
-
-            total_pipe = developed_length + total_le_fittings + knockout_le_total + specialty_le_total
-
-            numerator = total_pipe * (1 + (3.6 / ID_in) + (0.03 * ID_in)) * (3.068 ** 5)
-            denominator = (ID_in ** 5) * (1 + (3.6 / 3.068) + (0.03 * 3.068))
-            total_pipe_nps = numerator / denominator
-
-            summary_lengths.append(total_pipe_nps if total_pipe_nps > 0 else 0.0)
-
-            st.metric(f"{label} Total Header Length (ft)", f"{total_pipe:.2f}")
-            st.metric(f"{label} Total Length (ft) of 3\" NPS", f"{total_pipe_nps:.2f}")
-
-    total_nps_sum = sum(summary_lengths)
-    if total_nps_sum == 0:
-        capacity = ""
-    else:
-        capacity = math.sqrt((0.22437 * (3.068 ** 5)) / (total_nps_sum * (1 + (3.6 / 3.068) + (0.03 * 3.068))))
+    header_inputs(header, f"{header}_tab")
+    total_nps_sum, capacity = header_summary(header)
 
     with summary_placeholder.container():
         c1, c2 = st.columns(2)
@@ -386,118 +501,31 @@ with tab5:
             st.metric("Total Length (ft) of 3\" NPS", f"{total_nps_sum:.2f}")
         with c2:
             st.metric("Capacity (MMSCFD/SQRT(psi))", f"{capacity:.5f}" if capacity else "")
-# ----------------------------- 
-# Tab 6: FlareVent
-# -----------------------------
-with tab6:
-    st.header("🌬 FlareVent (Full Range)")
-
-    st.subheader("Summary")
-    summary_lengths = []
-    total_nps_sum = 0
-    capacity = ""
-
-    summary_placeholder = st.empty()
-
-    id_configs = [
-        {"label": '1.5"', "id_in": 1.338},
-        {"label": '2"', "id_in": 2.067},
-        {"label": '3"', "id_in": 3.068},
-        {"label": '4"', "id_in": 4.026},
-        {"label": '6"', "id_in": 6.070},
-        {"label": '8"', "id_in": 7.981},
-        {"label": '10"', "id_in": 10.020},
-        {"label": '12"', "id_in": 11.938},
-    ]
-
-    col_sets = st.columns(len(id_configs))
-
-    for config, col in zip(id_configs, col_sets):
-        with col:
-            label = config["label"]
-            ID_in = config["id_in"]
-
-            st.markdown(f"### {label} Pipe")
-            st.markdown("<div style='background-color:#f0f0f0; padding: 4px; border-radius: 6px'><b>Developed Length</b></div>", unsafe_allow_html=True)
-            developed_length = st.number_input(f"{label} Developed Length (ft)", min_value=0.0, value=0.0, step=1.0, key=f"dev_{label}_flare")
-
-            st.markdown("---")
-            def fitting_input(tag, multiplier):
-                qty = st.number_input(f"{label} {tag} (qty)", min_value=0, value=0, step=1, key=f"{tag}_{label}_flare")
-                return qty * (1 / 12) * ID_in * multiplier
-
-            fittings = [
-                ("Tee, Flow thru run", 20),
-                ("Tee, Flow thru branch", 60),
-                ("Elbow, 90° Threaded", 30),
-                ("Elbow, 45° Threaded", 16),
-                ("Elbow, 90° (R/D ~3)", 14),
-                ("Elbow, 45° (R/D ~3)", 9.9),
-                ("Gate Valve", 8),
-                ("Globe Valve", 340),
-                ("Ball Valve", 3),
-                ("Butterfly Valve", 45),
-                ("Check Valve", 100),
-                ("Entrance / Exit", 1)
-            ]
-            total_le_fittings = sum(fitting_input(name, mult) for name, mult in fittings)
-
-            st.markdown("<hr style='margin-top: 20px; margin-bottom: 6px'>", unsafe_allow_html=True)
-            st.markdown(f"**{label} Knockouts / Expansions**")
-            def knockout_le(diam):
-                if diam == 0:
-                    return 0.0
-                if diam > ID_in:
-                    return (1 / 12) * ID_in * ((1 - ((ID_in**2) / (diam**2))) ** 2)
-                else:
-                    return (1 / 12) * ID_in * 0.5 * (1 - ((diam**2) / (ID_in**2)))
-
-            knockout_le_total = 0
-            for i in range(3):
-                d = st.number_input(f"{label} Knockout {i+1} Diameter (in)", min_value=0.0, value=0.0, key=f"kdiam{i}_{label}_flare")
-                knockout_le_total += knockout_le(d)
 
-            st.markdown("<hr style='margin-top: 20px; margin-bottom: 6px'>", unsafe_allow_html=True)
-            st.markdown(f"**{label} Specialty Valves / Components**")
-            def specialty_valve_le(cv):
-                if cv == 0:
-                    return 0.0
-                numerator = 100 * 891 * (ID_in ** 5)
-                denominator = (12 * (1 + (3.6 / ID_in) + 0.03 * ID_in)) * (cv ** 2)
-                return numerator / denominator
 
-            specialty_le_total = 0
-            for i in range(3):
-                cv = st.number_input(f"{label} Specialty Valve {i+1} Cv", min_value=0.0, value=0.0, key=f"cv{i}_{label}_flare")
-                specialty_le_total += specialty_valve_le(cv)
-
-            total_pipe = developed_length + total_le_fittings + knockout_le_total + specialty_le_total
-
-            numerator = total_pipe * (1 + (3.6 / ID_in) + (0.03 * ID_in)) * (3.068 ** 5)
-            denominator = (ID_in ** 5) * (1 + (3.6 / 3.068) + (0.03 * 3.068))
-            total_pipe_nps = numerator / denominator
-
-            summary_lengths.append(total_pipe_nps if total_pipe_nps > 0 else 0.0)
+with tab4:
+    vent_header_tab("vent1", '🌬 MAIN TANK VENT HEADER1 (Full Range)')
+with tab5:
+    vent_header_tab("vent2", '🌬 MAIN TANK VENT HEADER2 (Full Range)')
+with tab6:
+    vent_header_tab("flare", "🌬 FlareVent (Full Range)")
 
-            st.metric(f"{label} Total Header Length (ft)", f"{total_pipe:.2f}")
-            st.metric(f"{label} Total Length (ft) of 3\" NPS", f"{total_pipe_nps:.2f}")
 
-    total_nps_sum = sum(summary_lengths)
-    if total_nps_sum == 0:
-        capacity = ""
-    else:
-        capacity = math.sqrt((0.22437 * (3.068 ** 5)) / (total_nps_sum * (1 + (3.6 / 3.068) + (0.03 * 3.068))))
-
-    with summary_placeholder.container():
-        c1, c2 = st.columns(2)
-        with c1:
-            st.metric("Total Length (ft) of 3\" NPS", f"{total_nps_sum:.2f}")
-        with c2:
-            st.metric("Capacity (MMSCFD/SQRT(psi))", f"{capacity:.5f}" if capacity else "")
 # -----------------------------
 # Tab 7: Flare1 (Full Range)
 # -----------------------------
-with tab7:
+def _pick_device(picker_key):
+    device = st.session_state[picker_key]
+    if device is not None:
+        # Runs before the rerun, so the inputs below render with the model's values.
+        st.session_state.update(cd_model=device["model"], cd_capacity=device["rated_capacity"],
+                                cd_turn_on=device["turn_on_oz"], cd_turn_off=device["turn_off_oz"])
+        publish("flare1_tab")
+
+
+@st.fragment(key="flare1_tab")
+@perf.timed()
+def flare1_tab():
     st.header("🌬 Flare1 (Full Range)")
 
     # Summary Section – Control Device + Pipe Summary
@@ -505,116 +533,31 @@ with tab7:
 
     # 🔹 Placeholder and setup
     summary_placeholder = st.empty()
-    summary_lengths = []
-    total_nps_sum = 0
 
     # 🔹 Control Device Inputs (Green)
-    control_device_model = st.text_input("Control Device Make/Model", value="Steffes SVG-3B4", key="cd_model")
-    user_capacity_input = st.number_input("Flare Capacity MMSCFD/SQRT(psig), SG=1", min_value=0.0, value=0.299, format="%.3f", key="cd_capacity")
-    turn_on_oz = st.number_input("Turn ON (oz)", min_value=0.0, value=0.0, key="cd_turn_on")
-    turn_off_oz = st.number_input("Turn OFF (oz)", min_value=0.0, value=0.0, key="cd_turn_off")
-
-    # 🔹 Calculated Metrics (Blue)
-    if user_capacity_input > 0:
-        le_ft = 0.22437 * (3.068 ** 5) / ((user_capacity_input ** 2) * (1 + (3.6 / 3.068) + (0.03 * 3.068)))
-    else:
-        le_ft = 0.0
-
-    wfittings_ft = 0.0  # Will be updated after pipe inputs
-    red_capacity = 0.0
+    c1, c2 = st.columns([1, 2])
+    with c1:
+        query = st.text_input("Search Catalog", key="cd_search", placeholder="e.g. steffes svg")
+    with c2:
+        st.selectbox("Catalog Model", catalog.search(query), index=None, key="cd_catalog_pick",
+                     format_func=lambda d: f"{d['model']} ({d['device_type']}, {d['rated_capacity']:.3f})",
+                     placeholder="Pick a model to fill the inputs below", on_change=_pick_device,
+                     args=("cd_catalog_pick",))
+    control_device_model = st.text_input("Control Device Make/Model", key="cd_model")
+    user_capacity_input = st.number_input("Flare Capacity MMSCFD/SQRT(psig), SG=1", min_value=0.0, format="%.3f", key="cd_capacity",
+                                          on_change=publish, args=("flare1_tab",))
+    turn_on_oz = st.number_input("Turn ON (oz)", min_value=0.0, key="cd_turn_on")
+    turn_off_oz = st.number_input("Turn OFF (oz)", min_value=0.0, key="cd_turn_off")
 
     # Pipe Inputs Section
-    id_configs = [
-        {"label": '1.5"', "id_in": 1.338},
-        {"label": '2"', "id_in": 2.067},
-        {"label": '3"', "id_in": 3.068},
-        {"label": '4"', "id_in": 4.026},
-        {"label": '6"', "id_in": 6.070},
-        {"label": '8"', "id_in": 7.981},
-        {"label": '10"', "id_in": 10.020},
-        {"label": '12"', "id_in": 11.938},
-    ]
-
-    col_sets = st.columns(len(id_configs))
-
-    for config, col in zip(id_configs, col_sets):
-        with col:
-            label = config["label"]
-            ID_in = config["id_in"]
-
-            st.markdown(f"### {label} Pipe")
-            st.markdown("<div style='background-color:#f0f0f0; padding: 4px; border-radius: 6px'><b>Developed Length</b></div>", unsafe_allow_html=True)
-            developed_length = st.number_input(f"{label} Developed Length (ft)", min_value=0.0, value=0.0, step=1.0, key=f"dev_{label}_flare1")
-
-            st.markdown("---")
-            def fitting_input(tag, multiplier):
-                qty = st.number_input(f"{label} {tag} (qty)", min_value=0, value=0, step=1, key=f"{tag}_{label}_flare1")
-                return qty * (1 / 12) * ID_in * multiplier
-
-            fittings = [
-                ("Tee, Flow thru run", 20),
-                ("Tee, Flow thru branch", 60),
-                ("Elbow, 90° Threaded", 30),
-                ("Elbow, 45° Threaded", 16),
-                ("Elbow, 90° (R/D ~3)", 14),
-                ("Elbow, 45° (R/D ~3)", 9.9),
-                ("Gate Valve", 8),
-                ("Globe Valve", 340),
-                ("Ball Valve", 3),
-                ("Butterfly Valve", 45),
-                ("Check Valve", 100),
-                ("Entrance / Exit", 1)
-            ]
-            total_le_fittings = sum(fitting_input(name, mult) for name, mult in fittings)
-
-            st.markdown("<hr style='margin-top: 20px; margin-bottom: 6px'>", unsafe_allow_html=True)
-            st.markdown(f"**{label} Knockouts / Expansions**")
-            def knockout_le(diam):
-                if diam == 0:
-                    return 0.0
-                if diam > ID_in:
-                    return (1 / 12) * ID_in * ((1 - ((ID_in**2) / (diam**2))) ** 2)
-                else:
-                    return (1 / 12) * ID_in * 0.5 * (1 - ((diam**2) / (ID_in**2)))
-
-            knockout_le_total = 0
-            for i in range(3):
-                d = st.number_input(f"{label} Knockout {i+1} Diameter (in)", min_value=0.0, value=0.0, key=f"kdiam{i}_{label}_flare1")
-                knockout_le_total += knockout_le(d)
-
-            st.markdown("<hr style='margin-top: 20px; margin-bottom: 6px'>", unsafe_allow_html=True)
-            st.markdown(f"**{label} Specialty Valves / Components**")
-            def specialty_valve_le(cv):
-                if cv == 0:
-                    return 0.0
-                numerator = 100 * 891 * (ID_in ** 5)
-                denominator = (12 * (1 + (3.6 / ID_in) + 0.03 * ID_in)) * (cv ** 2)
-                return numerator / denominator
-
-            specialty_le_total = 0
-            for i in range(3):
-                cv = st.number_input(f"{label} Specialty Valve {i+1} Cv", min_value=0.0, value=0.0, key=f"cv{i}_{label}_flare1")
-                specialty_le_total += specialty_valve_le(cv)
-
-            total_pipe = developed_length + total_le_fittings + knockout_le_total + specialty_le_total
-
-            numerator = total_pipe * (1 + (3.6 / ID_in) + (0.03 * ID_in)) * (3.068 ** 5)
-            denominator = (ID_in ** 5) * (1 + (3.6 / 3.068) + (0.03 * 3.068))
-            total_pipe_nps = numerator / denominator
-
-            summary_lengths.append(total_pipe_nps if total_pipe_nps > 0 else 0.0)
-
-            st.metric(f"{label} Total Header Length (ft)", f"{total_pipe:.2f}")
-            st.metric(f"{label} Total Length (ft) of 3\" NPS", f"{total_pipe_nps:.2f}")
+    header_inputs("flare1", "flare1_tab")
 
     # Final summary calculations
-    total_nps_sum = sum(summary_lengths)
-    wfittings_ft = le_ft + total_nps_sum
-
-    if wfittings_ft > 0:
-        red_capacity = math.sqrt(0.22437 * (3.068 ** 5) / (wfittings_ft * (1 + (3.6 / 3.068) + (0.03 * 3.068))))
-    else:
-        red_capacity = 0.0
+    graph = site_graph()
+    graph.set(cd_capacity=user_capacity_input)
+    total_nps_sum, _ = header_summary("flare1")
+    le_ft, wfittings_ft, red_capacity = (float(v) for v in graph.get("flare1_le_ft", "flare1_wfittings_ft",
+                                                                       "flare1_red_capacity"))
 
     with summary_placeholder.container():
         st.markdown("### 🔵 Control Device Output")
@@ -628,25 +571,28 @@ with tab7:
         with c3:
             st.metric("Red. Capacity MMSCFD/SQRT(psig), SG=1", f"{red_capacity:.5f}")
             st.metric("Turn OFF (oz)", f"{turn_off_oz:.1f}")
+
+
+with tab7:
+    flare1_tab()
+
+
 # -----------------------------
 # Tab 8: SUMMARY OF RESULTS
 # -----------------------------
 
-with tab8:
+@st.fragment(key="summary_tab")
+@perf.timed()
+def summary_tab():
     st.header("📊 SUMMARY OF RESULTS")
     ...
 
 
-    # Pull stored values or fallback to default if missing
-    oil_ppivfr = st.session_state.get("oil_ppivfr", 0.0)
-    water_ppivfr = st.session_state.get("water_ppivfr", 0.0)
-    other_ppivfr = st.session_state.get("other_ppivfr", 0.0)
-    total_thermal_ppivfr = st.session_state.get("total_thermal_ppivfr", 0.0)
-    thief_prv_input = st.session_state.get("thief_prv_input", 0.0)
-    leaking_safety = st.session_state.get("leaking_safety", 0.0)
-    design_pressure = (thief_prv_input - leaking_safety) * 0.9 if thief_prv_input > leaking_safety else 0.0
-
-    total_ppivfr = oil_ppivfr + water_ppivfr + other_ppivfr
+    # Straight from the graph; an edit that changes any of these reruns this tab (publish()).
+    oil_ppivfr, water_ppivfr, other_ppivfr, total_thermal_ppivfr, thief_prv_input = (
+        float(value) for value in site_graph().get("oil_ppivfr", "water_ppivfr", "other_ppivfr",
+                                                   "total_thermal_ppivfr", "thief_prv_input"))
+    total_ppivfr, design_pressure = summary_totals()
 
     st.subheader("PPIVFR Summary")
     st.metric("Oil PPIVFR (mmscfd, SG=1)", f"{oil_ppivfr:.5f}")
@@ -659,75 +605,739 @@ with tab8:
     st.metric("Minimum Thief Hatch/PRV (osig)", f"{thief_prv_input:.2f}")
     st.metric("Design Pressure (osig)", f"{design_pressure:.2f}")
     st.info("🛠 GOT PISSED AND STOPPED HERE")
+
+
+with tab8:
+    summary_tab()
+
+
 # -----------------------------
 # Tab 9: Process Flow Diagram
 # -----------------------------
-from streamlit_mermaid import st_mermaid
-
-with tab9:
+@st.fragment(key="pfd_tab")
+@perf.timed()
+def process_flow_diagram_tab():
     st.header("📈 Oil System Flow – Process Flow Diagram")
 
     # ----- Row 1: Inlet Seps -----
     r1c1, r1c2 = st.columns(2)
     with r1c1:
-        inlet_seps = st.number_input("Number of Inlet Separators", min_value=0, value=2)
+        inlet_seps = st.number_input("Number of Inlet Separators", min_value=0, key="pfd_inlet_seps")
     with r1c2:
-        inlet_sep_psig = st.number_input("Max Operating Pressure of Inlet Seps (psig)", min_value=0.0, value=25.0)
+        inlet_sep_psig = st.number_input("Max Operating Pressure of Inlet Seps (psig)", min_value=0.0, key="pfd_inlet_sep_psig")
 
     # ----- Row 2: Heater Treaters -----
     r2c1, r2c2 = st.columns(2)
     with r2c1:
-        ht = st.number_input("Number of Heater Treaters (HT)", min_value=0, value=1)
+        ht = st.number_input("Number of Heater Treaters (HT)", min_value=0, key="pfd_ht")
     with r2c2:
-        ht_psig = st.number_input("Max Operating Pressure of HTs (psig)", min_value=0.0, value=50.0)
+        ht_psig = st.number_input("Max Operating Pressure of HTs (psig)", min_value=0.0, key="pfd_ht_psig")
 
     # ----- Row 3: VRTs -----
     r3c1, r3c2 = st.columns(2)
     with r3c1:
-        vrt = st.number_input("Number of VRTs", min_value=0, value=1)
+        vrt = st.number_input("Number of VRTs", min_value=0, key="pfd_vrt")
     with r3c2:
-        vrt_psig = st.number_input("Max Operating Pressure of VRTs (psig)", min_value=0.0, value=10.0)
+        vrt_psig = st.number_input("Max Operating Pressure of VRTs (psig)", min_value=0.0, key="pfd_vrt_psig")
 
     st.markdown("PFD")
 
-    diagram = f"""
-    flowchart LR
-
-        %% Vapor nodes (top)
-        VA[To Sales/Flare]
-        VB[To Sales/Flare]
-        VC[To MP Flare]
-        VD[To LP Flare]
-
-        %% Oil flow (default = black)
-        A[Inlet Separators] --> B[Heater Treaters]
-        B --> C[VRTs]
-        C --> D[Oil Tanks]
-
-        %% Water lines (styled blue)
-        A --> W1[To Water Tanks]
-        B --> W2[To Water Tanks]
-
-        %% Vapor lines (styled red dashed)
-        A -.-> VA
-        B -.-> VB
-        C -.-> VC
-        D -.-> VD
-
-        %% Assign classes
-        class W1,W2 waterLine
-        class VA,VB,VC,VD vaporNode
-        class A,W1 waterLine
-        class B,W2 waterLine
-        class A,VA vaporLine
-        class B,VB vaporLine
-        class C,VC vaporLine
-        class D,VD vaporLine
-
-        %% Styling rules
-        classDef waterLine stroke:#1f77b4,stroke-width:2px;
-        classDef vaporLine stroke:#d62728,stroke-width:2px,stroke-dasharray: 5 5;
-        classDef vaporNode fill:#ffe6e6,color:#d62728,stroke:#d62728;
-    """
+    counts, *facility = pfd.facility(site_graph(), {key: st.session_state[key] for key in [*pfd.DEFAULTS, "cd_model"]})
+    diagram, topology_hash = pfd.diagram(counts, *facility)
+
+    # Keyed by topology: reruns that leave the diagram text unchanged send the
+    # component the same arguments, so the browser does not lay it out again.
+    with perf.section("mermaid"):
+        st_mermaid(diagram, height=f"{pfd.height_px(counts)}px", key=f"pfd_{topology_hash}")
+
+
+with tab9:
+    process_flow_diagram_tab()
+
+
+# -----------------------------
+# Tab 10: Header Sizing
+# -----------------------------
+@st.fragment
+@perf.timed()
+def header_sizing_tab():
+    st.header("📐 Header Sizing – Cheapest Pipe Sizes Within Design Pressure")
+
+    total_ppivfr, design_pressure = summary_totals()
+    le_ft = float(site_graph()["flare1_le_ft"])
+
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        st.metric("Total PPIVFR (mmscfd, SG=1)", f"{total_ppivfr:.5f}")
+    with c2:
+        st.metric("Design Pressure (osig)", f"{design_pressure:.2f}")
+    with c3:
+        include_device = st.checkbox("Include Flare1 control device Le", value=True, key="opt_include_device")
+        st.metric("Le, ft (3\" pipe) of Flare/Comb", f"{le_ft:.2f}")
+
+    st.markdown("#### Segments")
+    segments = st.data_editor(
+        pd.DataFrame(0.0, index=range(3), columns=["Developed Length (ft)"] + engine.FITTING_NAMES),
+        key="opt_segments",
+        num_rows="dynamic",
+    )
+
+    st.markdown("#### Installed Cost ($/ft)")
+    costs = st.data_editor(
+        pd.DataFrame([optimizer.DEFAULT_COST_PER_FT], index=["$/ft"]),
+        key="opt_costs",
+        num_rows="fixed",
+    )
+
+    top_n = st.number_input("Designs to list", min_value=1, value=10, step=1, key="opt_top_n")
+
+    if st.button("Find Sizes", key="opt_run"):
+        segment_list = [
+            {"length": row["Developed Length (ft)"], "fittings": {name: row[name] for name in engine.FITTING_NAMES}}
+            for _, row in segments.fillna(0.0).iterrows()
+        ]
+        if not segment_list:
+            st.warning("Add at least one segment.")
+            return
+        try:
+            result = optimizer.optimize_header(
+                segment_list,
+                total_ppivfr,
+                design_pressure,
+                cost_per_ft=costs.iloc[0].to_dict(),
+                fixed_nps_length=le_ft if include_device else 0.0,
+                top_n=int(top_n),
+            )
+        except optimizer.OptimizerError as exc:
+            st.warning(f"⚠️ Search too large: {exc}")
+            return
+        st.caption(f"Scored {result.attrs['candidates']:,} partial designs in place of "
+                   f"{result.attrs['candidates_unpruned']:,} full size assignments.")
+        if result.empty:
+            st.warning("⚠️ No combination of sizes keeps the pressure drop within design pressure.")
+        else:
+            st.dataframe(result, hide_index=True)
+
+
+with tab10:
+    header_sizing_tab()
+
+
+# -----------------------------
+# Tab 11: Uncertainty (Monte Carlo)
+# -----------------------------
+MC_COLUMN_CONFIG = {
+    "Distribution": st.column_config.SelectboxColumn("Distribution", options=list(montecarlo.DISTRIBUTIONS), required=True),
+    "Value": st.column_config.NumberColumn("Value / Mean"),
+    "Spread": st.column_config.NumberColumn("Std / Sigma"),
+}
+
+
+@st.fragment
+@perf.timed()
+def uncertainty_tab():
+    st.header("🎲 Uncertainty – PPIVFR vs. Capacity at Design Pressure")
+    st.markdown("Give any input a distribution; everything else stays at the value entered in its tab. "
+                "Vent path length defaults to the Flare1 wfittings (control device + flare vent).")
+
+    current = {name: st.session_state.get(name, engine.SITE_DEFAULTS.get(name, 0.0)) for name in montecarlo.SIMULATION_INPUTS}
+    current["nps_length"] = float(site_graph()["flare1_wfittings_ft"])
+    table = pd.DataFrame({
+        "Input": montecarlo.SIMULATION_INPUTS,
+        "Distribution": "fixed",
+        "Value": [float(current[name]) for name in montecarlo.SIMULATION_INPUTS],
+        "Low": np.nan,
+        "Mode": np.nan,
+        "High": np.nan,
+        "Spread": np.nan,
+    })
+    table = st.data_editor(table, key="mc_inputs", column_config=MC_COLUMN_CONFIG, disabled=["Input"],
+                           hide_index=True, num_rows="fixed")
+
+    c1, c2 = st.columns(2)
+    with c1:
+        n_samples = st.number_input("Samples", min_value=1_000, max_value=2_000_000, value=200_000, step=50_000, key="mc_samples")
+    with c2:
+        seed = st.number_input("Random Seed", min_value=0, value=0, step=1, key="mc_seed")
+
+    if st.button("Run Simulation", key="mc_run"):
+        def cell(row, name):
+            return None if pd.isna(row[name]) else float(row[name])
+
+        try:
+            inputs = {
+                row["Input"]: montecarlo.spec_from_row(row["Distribution"], cell(row, "Value"), cell(row, "Low"),
+                                                       cell(row, "Mode"), cell(row, "High"), cell(row, "Spread"))
+                for _, row in table.iterrows()
+            }
+            result = montecarlo.simulate(inputs, int(n_samples), seed=int(seed))
+        except (KeyError, TypeError, ValueError) as exc:
+            st.warning(f"⚠️ Check the distribution parameters: {exc}")
+            return
+
+        st.metric("P(PPIVFR > Capacity × √Design Pressure)", f"{result['p_exceed']:.2%}")
+        st.dataframe(pd.DataFrame(result["percentiles"]).T.rename(columns=lambda p: f"P{p}").style.format("{:.5f}"))
+        counts, edges = np.histogram(result["margin"], bins=50)
+        st.bar_chart(pd.DataFrame({"Samples": counts}, index=np.round((edges[:-1] + edges[1:]) / 2, 5)))
+
+
+with tab11:
+    uncertainty_tab()
+
+
+# -----------------------------
+# Tab 12: What-If Sweeps
+# -----------------------------
+@st.cache_data(max_entries=128, show_spinner=False)
+def cached_margin_grid(fixed, x_name, x_range, y_name, y_range, steps):
+    # Keyed on a hash of the fixed inputs and the grid, so moving a slider
+    # back to a range already seen re-renders straight from the cache.
+    x_values = np.linspace(*x_range, steps)
+    y_values = np.linspace(*y_range, steps) if y_name else None
+    return x_values, y_values, sweeps.margin_grid(fixed, x_name, x_values, y_name, y_values)
+
+
+def sweep_range_slider(name, current, key):
+    upper = max(4 * current, 10.0)
+    return st.slider(sweeps.SWEEP_INPUTS[name], min_value=0.0, max_value=float(upper),
+                     value=(0.0, float(max(2 * current, 1.0))), key=key)
+
+
+def max_production_panel(fixed):
+    """The largest oil and water production this vent system takes, each with the other stream as entered."""
+    graph = site_graph()
+    capacity = np.atleast_1d(engine.flow_capacity(graph["flare1_red_capacity"], graph["design_pressure"]))
+    columns = {name: np.atleast_1d(value) for name, value in fixed.items() if name in engine.SITE_DEFAULTS}
+    st.subheader("Maximum Allowable Production")
+    cols = st.columns(len(headroom.STREAMS))
+    for col, name in zip(cols, headroom.STREAMS.values()):
+        values, over = headroom.solve_max(columns, 1, name, capacity)
+        value = float(values[0])
+        surge = float(engine.surge_adjusted_bbl(value, fixed[headroom.SURGE_INPUTS[name]])) if np.isfinite(value) else value
+        with col:
+            st.metric(f"Max {headroom.SOLVE_INPUTS[name]}", f"{value:,.0f}",
+                      delta=f"{value - fixed[name]:,.0f} headroom", delta_color="normal")
+            if over[0]:
+                st.caption("⚠️ Over capacity even with no production from this stream.")
+            else:
+                st.caption(f"{surge:,.0f} bbl/day with the surge allowance.")
+
+
+@st.fragment
+@perf.timed()
+def what_if_tab():
+    st.header("🔀 What-If")
+    st.markdown("Margin = Flare1 reduced capacity × √(design pressure, psi) − total PPIVFR. "
+                "All inputs not being swept stay at the values entered in their tabs.")
+
+    fixed = {name: float(st.session_state.get(name, default)) for name, default in engine.SITE_DEFAULTS.items()}
+    fixed["flare1_total_nps"] = float(site_graph()["flare1_total_nps"])
+    max_production_panel(fixed)
+    st.subheader("Capacity Margin Sweeps")
+
+    names = list(sweeps.SWEEP_INPUTS)
+    c1, c2 = st.columns(2)
+    with c1:
+        x_name = st.selectbox("X Input", names, index=names.index("oil_production"),
+                              format_func=sweeps.SWEEP_INPUTS.get, key="sweep_x")
+        x_range = sweep_range_slider(x_name, fixed[x_name], key=f"sweep_x_range_{x_name}")
+    with c2:
+        y_options = ["(none)"] + [name for name in names if name != x_name]
+        y_name = st.selectbox("Y Input", y_options, index=y_options.index("thief_prv_input") if x_name != "thief_prv_input" else 0,
+                              format_func=lambda name: sweeps.SWEEP_INPUTS.get(name, name), key="sweep_y")
+        y_name = None if y_name == "(none)" else y_name
+        y_range = sweep_range_slider(y_name, fixed[y_name], key=f"sweep_y_range_{y_name}") if y_name else None
+    steps = st.select_slider("Grid Resolution", options=[25, 50, 100, 200], value=50, key="sweep_steps")
+
+    x_values, y_values, grid = cached_margin_grid(fixed, x_name, x_range, y_name, y_range, steps)
+
+    if y_name is None:
+        st.line_chart(pd.DataFrame({"Margin (mmscfd)": grid}, index=pd.Index(x_values, name=sweeps.SWEEP_INPUTS[x_name])))
+        return
+
+    # One rect per grid point, spanning half a step either side.
+    dx = (x_values[1] - x_values[0]) / 2 if steps > 1 else 0.5
+    dy = (y_values[1] - y_values[0]) / 2 if steps > 1 else 0.5
+    xx, yy = np.meshgrid(x_values, y_values)
+    data = pd.DataFrame({"x": xx.ravel() - dx, "x2": xx.ravel() + dx, "y": yy.ravel() - dy, "y2": yy.ravel() + dy,
+                         x_name: xx.ravel(), y_name: yy.ravel(), "margin": grid.ravel()})
+    chart = alt.Chart(data).mark_rect().encode(
+        x=alt.X("x:Q", title=sweeps.SWEEP_INPUTS[x_name]),
+        x2="x2:Q",
+        y=alt.Y("y:Q", title=sweeps.SWEEP_INPUTS[y_name]),
+        y2="y2:Q",
+        color=alt.Color("margin:Q", title="Margin (mmscfd)", scale=alt.Scale(scheme="redblue", domainMid=0)),
+        tooltip=[alt.Tooltip(f"{x_name}:Q"), alt.Tooltip(f"{y_name}:Q"), alt.Tooltip("margin:Q", format=".5f")],
+    )
+    st.altair_chart(chart)
+    st.caption(f"{(grid < 0).mean():.1%} of the grid is over capacity.")
+
+
+with tab12:
+    what_if_tab()
+
+
+# -----------------------------
+# Tab 13: Vent Network
+# -----------------------------
+NETWORK_NODE_CONFIG = {
+    "Type": st.column_config.SelectboxColumn("Type", options=["source", "junction"], required=True),
+    "Flow (mmscfd)": st.column_config.NumberColumn("Flow (mmscfd)", min_value=0.0, format="%.5f"),
+}
+NETWORK_BRANCH_CONFIG = {
+    "To": st.column_config.TextColumn("To (blank = control device to atmosphere)"),
+    "Length (ft) of 3\" NPS": st.column_config.NumberColumn("Length (ft) of 3\" NPS", min_value=0.0, format="%.2f"),
+    "Device Capacity": st.column_config.NumberColumn("Device Capacity MMSCFD/SQRT(psig)", min_value=0.0, format="%.3f"),
+}
+
+
+NETWORK_DEFAULTS = ["oil_ppivfr", "water_ppivfr", "other_ppivfr",
+                    *(f"{header}_total_nps" for header in engine.HEADERS)]
+
+
+def default_network_tables():
+    """The app's own layout: two tank batteries, their vent headers, FlareVent and Flare1."""
+    get = st.session_state.get
+    graph = dict(zip(NETWORK_DEFAULTS, (float(value) for value in site_graph().get(*NETWORK_DEFAULTS))))
+    nodes = pd.DataFrame([
+        ("Oil Tanks", "source", graph["oil_ppivfr"] + graph["other_ppivfr"]),
+        ("Water Tanks", "source", graph["water_ppivfr"]),
+        ("Vent Junction", "junction", 0.0),
+        ("Flare Inlet", "junction", 0.0),
+    ], columns=["Name", "Type", "Flow (mmscfd)"])
+    branches = pd.DataFrame([
+        ("MAIN TANK VENT", "Oil Tanks", "Vent Junction", graph["vent1_total_nps"], np.nan),
+        ("MAIN TANK VENT HEADER2", "Water Tanks", "Vent Junction", graph["vent2_total_nps"], np.nan),
+        ("FlareVent", "Vent Junction", "Flare Inlet", graph["flare_total_nps"], np.nan),
+        (get("cd_model", "Flare1"), "Flare Inlet", "", graph["flare1_total_nps"], get("cd_capacity", 0.299)),
+    ], columns=["Name", "From", "To", "Length (ft) of 3\" NPS", "Device Capacity"])
+    return nodes, branches
+
+
+def build_network(nodes, branches):
+    net = network.VentNetwork()
+    for _, row in nodes.dropna(subset=["Name"]).iterrows():
+        if row["Type"] == "source":
+            net.add_source(row["Name"], float(np.nan_to_num(row["Flow (mmscfd)"])))
+        else:
+            net.add_junction(row["Name"])
+    for _, row in branches.dropna(subset=["Name", "From"]).iterrows():
+        length = float(np.nan_to_num(row["Length (ft) of 3\" NPS"]))
+        if pd.isna(row["To"]) or not str(row["To"]).strip():
+            net.add_control_device(row["Name"], row["From"], float(np.nan_to_num(row["Device Capacity"])), length)
+        else:
+            net.add_pipe(row["Name"], row["From"], row["To"], length)
+    return net
+
+
+@st.fragment
+@perf.timed()
+def vent_network_tab():
+    st.header("🕸 Vent Network – Flow Split and Node Pressures")
+    st.markdown("Sources, junctions, pipe segments and control devices solved together. "
+                "Defaults come from the header tabs; add rows for more tank batteries, headers, flares or VRUs.")
+
+    _, design_pressure = summary_totals()
+    default_nodes, default_branches = default_network_tables()
+    nodes = st.data_editor(default_nodes, key="net_nodes", column_config=NETWORK_NODE_CONFIG,
+                           num_rows="dynamic", hide_index=True)
+    branches = st.data_editor(default_branches, key="net_branches", column_config=NETWORK_BRANCH_CONFIG,
+                              num_rows="dynamic", hide_index=True)
+
+    try:
+        solution = build_network(nodes, branches).solve()
+    except (KeyError, ValueError, RuntimeError) as exc:
+        st.warning(f"⚠️ Network can't be solved: {exc}")
+        return
+
+    c1, c2 = st.columns(2)
+    with c1:
+        st.markdown("#### Node Pressures")
+        pressures = pd.Series(solution.node_pressures(), name="Pressure (osig)")
+        st.dataframe(pressures.to_frame().style.format("{:.3f}"))
+    with c2:
+        st.markdown("#### Branch Flows")
+        st.dataframe(pd.Series(solution.branch_flows(), name="Flow (mmscfd)").to_frame().style.format("{:.5f}"))
+
+    over = solution.overpressured(design_pressure)
+    if over:
+        st.warning(f"⚠️ Above design pressure ({design_pressure:.2f} osig): {', '.join(over)}")
+    else:
+        st.success(f"All sources within design pressure ({design_pressure:.2f} osig).")
+    if not solution.converged:
+        st.warning(f"⚠️ The solver stopped after {solution.iterations} Newton steps without converging "
+                   f"(max residual {solution.max_residual:.1e} mmscfd); treat these results as approximate.")
+    else:
+        st.caption(f"Solved in {solution.iterations} Newton steps (max residual {solution.max_residual:.1e} mmscfd).")
+
+
+with tab13:
+    vent_network_tab()
 
-    st_mermaid(diagram)
+
+# -----------------------------
+# Tab 14: SCADA History
+# -----------------------------
+@st.fragment
+@perf.timed()
+def scada_history_tab():
+    st.header("📡 SCADA History – Rolling PPIVFR vs. Vent Capacity")
+    st.markdown("Replaces the surge allowance with measured dump cycles. Files are read a chunk at a time, "
+                "so a server-side path can point at histories of any length.")
+
+    _, design_pressure = summary_totals()
+    uploaded = st.file_uploader("History File (CSV or Parquet)", type=["csv", "parquet"], key="scada_file")
+    path = st.text_input("…or Path on Server", value="", key="scada_path")
+
+    c1, c2, c3, c4 = st.columns(4)
+    columns = {}
+    for col, (name, default) in zip((c1, c2, c3, c4), scada.DEFAULT_COLUMNS.items()):
+        with col:
+            columns[name] = st.text_input(f"{name.replace('_', ' ').title()} Column", value=default, key=f"scada_col_{name}")
+
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        window = st.selectbox("Rolling Window", ["5min", "15min", "60min", "4h", "24h"], index=2, key="scada_window")
+    with c2:
+        capacity = st.number_input("Vent Capacity MMSCFD/SQRT(psi)", min_value=0.0,
+                                   value=float(site_graph()["flare1_red_capacity"]), format="%.5f",
+                                   key="scada_capacity")
+    with c3:
+        st.metric("Design Pressure (osig)", f"{design_pressure:.2f}")
+
+    source = uploaded if uploaded is not None else path.strip()
+    if not source or not st.button("Check History", key="scada_run"):
+        return
+
+    inputs, _ = session_inputs(st.session_state)
+    promax_values = {name: inputs[name] for name in ("promax_flash", "promax_mw", "promax_water_flash", "promax_water_mw")}
+    try:
+        with st.spinner("Reading history…"):
+            summary, profile = scada.check_history(source, capacity, design_pressure, window, columns,
+                                                   promax=promax_values, other_ppivfr=float(site_graph()["other_ppivfr"]))
+    except (OSError, KeyError, ValueError) as exc:
+        st.warning(f"⚠️ Couldn't read the history: {exc}")
+        return
+
+    c1, c2, c3, c4 = st.columns(4)
+    with c1:
+        st.metric("Threshold (mmscfd)", f"{summary['threshold']:.5f}")
+        st.metric("Samples", f"{summary['samples']:,}")
+    with c2:
+        st.metric("Time Over Capacity", f"{summary['exceed_fraction']:.2%}")
+        st.metric("Total Duration Over", str(summary["exceed_duration"]))
+    with c3:
+        st.metric("Exceedance Events", f"{summary['events']:,}")
+        st.metric("Longest Event", str(summary["longest_event"]))
+    with c4:
+        st.metric("Peak Rolling PPIVFR (mmscfd)", f"{summary['peak_ppivfr']:.5f}")
+        st.metric("Peak Time", str(summary["peak_time"]))
+    st.line_chart(profile.to_frame().assign(**{"Threshold (mmscfd)": summary["threshold"]}))
+
+
+with tab14:
+    scada_history_tab()
+
+
+# -----------------------------
+# Tab 15: Dump Transient
+# -----------------------------
+TRANSIENT_COLUMNS = ["Scenario", "Oil Production (bbl/day)", "Water Production (bbl/day)", "Dump Every (s)",
+                     "Dump Duration (s)", "Tank Quantity", "Tank Size (bbl)", "Liquid Level (%)"]
+
+
+def default_dump_scenarios():
+    """Short, typical and long dumps of the current Main Process rates into the oil tanks."""
+    oil = st.session_state.get("oil_production", 0.0)
+    water = st.session_state.get("water_production", 0.0)
+    qty = st.session_state.get("oil_tank_qty", 7)
+    size = st.session_state.get("oil_tank_size", engine.TANK_SIZES[3])
+    return pd.DataFrame([
+        ["Short dumps", oil, water, 300.0, 20.0, qty, size, 50.0],
+        ["Typical dumps", oil, water, 900.0, 60.0, qty, size, 50.0],
+        ["Long dumps", oil, water, 1800.0, 180.0, qty, size, 50.0],
+        ["Long dumps, full tanks", oil, water, 1800.0, 180.0, qty, size, 90.0],
+    ], columns=TRANSIENT_COLUMNS)
+
+
+@st.fragment
+@perf.timed()
+def dump_transient_tab():
+    st.header("⏱ Dump Transient – Tank Pressure Through a Day of Dumps")
+    st.markdown("Oil reaches the tanks in separator dumps instead of at the surge-adjusted average. "
+                "Tank pressure follows the flash + working volume in and the vent capacity out, "
+                "with the Flare1 turn-on/turn-off setpoints.")
+
+    capacity = float(site_graph()["flare1_red_capacity"])
+    thief_prv = st.session_state.get("thief_prv_input", 0.0)
+    turn_on = st.session_state.get("cd_turn_on", 0.0)
+    turn_off = st.session_state.get("cd_turn_off", 0.0)
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        st.metric("Vent Capacity MMSCFD/SQRT(psi)", f"{capacity:.5f}")
+    with c2:
+        st.metric("Thief Hatch/PRV (osig)", f"{thief_prv:.2f}")
+    with c3:
+        st.metric("Device ON / OFF (oz)", f"{turn_on:.2f} / {turn_off:.2f}")
+
+    scenarios = st.data_editor(default_dump_scenarios(), key="transient_scenarios", num_rows="dynamic")
+    scenarios = scenarios.dropna(subset=TRANSIENT_COLUMNS[1:])
+    scenarios = scenarios[(scenarios["Dump Every (s)"] > 0) & (scenarios["Dump Duration (s)"] > 0)
+                          & (scenarios["Tank Quantity"] > 0) & (scenarios["Liquid Level (%)"] < 100)]
+    if scenarios.empty:
+        st.info("Add a scenario with a dump interval, dump duration and at least one tank.")
+        return
+    if capacity <= 0:
+        st.warning("⚠️ Flare1 has no vent capacity yet — pressure will only rise.")
+
+    cases = transient.DumpScenarios(
+        oil_production=scenarios["Oil Production (bbl/day)"], water_production=scenarios["Water Production (bbl/day)"],
+        capacity=capacity, thief_prv=thief_prv, turn_on_oz=turn_on, turn_off_oz=turn_off,
+        dump_period_s=scenarios["Dump Every (s)"], dump_seconds=scenarios["Dump Duration (s)"],
+        tank_qty=scenarios["Tank Quantity"], tank_size=scenarios["Tank Size (bbl)"],
+        fill_fraction=scenarios["Liquid Level (%)"] / 100,
+        oil_pressure=st.session_state.get("oil_pressure", 0.0),
+        promax_flash=st.session_state.get("promax_flash", np.nan), promax_mw=st.session_state.get("promax_mw", np.nan),
+        promax_water_flash=st.session_state.get("promax_water_flash", np.nan),
+        promax_water_mw=st.session_state.get("promax_water_mw", np.nan),
+    )
+    names = scenarios["Scenario"].fillna("").astype(str).tolist()
+    c1, c2 = st.columns(2)
+    with c1:
+        shown = st.selectbox("Chart Scenario", range(len(names)), format_func=lambda i: names[i] or f"Row {i + 1}",
+                             key="transient_shown")
+    with c2:
+        hours = st.selectbox("Chart Window (h)", [1, 4, 24], index=0, key="transient_hours")
+    result = transient.simulate(cases, trace=[shown])
+
+    over = result["seconds_above_hatch"] > 0
+    if over.any():
+        st.error(f"🚨 {int(over.sum())} scenario(s) lift the thief hatch.")
+    else:
+        st.success("No scenario reaches the thief hatch setting.")
+    st.dataframe(pd.DataFrame({
+        "Scenario": names,
+        "Peak Pressure (osig)": result["peak_osig"],
+        "Time Above Hatch (min/day)": result["seconds_above_hatch"] / 60,
+        "Device On (h/day)": result["seconds_device_on"] / 3600,
+    }).style.format({"Peak Pressure (osig)": "{:.2f}", "Time Above Hatch (min/day)": "{:.1f}",
+                     "Device On (h/day)": "{:.2f}"}))
+
+    # 1-second resolution over the first hour; coarser for longer windows.
+    seconds, pressure = transient.dense_trace(cases, result["breakpoints"][shown], shown, step_s=hours)
+    keep = seconds <= hours * 3600
+    trace = pd.DataFrame({"Time (min)": seconds[keep] / 60, "Tank Pressure (osig)": pressure[keep]})
+    line = alt.Chart(trace).mark_line().encode(x="Time (min):Q", y="Tank Pressure (osig):Q")
+    hatch = alt.Chart(pd.DataFrame({"y": [thief_prv]})).mark_rule(color="red", strokeDash=[4, 4]).encode(y="y:Q")
+    st.altair_chart(line + hatch)
+    st.caption(f"{result['events']} event steps for {len(names)} scenario(s) over 24 h.")
+
+
+with tab15:
+    dump_transient_tab()
+
+
+# -----------------------------
+# Tab 16: Portfolio
+# -----------------------------
+PORTFOLIO_PAGE_SIZES = [25, 50, 100, 250]
+
+
+@st.fragment(run_every="1s")
+def portfolio_progress(job):
+    # Polls the background load; one full rerun when it finishes shows the table.
+    if job.done:
+        st.rerun()
+    st.progress(job.progress, text=f"Reading {job.name}… {job.progress:.0%}")
+
+
+@st.fragment
+@perf.timed()
+def portfolio_tab():
+    st.header("🗂 Portfolio – Assessed Sites")
+    st.markdown("Load a `batch.py` results file (or a site table, evaluated on the way in). The table is filtered, "
+                "sorted and paged on the server, so only one page is sent to the browser.")
+
+    c1, c2 = st.columns([2, 1])
+    with c1:
+        uploaded = st.file_uploader("Results File (CSV or Parquet)", type=["csv", "parquet"], key="portfolio_file")
+    with c2:
+        path = st.text_input("…or Path on Server", value="", key="portfolio_path")
+        if st.button("Load Portfolio", key="portfolio_load", disabled=uploaded is None and not path.strip()):
+            try:
+                if uploaded is not None:
+                    # Copy the upload: the worker reads it while the script keeps rerunning.
+                    source = io.BytesIO(uploaded.getvalue())
+                    source.name, source.size = uploaded.name, uploaded.size
+                else:
+                    source = path.strip()
+                st.session_state["portfolio_job"] = portfolio.LoadJob(source)
+            except OSError as exc:
+                st.warning(f"⚠️ Couldn't open the file: {exc}")
+
+    job = st.session_state.get("portfolio_job")
+    if job is None:
+        return
+    if not job.done:
+        portfolio_progress(job)
+        return
+    if job.error or job.frame is None:
+        st.warning(f"⚠️ Couldn't read {job.name}: {job.error or 'the load stopped without a result'}")
+        return
+    frame = job.frame
+
+    margin = frame[portfolio.MARGIN]
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        st.metric("Sites", f"{len(frame):,}")
+    with c2:
+        st.metric("Undersized (margin < 0)", f"{int((margin < 0).sum()):,}")
+    with c3:
+        st.metric("Lowest Margin (mmscfd)", f"{margin.min():.5f}" if len(frame) else "–")
+
+    if portfolio.MODEL in frame.columns:
+        st.subheader("Control Device Models")
+        st.dataframe(portfolio.model_summary(frame).style.format({
+            "undersized_fraction": "{:.1%}", "min_margin": "{:.5f}", "median_margin": "{:.5f}"}))
+
+    st.subheader("Sites")
+    numeric = portfolio.numeric_columns(frame)
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        models = (st.multiselect("Control Device Model", list(frame[portfolio.MODEL].cat.categories),
+                                 key="portfolio_models") if portfolio.MODEL in frame.columns else None)
+        site_text = st.text_input("Site ID Contains", key="portfolio_site")
+    with c2:
+        margin_max = st.number_input("Capacity Margin at Most (mmscfd)", value=None, format="%.5f",
+                                     key="portfolio_margin_max")
+        sort_by = st.selectbox("Sort By", numeric + ["site_id"], key="portfolio_sort",
+                               index=numeric.index(portfolio.MARGIN) if portfolio.MARGIN in numeric else 0,
+                               format_func=lambda name: portfolio.RESULT_LABELS.get(name, name))
+    with c3:
+        page_size = st.selectbox("Rows per Page", PORTFOLIO_PAGE_SIZES, index=1, key="portfolio_page_size")
+        ascending = st.toggle("Ascending", value=True, key="portfolio_ascending")
+
+    ranges = {portfolio.MARGIN: (None, margin_max)} if margin_max is not None else {}
+    _, matching = portfolio.query(frame, models, site_text, ranges, sort_by=None, page_size=0)
+    pages = max(1, -(-matching // page_size))
+    if st.session_state.get("portfolio_page", 1) > pages:
+        st.session_state["portfolio_page"] = pages  # the filters left fewer pages
+    page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, key="portfolio_page")
+    rows, _ = portfolio.query(frame, models, site_text, ranges, sort_by, ascending, page - 1, page_size)
+    st.dataframe(rows, column_config={name: st.column_config.NumberColumn(label, format="%.5f")
+                                      for name, label in portfolio.RESULT_LABELS.items()})
+    start = (page - 1) * page_size
+    st.caption(f"Rows {min(start + 1, matching):,}–{start + len(rows):,} of {matching:,} matching "
+               f"({len(frame):,} sites).")
+
+
+with tab16:
+    portfolio_tab()
+
+
+# -----------------------------
+# Debug: Performance (only with CVS_PERF=1)
+# -----------------------------
+@st.fragment
+def performance_tab():
+    st.header("🐞 Performance")
+    st.caption(f"Records are also written to {perf.PERF_FILE}.")
+    records = pd.DataFrame(perf.recent())
+    if records.empty:
+        st.info("No reruns recorded yet.")
+        return
+
+    st.subheader("Per Section (this session)")
+    by_section = records.groupby("section")["wall_ms"].agg(["count", "mean", "max", "last"])
+    widgets = records.groupby("section")["widgets"].last()
+    st.dataframe(by_section.assign(widgets=widgets).rename(columns={
+        "count": "Runs", "mean": "Mean (ms)", "max": "Max (ms)", "last": "Last (ms)", "widgets": "Widgets (last)",
+    }).sort_values("Last (ms)", ascending=False).style.format(precision=1))
+
+    st.subheader("Session State")
+    if st.button("Measure Size", key="perf_measure_state", help="Pickles every session_state value."):
+        sizes = pd.Series(perf.measure_session_state(st.session_state), name="Bytes").sort_values(ascending=False)
+        st.metric("Total Size", f"{sizes.sum() / 1024:,.1f} KiB", help=f"{len(sizes)} keys")
+        st.dataframe(sizes.head(20))
+
+    st.subheader("Recomputed on Last Edit")
+    graph = site_graph()
+    st.caption(f"Graph revision {graph.revision}: {len(graph.recomputed)} of {len(graph.nodes)} derived values "
+               "recomputed since the last input change.")
+    st.write(", ".join(graph.recomputed) or "—")
+
+    if stagecache.ENABLED:
+        st.subheader("Stage Cache")
+        entries, size = stagecache.shared().disk_usage()
+        st.caption(f"{entries:,} entries, {size / 1024:,.1f} KiB on disk (limit {stagecache.MAX_BYTES / 2 ** 20:,.0f} MiB).")
+        st.dataframe(pd.DataFrame(stagecache.shared().stats()).T.fillna(0).astype(int))
+
+    st.subheader("Recent Records")
+    st.dataframe(records.drop(columns="session").tail(50).iloc[::-1])
+
+
+# -----------------------------
+# Tab 17: Scenarios
+# -----------------------------
+SCENARIO_CONFIG = {
+    "Scenario": st.column_config.TextColumn("Scenario", required=True),
+    "Input": st.column_config.SelectboxColumn("Input", options=scenarios.INPUT_NAMES, required=True),
+    "Value": st.column_config.NumberColumn("Value", format="%.4f"),
+}
+
+
+def set_scenarios(named):
+    """Replace the scenarios from outside their editor (e.g. loading a project)."""
+    st.session_state["scenarios"] = named
+    st.session_state["scenario_table"] = scenarios.table(named)
+    st.session_state["scenario_rev"] = st.session_state.get("scenario_rev", 0) + 1
+
+
+@st.fragment
+@perf.timed()
+def scenarios_tab():
+    st.header("🔁 Scenarios – Management of Change")
+    st.markdown("Each scenario lists only the inputs it changes from the current site, one row per input: tab "
+                "inputs by name, header cells as `header_field_size` (e.g. `flare1_globe_valve_2in`). "
+                "Scenarios are saved with the project.")
+    table = st.session_state.setdefault("scenario_table", scenarios.table({}))
+    edited = st.data_editor(table, key=f"scenario_rows_{st.session_state.get('scenario_rev', 0)}",
+                            column_config=SCENARIO_CONFIG, num_rows="dynamic", hide_index=True)
+    named = st.session_state["scenarios"] = scenarios.from_table(edited)
+    if not named:
+        st.info("Add rows to define a scenario, e.g. Scenario “2 more tanks”, Input `oil_tank_qty`, Value 9.")
+        return
+
+    start = time.perf_counter()
+    try:
+        frame, recomputed = scenarios.compare(site_graph(), named)
+    except scenarios.ScenarioError as exc:
+        st.warning(f"⚠️ {exc}")
+        return
+    elapsed = (time.perf_counter() - start) * 1000
+    deltas = [f"{name}{scenarios.DELTA_SUFFIX}" for name in named]
+    st.dataframe(frame.style.format("{:.5f}").map(
+        lambda value: "color: #c0392b" if value < 0 else ("color: #1e8449" if value > 0 else ""),
+        subset=pd.IndexSlice[[scenarios.COMPARE["capacity_margin"]], deltas]))
+    over = [name for name in named if frame.at[scenarios.COMPARE["capacity_margin"], name] < 0]
+    if over:
+        st.warning(f"⚠️ Over capacity at design pressure: {', '.join(over)}")
+    counts = ", ".join(f"{name} {len(nodes)}" for name, nodes in recomputed.items())
+    st.caption(f"{len(named)} scenario(s) compared in {elapsed:.1f} ms. Values recomputed per scenario "
+               f"(of {len(site_graph().nodes)}): {counts}.")
+
+
+with tab17:
+    scenarios_tab()
+
+
+if debug_tab:
+    with debug_tab[0]:
+        performance_tab()
+
+with st.sidebar:
+    project_panel()
+
+# What the views show after a full run; publish() compares edits against it.
+st.session_state["shared_values"] = shared_values()
+perf.finish_run()
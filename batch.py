@@ -0,0 +1,203 @@
+"""Batch runner: stream a site table through the CVS calculator.
+
+    python batch.py sites.csv results.csv --workers 8 --chunksize 20000
+
+Input and output may be CSV or Parquet (Parquet needs ``pyarrow``). Input
+columns are the names in ``engine.SITE_DEFAULTS`` plus flattened header
+columns such as ``flare1_globe_valve_2in``; anything missing takes the app's
+default. Identifier columns (``--id-columns``) are copied through to the
+output. With ``--promax DIR`` missing PROMAX inputs are looked up by
+``site_id`` in that directory's export index (see ``promax.py``), and
+``--max-production`` adds each site's maximum oil and water production (see
+``headroom.py``). Chunks are evaluated on a process pool with a bounded
+number in flight and written in input order, so memory stays flat for any
+file size.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import catalog
+import engine
+import headroom
+import projects
+import promax
+
+DEFAULT_ID_COLUMNS = ["site_id", "site_name", "control_device_model"]
+
+
+def evaluate_frame(df, id_columns=DEFAULT_ID_COLUMNS, promax_dir=None, max_production=False):
+    """Evaluate every row of a site DataFrame and return the results DataFrame.
+
+    Missing control device inputs are filled from the catalog by
+    ``control_device_model`` first, and missing PROMAX inputs from the
+    ``promax_dir`` export index by ``site_id`` when one is given. With
+    ``max_production`` the ``headroom.max_production`` columns are added.
+    """
+    df = catalog.join_sites(df)
+    if promax_dir is not None:
+        # The parent process scanned the directory; workers only load the index.
+        df = promax.join_sites(df, promax.shared(promax_dir, refresh=False))
+    columns = {name: pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=float)
+               for name in df.columns if name not in id_columns}
+    results = engine.evaluate_sites(columns, len(df))
+    if max_production:
+        results.update(headroom.max_production(columns, len(df), results))
+    out = pd.DataFrame(results, index=df.index)
+    ids = [name for name in id_columns if name in df.columns]
+    if ids:
+        out = pd.concat([df[ids], out], axis=1)
+    return out
+
+
+def _is_parquet(path):
+    return os.path.splitext(path)[1].lower() in (".parquet", ".pq")
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        sys.exit("Parquet support requires pyarrow (pip install pyarrow).")
+    return pq
+
+
+def project_row(path):
+    inputs, headers, ui = projects.load(path)
+    return {"site_id": os.path.basename(path)[:-len(projects.SUFFIX)], "control_device_model": ui.get("cd_model"),
+            **projects.site_row(inputs, headers)}
+
+
+def iter_chunks(path, chunksize, columns=None):
+    """Yield DataFrames of at most ``chunksize`` rows from a CSV or Parquet file.
+
+    ``path`` may also be an open file object, which is read as CSV unless it
+    has a Parquet ``name``. A project file (``*.cvs.json``) or a directory of
+    them reads as one row per project. ``columns`` limits what is read.
+    """
+    if projects.is_project_path(path):
+        # A project file, or a directory of them: one site row per project.
+        paths = projects.project_paths(path)
+        for start in range(0, len(paths), chunksize):
+            rows = [project_row(p) for p in paths[start:start + chunksize]]
+            frame = pd.DataFrame(rows)
+            yield frame if columns is None else frame.reindex(columns=columns)
+    elif _is_parquet(getattr(path, "name", path)):
+        pq = _require_pyarrow()
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+
+
+def _process_chunk(chunk, id_columns, as_csv, header, promax_dir=None, max_production=False):
+    # Runs in a worker: CSV formatting is the slowest step, so do it here too.
+    out = evaluate_frame(chunk, id_columns, promax_dir, max_production)
+    if as_csv:
+        return len(out), out.to_csv(header=header, index=False)
+    return len(out), out
+
+
+class ResultWriter:
+    """Append result chunks to a CSV or Parquet file as they arrive."""
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._parquet = None
+        self._first = True
+
+    @property
+    def as_csv(self):
+        return not _is_parquet(self.path)
+
+    def write(self, rows, data):
+        """Write a chunk: CSV text for CSV output, a DataFrame for Parquet."""
+        if self.as_csv:
+            with open(self.path, "w" if self._first else "a", newline="") as f:
+                f.write(data)
+        else:
+            pq = _require_pyarrow()
+            import pyarrow as pa
+            table = pa.Table.from_pandas(data, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table)
+        self._first = False
+        self.rows += rows
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def run(input_path, output_path, workers=None, chunksize=10_000, id_columns=DEFAULT_ID_COLUMNS, progress=None,
+        promax_dir=None, max_production=False):
+    """Evaluate ``input_path`` into ``output_path``; returns ``(rows, seconds)``."""
+    workers = workers or os.cpu_count() or 1
+    if promax_dir is not None:
+        promax.PromaxIndex(promax_dir).refresh(workers)
+    writer = ResultWriter(output_path)
+    start = time.perf_counter()
+
+    def report():
+        if progress:
+            elapsed = time.perf_counter() - start
+            progress(writer.rows, elapsed)
+
+    try:
+        if workers == 1:
+            for i, chunk in enumerate(iter_chunks(input_path, chunksize)):
+                writer.write(*_process_chunk(chunk, id_columns, writer.as_csv, i == 0, promax_dir,
+                                            max_production))
+                report()
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Keep a bounded queue of chunks in flight and write in order.
+                pending = deque()
+                for i, chunk in enumerate(iter_chunks(input_path, chunksize)):
+                    pending.append(pool.submit(_process_chunk, chunk, id_columns, writer.as_csv, i == 0, promax_dir,
+                                               max_production))
+                    if len(pending) >= 2 * workers:
+                        writer.write(*pending.popleft().result())
+                        report()
+                while pending:
+                    writer.write(*pending.popleft().result())
+                    report()
+    finally:
+        writer.close()
+    return writer.rows, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the closed vent system calculator over a site table.")
+    parser.add_argument("input", help="site table (.csv or .parquet), project file, or directory of projects")
+    parser.add_argument("output", help="results file (.csv or .parquet)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=10_000, help="rows per chunk (default: 10000)")
+    parser.add_argument("--id-columns", default=",".join(DEFAULT_ID_COLUMNS),
+                        help="comma-separated columns copied to the output "
+                             "(default: site_id,site_name,control_device_model)")
+    parser.add_argument("--promax", help="directory of PROMAX exports to fill missing flash/MW inputs by site_id")
+    parser.add_argument("--max-production", action="store_true",
+                        help="add the maximum oil/water production each site's vent system allows")
+    args = parser.parse_args(argv)
+
+    def progress(rows, elapsed):
+        rate = rows / elapsed if elapsed else 0.0
+        print(f"\r{rows:,} rows  {rate:,.0f} rows/s", end="", file=sys.stderr, flush=True)
+
+    id_columns = [name for name in args.id_columns.split(",") if name]
+    rows, elapsed = run(args.input, args.output, args.workers, args.chunksize, id_columns, progress, args.promax,
+                        args.max_production)
+    rate = rows / elapsed if elapsed else 0.0
+    print(f"\r{rows:,} rows in {elapsed:.2f} s ({rate:,.0f} rows/s) -> {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Benchmarks: app rerun times and engine throughput.
+
+    python bench.py                  # run and compare with bench_baseline.json
+    python bench.py --update         # run and store the results as the new baseline
+    python bench.py --only engine    # just the calculation throughput
+
+The app is driven headlessly with Streamlit's AppTest: a cold start in a
+fresh interpreter, the first full render, a warm full rerun, one
+number-input edit on every tab that has one, and one cell edit in each
+header grid (AppTest reruns the whole script, so edit times are an upper
+bound on a fragment rerun). App results are keyed by tab label
+(``app.edit.main_process``) or header (``app.edit.grid_vent1``). Engine
+benchmarks report configurations per second for PPIVFR + capacity flow,
+header capacity and whole-site evaluation at a few table sizes.
+Everything runs offline.
+
+Each result is the best of ``--repeat`` runs: the fastest run is the one
+least disturbed by the rest of the machine, so it varies far less between
+runs than a median of a few. A result more than
+``--tolerance`` worse than its baseline (default 50%) is a regression and
+the exit status is 1. Baselines are machine-specific; refresh them with
+``--update`` when moving to new hardware.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import engine
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(HERE, "app.py")
+BASELINE_PATH = os.path.join(HERE, "bench_baseline.json")
+TOLERANCE = 0.5
+REPEAT = 9
+APP_TIMEOUT = 120
+ENGINE_SIZES = (1_000, 10_000, 100_000)
+
+COLD_START = (
+    "from streamlit.testing.v1 import AppTest\n"
+    f"at = AppTest.from_file({APP_PATH!r}, default_timeout={APP_TIMEOUT}).run()\n"
+    "assert not at.exception, at.exception\n"
+)
+
+
+def best_time(fn, repeat):
+    """Shortest wall time (s) of ``repeat`` calls to ``fn``."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def slug(label):
+    """A result-name part for a tab label: "🌊 Main Process" -> "main_process"."""
+    return re.sub(r"[^a-z0-9]+", "_", label.lower()).strip("_")
+
+
+def result(value, unit, higher_is_better=False):
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+# -----------------------------
+# App (AppTest)
+# -----------------------------
+def bench_cold_start(repeat):
+    """Fresh interpreter: import Streamlit and the app, render once."""
+    def run():
+        subprocess.run([sys.executable, "-c", COLD_START], cwd=HERE, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return {"app.cold_start": result(best_time(run, repeat), "s")}
+
+
+def bench_app(repeat):
+    """First render, warm full rerun, one widget edit per tab and one cell edit per header grid."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=APP_TIMEOUT)
+    start = time.perf_counter()
+    at.run()
+    results = {"app.first_render": result(time.perf_counter() - start, "s")}
+    if at.exception:
+        raise RuntimeError(f"App raised on first render: {at.exception}")
+    results["app.rerun"] = result(best_time(at.run, repeat), "s")
+
+    for tab in at.tabs:
+        if not len(tab.number_input):
+            continue
+        key = tab.number_input[0].key
+        original = at.number_input(key=key).value
+        toggle = iter(range(repeat))
+
+        def edit():
+            # Alternate between two values so every edit is a real change.
+            widget = at.number_input(key=key)
+            widget.set_value(original + (1 if next(toggle) % 2 == 0 else 0)).run()
+
+        results[f"app.edit.{slug(tab.label)}"] = result(best_time(edit, repeat), "s")
+        at.number_input(key=key).set_value(original).run()
+        if at.exception:
+            raise RuntimeError(f"App raised after editing {tab.label}: {at.exception}")
+
+    for header in engine.HEADERS:
+        # AppTest can't type into a data_editor, so apply the edit the way the
+        # grid's on_change does: to the header's array in session_state.
+        key = f"header_{header}"
+        original = np.array(at.session_state[key])
+        toggle = iter(range(repeat))
+
+        def edit():
+            grid = original.copy()
+            grid[0, 0] += 1 if next(toggle) % 2 == 0 else 0
+            at.session_state[key] = grid
+            at.run()
+
+        results[f"app.edit.grid_{header}"] = result(best_time(edit, repeat), "s")
+        at.session_state[key] = original
+        at.run()
+        if at.exception:
+            raise RuntimeError(f"App raised after editing the {header} grid: {at.exception}")
+    return results
+
+
+# -----------------------------
+# Engine throughput
+# -----------------------------
+def random_sites(n, rng):
+    """A site table of ``n`` rows with every header filled in."""
+    columns = {
+        "oil_production": rng.uniform(0, 3000, n),
+        "oil_pressure": rng.uniform(0, 200, n),
+        "surge_percent": rng.uniform(0, 100, n),
+        "water_production": rng.uniform(0, 2000, n),
+        "thief_prv_input": rng.uniform(4, 16, n),
+        "leaking_safety": rng.uniform(0, 3, n),
+    }
+    for header in engine.HEADERS:
+        for size in engine.SIZE_SLUGS:
+            columns[engine.header_column(header, "dev", size)] = rng.uniform(0, 100, n)
+            for fitting in engine.FITTING_SLUGS:
+                columns[engine.header_column(header, fitting, size)] = rng.integers(0, 4, n).astype(float)
+    return columns
+
+
+def bench_engine(repeat, sizes=ENGINE_SIZES):
+    rng = np.random.default_rng(0)
+    results = {}
+    for n in sizes:
+        inputs = {
+            "oil_production": rng.uniform(0, 3000, n),
+            "oil_pressure": rng.uniform(0, 200, n),
+            "surge_percent": rng.uniform(0, 100, n),
+            "water_production": rng.uniform(0, 2000, n),
+            "thief_prv_input": rng.uniform(4, 16, n),
+            "nps_length": rng.uniform(10, 500, n),
+        }
+        secs = best_time(lambda: engine.ppivfr_and_capacity_flow(inputs), repeat)
+        results[f"engine.ppivfr.{n}"] = result(n / secs, "configs/s", True)
+
+        developed = rng.uniform(0, 100, (n, engine.N_SIZES))
+        fittings = rng.integers(0, 4, (n, engine.N_FITTINGS, engine.N_SIZES))
+        secs = best_time(lambda: engine.header_capacity(engine.header_lengths(developed, fittings)[1]), repeat)
+        results[f"engine.header_capacity.{n}"] = result(n / secs, "configs/s", True)
+
+        columns = random_sites(n, rng)
+        secs = best_time(lambda: engine.evaluate_sites(columns, n), repeat)
+        results[f"engine.evaluate_sites.{n}"] = result(n / secs, "sites/s", True)
+    return results
+
+
+BENCHMARKS = {
+    "cold": bench_cold_start,
+    "app": bench_app,
+    "engine": bench_engine,
+}
+
+
+# -----------------------------
+# Baselines
+# -----------------------------
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    with open(path, "w") as f:
+        json.dump({"python": sys.version.split()[0], "numpy": np.__version__, "results": results}, f,
+                  indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Rows of ``(name, value, baseline, change, regressed)``; change > 0 is worse."""
+    rows = []
+    for name, res in results.items():
+        base = baseline.get(name, {}).get("value")
+        if base is None:
+            rows.append((name, res, None, None, False))
+            continue
+        if res["higher_is_better"]:
+            change = base / res["value"] - 1 if res["value"] else np.inf
+        else:
+            change = res["value"] / base - 1 if base else 0.0
+        rows.append((name, res, base, change, change > tolerance))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time app reruns and engine throughput against stored baselines.")
+    parser.add_argument("--only", choices=sorted(BENCHMARKS), action="append", help="run only these groups")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="runs per result; the best one counts")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown (0.5 = 50%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update", action="store_true", help="store these results as the baseline")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for group in args.only or BENCHMARKS:
+        results.update(BENCHMARKS[group](args.repeat))
+
+    baseline = load_baseline(args.baseline)
+    rows = compare(results, baseline, args.tolerance)
+    for name, res, base, change, regressed in rows:
+        base_text = "" if base is None else f"  baseline {base:,.4g}  {change:+.0%}"
+        print(f"{'FAIL' if regressed else 'ok  '}  {name:<32} {res['value']:>14,.4g} {res['unit']}{base_text}")
+
+    if args.update:
+        save_baseline({**baseline, **results}, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    return 1 if any(row[-1] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""Control device catalog: flare, combustor and VRU models with their ratings.
+
+The catalog ships as ``control_devices.csv`` (one row per model:
+manufacturer, model, device_type, rated_capacity in MMSCFD/SQRT(psig) at
+SG=1, turn_on_oz, turn_off_oz). It is loaded once per process into an
+indexed SQLite database with each model's 3" equivalent length
+(``engine.control_device_le``) precomputed, so picking a model costs one
+primary-key lookup. Type-ahead search matches word prefixes of the
+manufacturer and model through an indexed token table. ``CVS_CATALOG`` may
+point at another CSV, or at a database written by ``python catalog.py
+build``.
+
+    python catalog.py build control_devices.db
+    python catalog.py search "svg 3b"
+"""
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+import engine
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CATALOG_PATH = os.environ.get("CVS_CATALOG", os.path.join(HERE, "control_devices.csv"))
+DEVICE_TYPES = ("flare", "combustor", "vru")
+SEARCH_LIMIT = 20
+
+SCHEMA = """
+CREATE TABLE devices (
+    id INTEGER PRIMARY KEY,
+    manufacturer TEXT NOT NULL,
+    model TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    device_type TEXT NOT NULL,
+    rated_capacity REAL NOT NULL,
+    turn_on_oz REAL NOT NULL DEFAULT 0,
+    turn_off_oz REAL NOT NULL DEFAULT 0,
+    le_ft REAL NOT NULL
+);
+CREATE TABLE tokens (token TEXT NOT NULL, device_id INTEGER NOT NULL REFERENCES devices (id));
+CREATE INDEX tokens_token ON tokens (token, device_id);
+"""
+COLUMNS = ["id", "manufacturer", "model", "device_type", "rated_capacity", "turn_on_oz", "turn_off_oz", "le_ft"]
+
+_lock = threading.Lock()
+_db = None
+_frame = None
+
+
+def tokens(text):
+    """Lower-case search words of ``text``: whole words and their ``-``/``/`` parts."""
+    words = set()
+    for word in str(text).lower().split():
+        words.add(word)
+        words.update(part for part in re.split(r"[-/._]", word) if part)
+    return words
+
+
+def build(rows, path=":memory:"):
+    """Create a catalog database from ``rows`` (dicts with the CSV columns)."""
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.executescript(SCHEMA)
+    for row in rows:
+        capacity = float(row["rated_capacity"])
+        device_type = row.get("device_type", "flare").strip().lower()
+        if device_type not in DEVICE_TYPES:
+            raise ValueError(f"{row['model']}: unknown device type {device_type!r}")
+        cur = db.execute(
+            "INSERT INTO devices (manufacturer, model, device_type, rated_capacity, turn_on_oz, turn_off_oz, le_ft)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (row["manufacturer"].strip(), row["model"].strip(), device_type, capacity,
+             float(row.get("turn_on_oz") or 0.0), float(row.get("turn_off_oz") or 0.0),
+             float(engine.control_device_le(capacity))))
+        db.executemany("INSERT INTO tokens VALUES (?, ?)",
+                       [(token, cur.lastrowid) for token in tokens(f"{row['manufacturer']} {row['model']}")])
+    db.commit()
+    return db
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def connect(path=None):
+    """The process-wide catalog database, loaded on first use."""
+    global _db, _frame
+    with _lock:
+        if _db is None or path is not None:
+            _frame = None
+            path = path or CATALOG_PATH
+            if path.endswith(".csv"):
+                _db = build(read_csv(path))
+            else:
+                _db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        return _db
+
+
+def _rows(cursor):
+    return [dict(zip(COLUMNS, row)) for row in cursor.fetchall()]
+
+
+def search(text, limit=SEARCH_LIMIT, device_type=None):
+    """Models whose manufacturer/model words start with every word typed, by model name.
+
+    Each word is an index range scan on the token table (``token >= word AND
+    token < word + U+10FFFF``), so a search stays fast however large the
+    catalog gets. An empty search lists the first ``limit`` models.
+    """
+    words = sorted(tokens(text), key=len, reverse=True)[:5]
+    sql = "SELECT " + ", ".join(COLUMNS) + " FROM devices"
+    clauses, args = [], []
+    for word in words:
+        clauses.append("id IN (SELECT device_id FROM tokens WHERE token >= ? AND token < ?)")
+        args += [word, word + "\U0010ffff"]
+    if device_type:
+        clauses.append("device_type = ?")
+        args.append(device_type)
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY model LIMIT ?"
+    db = connect()
+    with _lock:
+        return _rows(db.execute(sql, (*args, limit)))
+
+
+def get(device_id):
+    db = connect()
+    with _lock:
+        rows = _rows(db.execute("SELECT " + ", ".join(COLUMNS) + " FROM devices WHERE id = ?", (device_id,)))
+    return rows[0] if rows else None
+
+
+def frame():
+    """The whole catalog as a DataFrame indexed by lower-case model name (read once)."""
+    global _frame
+    db = connect()
+    with _lock:
+        if _frame is None:
+            df = pd.DataFrame(_rows(db.execute("SELECT " + ", ".join(COLUMNS) + " FROM devices")), columns=COLUMNS)
+            _frame = df.set_index(df["model"].str.lower())
+        return _frame
+
+
+# Site columns filled from the catalog, by catalog column.
+SITE_COLUMNS = {"rated_capacity": "cd_capacity", "turn_on_oz": "cd_turn_on", "turn_off_oz": "cd_turn_off"}
+
+
+def join_sites(df, model_column="control_device_model"):
+    """Fill a site table's missing control device inputs from the catalog.
+
+    Sites whose ``cd_capacity``/``cd_turn_on``/``cd_turn_off`` are absent or
+    blank take the catalog values of their ``model_column`` model; values
+    already given are kept, and models not in the catalog change nothing.
+    The lookup is one vectorized index join per column (on the distinct
+    models), not a query per row.
+    """
+    if model_column not in df.columns:
+        return df
+    keys = df[model_column].astype("string").str.strip().str.lower()
+    codes, uniques = pd.factorize(keys)
+    devices = frame().reindex(pd.Index(uniques, dtype=object))
+    df = df.copy()
+    for catalog_column, site_column in SITE_COLUMNS.items():
+        # codes of -1 (no model) index the appended NaN.
+        values = np.append(devices[catalog_column].to_numpy(dtype=float), np.nan)[codes]
+        if site_column in df.columns:
+            given = pd.to_numeric(df[site_column], errors="coerce").to_numpy(dtype=float)
+            missing = np.isnan(given)
+        else:
+            given = np.full(len(df), engine.SITE_DEFAULTS[site_column], dtype=float)
+            missing = np.ones(len(df), dtype=bool)
+        df[site_column] = np.where(missing & ~np.isnan(values), values, given)
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or search the control device catalog.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("build", help="write the CSV catalog to an indexed SQLite database")
+    p.add_argument("output")
+    p.add_argument("--csv", default=os.path.join(HERE, "control_devices.csv"))
+    p = sub.add_parser("search", help="type-ahead search")
+    p.add_argument("text")
+    p.add_argument("--limit", type=int, default=SEARCH_LIMIT)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        if os.path.exists(args.output):
+            os.remove(args.output)
+        build(read_csv(args.csv), args.output).close()
+        print(f"Catalog written to {args.output}", file=sys.stderr)
+        return 0
+    for row in search(args.text, args.limit):
+        print(f"{row['model']:<40} {row['device_type']:<10} {row['rated_capacity']:8.3f} "
+              f"{row['turn_on_oz']:5.1f} {row['turn_off_oz']:5.1f} {row['le_ft']:10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""Incremental recomputation of the app's derived values.
+
+The calculations form a dependency graph. Input nodes are widget values and
+header grids, named as in ``engine.SITE_DEFAULTS`` plus ``header_<name>``.
+Derived nodes are engine functions of named dependencies::
+
+    oil_pressure, promax_* -> flash_working -> oil_ppivfr -> total_ppivfr
+    header_vent1 -> vent1_total_pipe -> vent1_total_pipe_nps -> vent1_total_nps -> vent1_capacity
+
+``Graph.set`` stores inputs, and a value equal to the current one changes
+nothing. Reading a node (``graph["total_ppivfr"]``) recomputes it only if an
+upstream value changed since it was last verified. A recomputed node whose
+value comes out unchanged does not invalidate its own dependents (early
+cutoff). ``Graph.recomputed`` lists the derived nodes recomputed since the
+last input change, which shows what an edit actually cost.
+``Graph.evaluate_variants`` evaluates several sets of changes against a
+computed graph (``scenarios.py``). Each reuses what it doesn't affect, and a
+node several of them affect is computed once for all of them.
+
+The header length and capacity nodes go through ``stagecache``, so a header
+that does recompute still reuses a result another session computed. The
+scalar nodes are cheaper to compute than to look up.
+"""
+import numpy as np
+
+import engine
+import header_grid
+import stagecache
+
+_MISSING = object()
+
+
+def same(a, b):
+    """Value equality for node values: arrays elementwise, NaN equal to NaN."""
+    if a is b:
+        return True
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        a, b = np.asarray(a), np.asarray(b)
+        return a.shape == b.shape and bool(np.array_equal(a, b, equal_nan=a.dtype.kind == "f"))
+    try:
+        return bool(a == b) or (a != a and b != b)
+    except (TypeError, ValueError):
+        return False
+
+
+class Graph:
+    """Input values plus lazily recomputed derived nodes.
+
+    ``nodes`` maps each derived node to ``(function, dependency names)``;
+    ``inputs`` gives every input node's starting value.
+    """
+
+    def __init__(self, nodes, inputs):
+        self.nodes = nodes
+        self.revision = 0
+        self.recomputed = []
+        self._values = dict(inputs)
+        self._changed = dict.fromkeys(inputs, 0)  # revision each value last changed
+        self._verified = {}  # revision each derived node was last checked
+        self._downstream = {}
+
+    def set(self, **values):
+        """Set input values; returns the names whose value actually changed."""
+        changed = [name for name, value in values.items() if not same(self._values.get(name, _MISSING), value)]
+        if changed:
+            self.revision += 1
+            self.recomputed = []
+            for name in changed:
+                self._values[name] = values[name]
+                self._changed[name] = self.revision
+        return changed
+
+    def __getitem__(self, name):
+        if name not in self.nodes:
+            return self._values[name]
+        if self._verified.get(name) == self.revision:
+            return self._values[name]
+        fn, deps = self.nodes[name]
+        args = [self[dep] for dep in deps]
+        verified = self._verified.get(name, -1)
+        if any(self._changed[dep] > verified for dep in deps):
+            value = fn(*args)
+            self.recomputed.append(name)
+            if not same(self._values.get(name, _MISSING), value):
+                self._values[name] = value
+                self._changed[name] = self.revision
+        self._verified[name] = self.revision
+        return self._values[name]
+
+    def get(self, *names):
+        return tuple(self[name] for name in names)
+
+    def evaluate_variants(self, variants, names):
+        """Read ``names`` under several sets of input changes, leaving this graph as it is.
+
+        ``variants`` is a list of ``Graph.set``-style dicts. Nodes a variant
+        doesn't affect keep this graph's values. Each affected node is computed
+        once for all the variants that affect it, with their arguments stacked
+        on a new leading axis (node functions broadcast, as the engine's do).
+        Returns ``(values, recomputed)``: per variant, a tuple of ``names`` and
+        the list of nodes it recomputed.
+        """
+        self.get(*names)  # everything upstream is now verified
+        order = self._upstream(names)
+        overrides, dirty = [], []
+        for variant in variants:
+            changed = {name: value for name, value in variant.items()
+                       if not same(self._values.get(name, _MISSING), value)}
+            overrides.append(changed)
+            dirty.append(set().union(*(self._dependents(name) for name in changed)))
+        for node in order:
+            rows = [i for i, nodes in enumerate(dirty) if node in nodes]
+            if not rows:
+                continue
+            fn, deps = self.nodes[node]
+            stacked = fn(*[np.stack([np.asarray(overrides[i].get(dep, self._values[dep])) for i in rows])
+                           for dep in deps])
+            for j, i in enumerate(rows):
+                overrides[i][node] = stacked[j]
+        values = [tuple(changed.get(name, self._values[name]) for name in names) for changed in overrides]
+        return values, [[node for node in order if node in nodes] for nodes in dirty]
+
+    def _upstream(self, names):
+        """Derived nodes ``names`` depend on (themselves included), dependencies first."""
+        order, seen = [], set()
+
+        def visit(name):
+            if name in seen or name not in self.nodes:
+                return
+            seen.add(name)
+            for dep in self.nodes[name][1]:
+                visit(dep)
+            order.append(name)
+
+        for name in names:
+            visit(name)
+        return order
+
+    def _dependents(self, name):
+        if name not in self._downstream:
+            self._downstream[name] = self.downstream(name)
+        return self._downstream[name]
+
+    def downstream(self, name):
+        """Every derived node that depends, directly or not, on ``name``."""
+        found, frontier = set(), {name}
+        while frontier:
+            frontier = {node for node, (_, deps) in self.nodes.items()
+                        if node not in found and frontier.intersection(deps)}
+            found |= frontier
+        return found
+
+
+# -----------------------------
+# The site graph
+# -----------------------------
+def design_pressure_clamped(design_pressure):
+    return np.maximum(design_pressure, 0.0)
+
+
+def total(*values):
+    return sum(values)
+
+
+def total_pipe(grid):
+    return engine.header_lengths(*header_grid.grid_to_arrays(grid))[0]
+
+
+def nps_sum(total_pipe_nps):
+    return np.asarray(total_pipe_nps).sum(axis=-1)
+
+
+def margin(red_capacity, design_pressure, total_ppivfr):
+    return engine.flow_capacity(red_capacity, design_pressure) - total_ppivfr
+
+
+def reduced_capacity(le_ft, total_nps):
+    return engine.reduced_capacity(le_ft, total_nps)[1]
+
+
+def wfittings_ft(le_ft, total_nps):
+    return np.asarray(le_ft) + total_nps
+
+
+SITE_NODES = {
+    # Tank Layout
+    "oil_tank_scfh": (engine.oil_tank_scfh, ("oil_tank_qty", "oil_tank_size")),
+    "water_tank_scfh": (engine.water_tank_scfh, ("water_tank_qty", "water_tank_size")),
+    "total_thermal_ppivfr": (engine.thermal_ppivfr, ("oil_tank_scfh", "water_tank_scfh")),
+    # Tab 1 shows this as entered; every total uses the clamped value.
+    "design_pressure_unclamped": (engine.design_pressure, ("thief_prv_input", "leaking_safety")),
+    "design_pressure": (design_pressure_clamped, ("design_pressure_unclamped",)),
+    # Main Process
+    "flash_working": (engine.oil_flash_working, ("oil_pressure", "promax_flash", "promax_mw")),
+    "oil_flowrate": (engine.flowrate_gpm, ("oil_production",)),
+    "oil_adjusted_bbl": (engine.surge_adjusted_bbl, ("oil_production", "surge_percent")),
+    "oil_ppivfr": (engine.stream_ppivfr, ("flash_working", "oil_production", "surge_percent")),
+    "water_flash_working": (engine.water_flash_working, ("promax_water_flash", "promax_water_mw")),
+    "water_flowrate": (engine.flowrate_gpm, ("water_production",)),
+    "water_adjusted_bbl": (engine.surge_adjusted_bbl, ("water_production", "water_surge_percent")),
+    "water_ppivfr": (engine.stream_ppivfr, ("water_flash_working", "water_production", "water_surge_percent")),
+    # Add to Main Process
+    "other_ppivfr": (engine.other_ppivfr, ("am_liq_flow", "am_bp_pres", "am_src_drw_tk")),
+    "total_ppivfr": (total, ("oil_ppivfr", "water_ppivfr", "other_ppivfr")),
+}
+for _header in engine.HEADERS:
+    SITE_NODES.update({
+        f"{_header}_total_pipe": (stagecache.cached("header_total_pipe")(total_pipe), (f"header_{_header}",)),
+        f"{_header}_total_pipe_nps": (engine.nps_length, (f"{_header}_total_pipe",)),
+        f"{_header}_total_nps": (nps_sum, (f"{_header}_total_pipe_nps",)),
+        f"{_header}_capacity": (stagecache.cached("header_capacity")(engine.capacity_from_length),
+                                (f"{_header}_total_nps",)),
+    })
+SITE_NODES.update({
+    # Flare1 control device
+    "flare1_le_ft": (engine.control_device_le, ("cd_capacity",)),
+    "flare1_wfittings_ft": (wfittings_ft, ("flare1_le_ft", "flare1_total_nps")),
+    "flare1_red_capacity": (reduced_capacity, ("flare1_le_ft", "flare1_total_nps")),
+    "capacity_margin": (margin, ("flare1_red_capacity", "design_pressure", "total_ppivfr")),
+})
+
+
+def site_inputs():
+    """Starting values of every input node: the app defaults and empty headers."""
+    return {**engine.SITE_DEFAULTS, **{f"header_{h}": header_grid.empty_header_grid() for h in engine.HEADERS}}
+
+
+def site_graph():
+    return Graph(SITE_NODES, site_inputs())
@@ -0,0 +1,426 @@
+"""Closed vent system calculations, free of any Streamlit dependency.
+
+Every function accepts scalars or NumPy arrays and broadcasts, so one call can
+evaluate a single site from the UI or tens of thousands of configurations from
+a batch job. Header inputs are laid out with fitting/knockout/valve slots as
+rows and the eight pipe sizes as the last axis, i.e. ``(..., rows, n_sizes)``.
+"""
+import numpy as np
+
+# -----------------------------
+# Constants
+# -----------------------------
+ID_CONFIGS = [
+    {"label": '1.5"', "id_in": 1.338},
+    {"label": '2"', "id_in": 2.067},
+    {"label": '3"', "id_in": 3.068},
+    {"label": '4"', "id_in": 4.026},
+    {"label": '6"', "id_in": 6.070},
+    {"label": '8"', "id_in": 7.981},
+    {"label": '10"', "id_in": 10.020},
+    {"label": '12"', "id_in": 11.938},
+]
+
+FITTINGS = [
+    ("Tee, Flow thru run", 20),
+    ("Tee, Flow thru branch", 60),
+    ("Elbow, 90° Threaded", 30),
+    ("Elbow, 45° Threaded", 16),
+    ("Elbow, 90° (R/D ~3)", 14),
+    ("Elbow, 45° (R/D ~3)", 9.9),
+    ("Gate Valve", 8),
+    ("Globe Valve", 340),
+    ("Ball Valve", 3),
+    ("Butterfly Valve", 45),
+    ("Check Valve", 100),
+    ("Entrance / Exit", 1),
+]
+
+N_KNOCKOUTS = 3
+N_SPECIALTY_VALVES = 3
+
+TANK_SIZES = [210, 300, 400, 500, 750, 1000]
+
+BASE_FLASH = 12.0
+DEFAULT_MW = 28.97
+DEFAULT_VAPOR_MW = 46.0
+WATER_BASE_FLASH = 6.0
+CARRYOVER_FLASH = 4.0
+DEFAULT_WATER_MW = 46.0
+AM_FLASH_FACTOR = 1.5
+
+BBL_PER_DAY_PER_GPM = 34.2
+WATER_TANK_SCFH_FACTOR = 0.6
+REFERENCE_ID = 3.068
+CAPACITY_COEFFICIENT = 0.22437
+
+PIPE_LABELS = [config["label"] for config in ID_CONFIGS]
+PIPE_IDS = np.array([config["id_in"] for config in ID_CONFIGS])
+FITTING_NAMES = [name for name, _ in FITTINGS]
+FITTING_MULTIPLIERS = np.array([mult for _, mult in FITTINGS], dtype=float)
+N_SIZES = len(PIPE_IDS)
+N_FITTINGS = len(FITTINGS)
+
+
+def friction_term(id_in):
+    """The ``1 + 3.6/ID + 0.03*ID`` friction term used throughout the sheet."""
+    return 1 + (3.6 / id_in) + (0.03 * id_in)
+
+
+# Per-ID constants, computed once at import rather than on every rerun.
+PIPE_IDS_5 = PIPE_IDS ** 5
+PIPE_FRICTION = friction_term(PIPE_IDS)
+REFERENCE_ID_5 = REFERENCE_ID ** 5
+REFERENCE_FRICTION = friction_term(REFERENCE_ID)
+
+# Multiply a length of each size by this to get feet of 3" NPS.
+NPS_FACTOR = PIPE_FRICTION * REFERENCE_ID_5 / (PIPE_IDS_5 * REFERENCE_FRICTION)
+# Equivalent length per fitting, shape (N_FITTINGS, N_SIZES).
+FITTING_LE = FITTING_MULTIPLIERS[:, None] * PIPE_IDS[None, :] / 12
+# Specialty valve Le is this divided by Cv**2.
+SPECIALTY_VALVE_FACTOR = 100 * 891 * PIPE_IDS_5 / (12 * PIPE_FRICTION)
+# Capacity is sqrt(CAPACITY_K / total 3" NPS length).
+CAPACITY_K = CAPACITY_COEFFICIENT * REFERENCE_ID_5 / REFERENCE_FRICTION
+
+
+# -----------------------------
+# Tank Layout
+# -----------------------------
+def oil_tank_scfh(qty, size):
+    return np.asarray(qty) * np.asarray(size)
+
+
+def water_tank_scfh(qty, size):
+    return np.asarray(size) * WATER_TANK_SCFH_FACTOR * np.asarray(qty)
+
+
+def thermal_ppivfr(oil_scfh, water_scfh):
+    """Total thermal PPIVFR in MMSCFD from the tank SCFH figures."""
+    return (np.asarray(oil_scfh) + water_scfh) * 24 / 1_000_000
+
+
+def design_pressure(thief_prv, leaking_safety):
+    """Design pressure (osig); negative when the safety factor exceeds the PRV."""
+    return (np.asarray(thief_prv) - leaking_safety) * 0.9
+
+
+# -----------------------------
+# Main Process
+# -----------------------------
+def parse_promax(flash_text, mw_text):
+    """Parse the optional PROMAX text inputs the way Tab 2 always has.
+
+    Returns ``(flash, mw)`` with NaN meaning "not given". An unparseable MW
+    invalidates the flash value too, so the caller falls back to the
+    calculated flash.
+    """
+    try:
+        flash = float(flash_text)
+        mw = float(mw_text) if mw_text else np.nan
+    except (TypeError, ValueError):
+        return np.nan, np.nan
+    return flash, mw
+
+
+def oil_flash_working(oil_pressure, promax_flash=np.nan, promax_mw=np.nan):
+    """Flash + working volume (SCF/BBL) for oil; NaN PROMAX values use defaults."""
+    promax_flash = np.asarray(promax_flash, dtype=float)
+    promax_mw = np.where(np.isnan(promax_mw), DEFAULT_VAPOR_MW, promax_mw)
+    promax = (BASE_FLASH + promax_flash) * np.sqrt(promax_mw / DEFAULT_MW)
+    pressure_based = (BASE_FLASH + np.asarray(oil_pressure) * 1.15 * 1.5) * np.sqrt(DEFAULT_VAPOR_MW / DEFAULT_MW)
+    return np.where(np.isnan(promax_flash), pressure_based, promax)
+
+
+def water_flash_working(promax_flash=np.nan, promax_mw=np.nan):
+    """Flash + working volume (SCF/BBL) for water; NaN PROMAX values use defaults."""
+    promax_flash = np.asarray(promax_flash, dtype=float)
+    promax_mw = np.where(np.isnan(promax_mw), DEFAULT_WATER_MW, promax_mw)
+    promax = (WATER_BASE_FLASH + promax_flash) * np.sqrt(promax_mw / DEFAULT_MW)
+    calculated = (WATER_BASE_FLASH + CARRYOVER_FLASH) * np.sqrt(DEFAULT_WATER_MW / DEFAULT_MW)
+    return np.where(np.isnan(promax_flash), calculated, promax)
+
+
+def flowrate_gpm(production):
+    return np.asarray(production) / BBL_PER_DAY_PER_GPM
+
+
+def surge_adjusted_bbl(production, surge_percent):
+    """Production (bbl/day) with the surge allowance applied."""
+    flowrate = flowrate_gpm(production)
+    return ((flowrate * np.asarray(surge_percent) / 100) + flowrate) * BBL_PER_DAY_PER_GPM
+
+
+def stream_ppivfr(flash_working, production, surge_percent):
+    """PPIVFR (MMSCFD, SG=1) of one liquid stream."""
+    return np.asarray(flash_working) * surge_adjusted_bbl(production, surge_percent) / 1_000_000
+
+
+def oil_ppivfr(oil_production, oil_pressure, surge_percent, promax_flash=np.nan, promax_mw=np.nan):
+    flash = oil_flash_working(oil_pressure, promax_flash, promax_mw)
+    return stream_ppivfr(flash, oil_production, surge_percent)
+
+
+def water_ppivfr(water_production, surge_percent, promax_flash=np.nan, promax_mw=np.nan):
+    flash = water_flash_working(promax_flash, promax_mw)
+    return stream_ppivfr(flash, water_production, surge_percent)
+
+
+def other_ppivfr(liq_flow, bp_pres, draws_from_tank):
+    """Additional process source PPIVFR from Tab 3."""
+    flash = np.where(draws_from_tank, np.asarray(bp_pres) * AM_FLASH_FACTOR, 0.0)
+    return flash * np.asarray(liq_flow)
+
+
+# -----------------------------
+# Vent headers
+# -----------------------------
+def fitting_le(counts):
+    """Equivalent length (ft) of fittings, ``(..., N_FITTINGS, N_SIZES)`` -> ``(..., N_SIZES)``."""
+    return np.einsum("...ij,ij->...j", np.asarray(counts, dtype=float), FITTING_LE)
+
+
+def knockout_le(diam, id_in=PIPE_IDS):
+    """Equivalent length (ft) of a knockout/expansion; a diameter of 0 means none."""
+    diam = np.asarray(diam, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expansion = (1 / 12) * id_in * ((1 - ((id_in ** 2) / (diam ** 2))) ** 2)
+        contraction = (1 / 12) * id_in * 0.5 * (1 - ((diam ** 2) / (id_in ** 2)))
+    le = np.where(diam > id_in, expansion, contraction)
+    return np.where(diam == 0, 0.0, le)
+
+
+def specialty_valve_le(cv, valve_factor=SPECIALTY_VALVE_FACTOR):
+    """Equivalent length (ft) of a specialty valve from its Cv; a Cv of 0 means none."""
+    cv = np.asarray(cv, dtype=float)
+    with np.errstate(divide="ignore"):
+        le = valve_factor / (cv ** 2)
+    return np.where(cv == 0, 0.0, le)
+
+
+def header_lengths(developed_length, fitting_counts=None, knockout_diams=None, specialty_cvs=None):
+    """Total header length per pipe size and its 3" NPS equivalent.
+
+    ``developed_length`` is ``(..., N_SIZES)``; the other inputs are
+    ``(..., rows, N_SIZES)`` and may be omitted. Returns
+    ``(total_pipe, total_pipe_nps)``, both ``(..., N_SIZES)``. Negative NPS
+    lengths are clamped to zero, as the header summaries always have.
+    """
+    total_pipe = np.asarray(developed_length, dtype=float)
+    if fitting_counts is not None:
+        total_pipe = total_pipe + fitting_le(fitting_counts)
+    if knockout_diams is not None:
+        total_pipe = total_pipe + knockout_le(knockout_diams).sum(axis=-2)
+    if specialty_cvs is not None:
+        total_pipe = total_pipe + specialty_valve_le(specialty_cvs).sum(axis=-2)
+    return total_pipe, nps_length(total_pipe)
+
+
+def nps_length(total_pipe):
+    """Per-size header length converted to feet of 3" NPS, clamped at zero."""
+    return np.maximum(np.asarray(total_pipe) * NPS_FACTOR, 0.0)
+
+
+def capacity_from_length(total_nps_length):
+    """Capacity (MMSCFD/SQRT(psi)) of a run of 3" NPS; 0 where the length is 0."""
+    total_nps_length = np.asarray(total_nps_length, dtype=float)
+    with np.errstate(divide="ignore"):
+        capacity = np.sqrt(CAPACITY_K / total_nps_length)
+    return np.where(total_nps_length > 0, capacity, 0.0)
+
+
+def header_capacity(total_pipe_nps):
+    """Sum the per-size 3" NPS lengths and return ``(total_nps_sum, capacity)``."""
+    total_nps_sum = np.asarray(total_pipe_nps).sum(axis=-1)
+    return total_nps_sum, capacity_from_length(total_nps_sum)
+
+
+# -----------------------------
+# Control device (Flare1)
+# -----------------------------
+def control_device_le(rated_capacity):
+    """Equivalent 3" pipe length (ft) of a control device from its rated capacity."""
+    rated_capacity = np.asarray(rated_capacity, dtype=float)
+    with np.errstate(divide="ignore"):
+        le = CAPACITY_K / (rated_capacity ** 2)
+    return np.where(rated_capacity > 0, le, 0.0)
+
+
+def reduced_capacity(le_ft, total_nps_sum):
+    """Control device capacity after the vent piping; returns ``(wfittings_ft, red_capacity)``."""
+    wfittings_ft = np.asarray(le_ft) + total_nps_sum
+    return wfittings_ft, capacity_from_length(wfittings_ft)
+
+
+def flow_capacity(capacity, pressure_osig):
+    """Flow (MMSCFD) a capacity passes at a pressure given in osig."""
+    return np.asarray(capacity) * np.sqrt(np.maximum(np.asarray(pressure_osig) / 16, 0.0))
+
+
+def ppivfr_and_capacity_flow(inputs):
+    """Total PPIVFR and capacity flow (MMSCFD) at design pressure.
+
+    ``inputs`` maps ``SITE_DEFAULTS`` names, plus ``nps_length`` (3" NPS ft of
+    the vent path), to scalars or broadcastable arrays; missing names take the
+    defaults. Physical inputs are floored at zero.
+    """
+    def col(name):
+        return inputs.get(name, SITE_DEFAULTS.get(name, 0.0))
+
+    def nonneg(name):
+        return np.maximum(col(name), 0.0)
+
+    total_ppivfr = (
+        oil_ppivfr(nonneg("oil_production"), nonneg("oil_pressure"), nonneg("surge_percent"),
+                   col("promax_flash"), col("promax_mw"))
+        + water_ppivfr(nonneg("water_production"), nonneg("water_surge_percent"),
+                       col("promax_water_flash"), col("promax_water_mw"))
+        + other_ppivfr(nonneg("am_liq_flow"), nonneg("am_bp_pres"), np.asarray(col("am_src_drw_tk")) != 0)
+    )
+    pressure = np.maximum(design_pressure(nonneg("thief_prv_input"), nonneg("leaking_safety")), 0.0)
+    capacity = capacity_from_length(nonneg("nps_length"))
+    return total_ppivfr, flow_capacity(capacity, pressure)
+
+
+def pressure_drop(flow, total_nps_length):
+    """Pressure drop (osig) of ``flow`` MMSCFD through a run of 3" NPS."""
+    return 16 * (np.asarray(flow) ** 2) * np.asarray(total_nps_length) / CAPACITY_K
+
+
+def max_nps_length(flow, pressure_osig):
+    """Longest run of 3" NPS that passes ``flow`` MMSCFD within ``pressure_osig``."""
+    flow = np.asarray(flow, dtype=float)
+    with np.errstate(divide="ignore"):
+        length = CAPACITY_K * np.maximum(np.asarray(pressure_osig) / 16, 0.0) / (flow ** 2)
+    return np.where(flow > 0, length, np.inf)
+
+
+# -----------------------------
+# Site tables
+# -----------------------------
+# Column names used by batch runs, saved projects and imports. Header inputs
+# are flattened to ``{header}_{field}_{size}``, e.g. ``flare1_globe_valve_2in``.
+HEADERS = ["vent1", "vent2", "flare", "flare1"]
+HEADER_KEY_SUFFIXES = {"vent1": "", "vent2": "_vent2", "flare": "_flare", "flare1": "_flare1"}
+SIZE_SLUGS = ["1.5in", "2in", "3in", "4in", "6in", "8in", "10in", "12in"]
+FITTING_SLUGS = [
+    "tee_run", "tee_branch", "elbow90_threaded", "elbow45_threaded", "elbow90_long", "elbow45_long",
+    "gate_valve", "globe_valve", "ball_valve", "butterfly_valve", "check_valve", "entrance_exit",
+]
+KNOCKOUT_SLUGS = [f"knockout{i + 1}" for i in range(N_KNOCKOUTS)]
+SPECIALTY_SLUGS = [f"cv{i + 1}" for i in range(N_SPECIALTY_VALVES)]
+
+SITE_DEFAULTS = {
+    "oil_tank_qty": 7,
+    "oil_tank_size": 500,
+    "oil_tank_rating": 16.0,
+    "water_tank_qty": 4,
+    "water_tank_size": 500,
+    "water_tank_rating": 16.0,
+    "thief_prv_input": 8.0,
+    "leaking_safety": 2.0,
+    "oil_production": 350.0,
+    "oil_pressure": 5.0,
+    "surge_percent": 30.0,
+    "promax_flash": np.nan,
+    "promax_mw": np.nan,
+    "water_production": 700.0,
+    "water_pressure": 120.0,
+    "water_surge_percent": 30.0,
+    "promax_water_flash": np.nan,
+    "promax_water_mw": np.nan,
+    "am_liq_flow": 0.005,
+    "am_bp_pres": 0.005,
+    "am_src_drw_tk": False,
+    "cd_capacity": 0.299,
+    "cd_turn_on": 0.0,
+    "cd_turn_off": 0.0,
+}
+
+
+def header_column(header, field, size_slug):
+    return f"{header}_{field}_{size_slug}"
+
+
+def header_columns(header):
+    """All flattened input columns of one header, in (field, size) order."""
+    fields = ["dev"] + FITTING_SLUGS + KNOCKOUT_SLUGS + SPECIALTY_SLUGS
+    return [header_column(header, field, size) for field in fields for size in SIZE_SLUGS]
+
+
+def _column(columns, name, n):
+    values = columns.get(name)
+    if values is None:
+        return np.broadcast_to(np.float64(SITE_DEFAULTS.get(name, 0.0)), (n,))
+    return np.asarray(values, dtype=float)
+
+
+def header_arrays(columns, header, n):
+    """Gather one header's flattened columns into engine-shaped arrays.
+
+    Returns ``(developed_length, fitting_counts, knockout_diams, specialty_cvs)``
+    shaped ``(n, N_SIZES)`` and ``(n, rows, N_SIZES)``; missing columns are 0.
+    """
+    blocks = []
+    for fields in (["dev"], FITTING_SLUGS, KNOCKOUT_SLUGS, SPECIALTY_SLUGS):
+        block = np.zeros((n, len(fields), N_SIZES))
+        for i, field in enumerate(fields):
+            for j, size in enumerate(SIZE_SLUGS):
+                values = columns.get(header_column(header, field, size))
+                if values is not None:
+                    block[:, i, j] = values
+        blocks.append(block)
+    return (blocks[0][:, 0, :], *blocks[1:])
+
+
+def site_ppivfr(columns, n):
+    """``(oil, water, other)`` PPIVFR arrays for ``n`` sites (see ``evaluate_sites``)."""
+    def col(name):
+        return _column(columns, name, n)
+
+    oil = oil_ppivfr(col("oil_production"), col("oil_pressure"), col("surge_percent"),
+                     col("promax_flash"), col("promax_mw"))
+    water = water_ppivfr(col("water_production"), col("water_surge_percent"),
+                         col("promax_water_flash"), col("promax_water_mw"))
+    other = other_ppivfr(col("am_liq_flow"), col("am_bp_pres"), col("am_src_drw_tk") != 0)
+    return oil, water, other
+
+
+def evaluate_sites(columns, n):
+    """Evaluate ``n`` sites given a mapping of column name -> array.
+
+    Missing inputs take the app's default values. Returns a dict of result
+    arrays: the Tab 8 summary values plus each header's 3" NPS length and
+    capacity, the Flare1 control device output, and the capacity margin
+    (Flare1 capacity flow at design pressure minus total PPIVFR, as in the
+    What-If tab).
+    """
+    def col(name):
+        return _column(columns, name, n)
+
+    oil_scfh = oil_tank_scfh(col("oil_tank_qty"), col("oil_tank_size"))
+    water_scfh = water_tank_scfh(col("water_tank_qty"), col("water_tank_size"))
+    oil, water, other = site_ppivfr(columns, n)
+
+    results = {
+        "oil_ppivfr": oil,
+        "water_ppivfr": water,
+        "other_ppivfr": other,
+        "total_ppivfr": oil + water + other,
+        "total_thermal_ppivfr": thermal_ppivfr(oil_scfh, water_scfh),
+        "thief_prv_input": col("thief_prv_input"),
+        "design_pressure": np.maximum(design_pressure(col("thief_prv_input"), col("leaking_safety")), 0.0),
+    }
+
+    for header in HEADERS:
+        _, total_pipe_nps = header_lengths(*header_arrays(columns, header, n))
+        total_nps_sum, capacity = header_capacity(total_pipe_nps)
+        results[f"{header}_total_nps"] = total_nps_sum
+        results[f"{header}_capacity"] = capacity
+
+    le_ft = control_device_le(col("cd_capacity"))
+    wfittings_ft, red_capacity = reduced_capacity(le_ft, results["flare1_total_nps"])
+    results["flare1_le_ft"] = le_ft
+    results["flare1_wfittings_ft"] = wfittings_ft
+    results["flare1_red_capacity"] = red_capacity
+    results["capacity_margin"] = flow_capacity(red_capacity, results["design_pressure"]) - results["total_ppivfr"]
+    return results
@@ -0,0 +1,55 @@
+"""Header input tables: one DataFrame per header, pipe sizes as columns.
+
+Rows are the developed length, the twelve fittings, the knockouts and the
+specialty valves, so a whole header is edited in a single grid and handed to
+the engine as arrays in one go. A session keeps each header as one
+``(len(HEADER_ROWS), N_SIZES)`` float array; the editor's edits are merged
+into it with ``apply_edits``.
+"""
+import numpy as np
+import pandas as pd
+
+import engine
+
+DEV_ROW = "Developed Length (ft)"
+FITTING_ROWS = [f"{name} (qty)" for name in engine.FITTING_NAMES]
+KNOCKOUT_ROWS = [f"Knockout {i + 1} Diameter (in)" for i in range(engine.N_KNOCKOUTS)]
+SPECIALTY_ROWS = [f"Specialty Valve {i + 1} Cv" for i in range(engine.N_SPECIALTY_VALVES)]
+HEADER_ROWS = [DEV_ROW] + FITTING_ROWS + KNOCKOUT_ROWS + SPECIALTY_ROWS
+
+_FITTINGS = slice(1, 1 + engine.N_FITTINGS)
+_KNOCKOUTS = slice(_FITTINGS.stop, _FITTINGS.stop + engine.N_KNOCKOUTS)
+_SPECIALTY = slice(_KNOCKOUTS.stop, _KNOCKOUTS.stop + engine.N_SPECIALTY_VALVES)
+
+
+def empty_header_grid():
+    return np.zeros((len(HEADER_ROWS), engine.N_SIZES))
+
+
+def grid_frame(grid):
+    """The editor's DataFrame view of a header grid."""
+    return pd.DataFrame(np.asarray(grid, dtype=float), index=HEADER_ROWS, columns=engine.PIPE_LABELS)
+
+
+def apply_edits(grid, edited_rows):
+    """A copy of ``grid`` with ``st.data_editor`` ``edited_rows`` applied (blank cells are 0)."""
+    grid = np.array(grid, dtype=float)
+    for row, cells in edited_rows.items():
+        for label, value in cells.items():
+            grid[int(row), engine.PIPE_LABELS.index(label)] = 0.0 if value is None else float(value)
+    return grid
+
+
+def grid_to_arrays(grid):
+    """Split a ``(..., len(HEADER_ROWS), N_SIZES)`` grid into the engine's header arrays."""
+    grid = np.nan_to_num(np.asarray(grid, dtype=float))
+    return grid[..., 0, :], grid[..., _FITTINGS, :], grid[..., _KNOCKOUTS, :], grid[..., _SPECIALTY, :]
+
+
+def header_results_frame(total_pipe, total_pipe_nps):
+    """Per-size results table shown under each header grid."""
+    return pd.DataFrame(
+        [total_pipe, total_pipe_nps],
+        index=["Total Header Length (ft)", "Total Length (ft) of 3\" NPS"],
+        columns=engine.PIPE_LABELS,
+    )
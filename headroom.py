@@ -0,0 +1,134 @@
+"""Reverse solver: the most production a vent system can take.
+
+With the tank layout, headers and control device fixed, find for every site
+the largest value of one production-side input at which the total PPIVFR
+stays within the Flare1 capacity flow at design pressure, i.e. where
+``capacity_margin`` (see ``engine.evaluate_sites``) reaches zero. Everything
+else, including the other stream, is held at the site's current values.
+
+The capacity flow doesn't depend on production, so it is computed once and
+only the PPIVFR is re-evaluated while solving. The root is found for all
+sites at once: the bracket ``[0, x]`` is doubled until the margin turns
+negative, then narrowed by false position (Illinois variant) with a
+per-site convergence mask. Total PPIVFR is linear in each of these inputs,
+so most sites converge on the first step; the iteration only matters if the
+stream model stops being linear.
+"""
+import numpy as np
+
+import engine
+
+SOLVE_INPUTS = {
+    "oil_production": "Oil Production (bbl/day)",
+    "water_production": "Water Production (bbl/day)",
+    "surge_percent": "Surge Percent (%)",
+    "water_surge_percent": "Surge Percent (Water) (%)",
+}
+# Production input -> the surge allowance applied to it.
+SURGE_INPUTS = {"oil_production": "surge_percent", "water_production": "water_surge_percent"}
+STREAMS = {"oil": "oil_production", "water": "water_production"}
+
+MAX_VALUE = 1e12  # above this a site is treated as unlimited
+MAX_ITER = 60
+RTOL = 1e-9
+
+
+def capacity_flow(columns, n, results=None):
+    """Flare1 capacity flow (MMSCFD) at design pressure for ``n`` sites.
+
+    ``results`` is the ``engine.evaluate_sites`` output for ``columns``, if
+    the caller already has it.
+    """
+    if results is None:
+        results = engine.evaluate_sites(columns, n)
+    return engine.flow_capacity(results["flare1_red_capacity"], results["design_pressure"])
+
+
+def _current(columns, name, n):
+    return np.broadcast_to(np.asarray(columns.get(name, engine.SITE_DEFAULTS[name]), dtype=float), (n,))
+
+
+def _margin(columns, n, name, values, capacity):
+    return capacity - sum(engine.site_ppivfr({**columns, name: values}, n))
+
+
+def solve_max(columns, n, name, capacity=None):
+    """Largest ``name`` per site with a capacity margin of at least zero.
+
+    Returns ``(values, over_capacity)``. A site that is over capacity even
+    with ``name`` at 0 gets 0 and ``over_capacity`` True; one whose margin
+    never runs out (e.g. a -100% surge) gets ``inf``, and one with missing
+    (NaN) inputs gets NaN.
+    """
+    if name not in SOLVE_INPUTS:
+        raise ValueError(f"can't solve for {name!r}; choose one of {', '.join(SOLVE_INPUTS)}")
+    if capacity is None:
+        capacity = capacity_flow(columns, n)
+
+    def margin(values):
+        return _margin(columns, n, name, values, capacity)
+
+    lo = np.zeros(n)
+    m_lo = margin(lo)
+    invalid = np.isnan(m_lo)
+    over = m_lo < 0
+    hi = np.fmax(_current(columns, name, n), 1.0)  # a NaN current value starts at 1
+    m_hi = margin(hi)
+    grow = (m_lo >= 0) & (m_hi >= 0)
+    while grow.any():
+        lo, m_lo = np.where(grow, hi, lo), np.where(grow, m_hi, m_lo)
+        hi = np.where(grow, hi * 2, hi)
+        m_hi = np.where(grow, margin(hi), m_hi)
+        grow &= (m_hi >= 0) & (hi < MAX_VALUE)
+    unlimited = (m_lo >= 0) & (m_hi >= 0)
+
+    result = lo.copy()
+    active = (m_lo >= 0) & ~unlimited
+    side = np.zeros(n, dtype=np.int8)  # which end moved last: 1 lo, -1 hi
+    for _ in range(MAX_ITER):
+        if not active.any():
+            break
+        with np.errstate(invalid="ignore", divide="ignore"):
+            x = np.where(active, hi - m_hi * (hi - lo) / (m_hi - m_lo), lo)
+        m_x = margin(x)
+        exact = active & (np.abs(m_x) <= RTOL * np.abs(capacity))
+        result[exact] = x[exact]
+        feasible = active & ~exact & (m_x >= 0)
+        infeasible = active & ~exact & ~feasible
+        # Illinois: halve the stale end's margin when the same end moves twice.
+        m_hi = np.where(feasible & (side == 1), m_hi / 2, m_hi)
+        m_lo = np.where(infeasible & (side == -1), m_lo / 2, m_lo)
+        lo, m_lo = np.where(feasible, x, lo), np.where(feasible, m_x, m_lo)
+        hi, m_hi = np.where(infeasible, x, hi), np.where(infeasible, m_x, m_hi)
+        side = np.where(feasible, 1, np.where(infeasible, -1, side)).astype(np.int8)
+        active &= ~exact & (hi - lo > RTOL * np.maximum(hi, 1.0))
+        result = np.where(feasible, lo, result)
+    result[unlimited] = np.inf
+    result[over] = 0.0
+    result[invalid] = np.nan
+    return result, over
+
+
+def max_production(columns, n, results=None):
+    """Per-site maximum oil and water production and the headroom over current.
+
+    Returns a dict of arrays: for each stream ``max_{stream}_production``,
+    ``max_{stream}_surge_bbl`` (the surge-adjusted bbl/day at that maximum)
+    and ``{stream}_production_headroom`` (maximum minus current), plus
+    ``over_capacity`` for sites already over capacity with no production.
+    ``results`` is passed to ``capacity_flow``.
+    """
+    capacity = capacity_flow(columns, n, results)
+    results = {}
+    over_any = np.zeros(n, dtype=bool)
+    for stream, name in STREAMS.items():
+        values, over = solve_max(columns, n, name, capacity)
+        results[f"max_{stream}_production"] = values
+        with np.errstate(invalid="ignore"):
+            results[f"max_{stream}_surge_bbl"] = engine.surge_adjusted_bbl(
+                values, _current(columns, SURGE_INPUTS[name], n))
+        results[f"{stream}_production_headroom"] = values - _current(columns, name, n)
+        over_any |= over
+    results["over_capacity"] = over_any
+    return results
+
@@ -0,0 +1,242 @@
+"""Concurrent-session load test against a real Streamlit server.
+
+    python loadtest.py --sessions 30 --edits 20 --think-ms 500
+
+Starts ``streamlit run app.py`` headless on a free port and connects N
+simulated engineers over the app's websocket, the same protocol the browser
+speaks. Each session renders the app once, then makes ``--edits`` header
+edits. An edit changes one random cell of a random vent header's grid and
+sends it as that grid's widget state, rerunning only the header's fragment,
+as the browser does. When the edit changes a value other tabs show (a
+header's total length does), the grid's callback reruns the tabs that show
+it (Summary, PFD) with the header's fragment, as it would for a real user;
+the edit's latency runs from sending the rerun to the last
+``script_finished`` and includes them. The summary counts how many edits
+did.
+
+Reports p50/p99 first-render and edit-rerun latency and the server's
+resident memory per session: RSS growth over a warmed-up baseline, divided
+by the number of sessions (which stay connected until the end). Needs the
+``websockets`` package (installed with Streamlit's server) and Linux
+(/proc) for the memory reading. ``--url`` targets a server that is already
+running; add ``--pid`` to read its memory.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import engine
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(HERE, "app.py")
+STARTUP_TIMEOUT = 60
+RERUN_TIMEOUT = 300
+# Header rows an engineer plausibly edits: developed length and fittings.
+EDIT_ROWS = 1 + engine.N_FITTINGS
+
+
+def rss_bytes(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError(f"VmRSS not found for pid {pid}")
+
+
+def percentiles(values, ps=(50, 99)):
+    return {f"p{p}": float(np.percentile(values, p)) if values else float("nan") for p in ps}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port):
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP_PATH, "--server.headless", "true",
+         "--server.port", str(port), "--server.address", "127.0.0.1", "--browser.gatherUsageStats", "false"],
+        cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError("streamlit exited during startup")
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"streamlit did not listen on port {port} within {STARTUP_TIMEOUT} s")
+
+
+class Session:
+    """One browser tab: a websocket, the header grids' widget ids, and their pending edits."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.editors = {}  # header -> (widget id, fragment id)
+        self.edits = {}  # widget id -> edited_rows
+        self.errors = []
+        self.view_reruns = 0
+
+    async def rerun(self, widget_states=(), fragment_id=""):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = ""
+        if fragment_id:
+            msg.rerun_script.fragment_id = fragment_id
+        for widget_id, value in widget_states:
+            state = msg.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            state.string_value = value
+        start = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        rerun_early = ForwardMsg.ScriptFinishedStatus.FINISHED_EARLY_FOR_RERUN
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(await asyncio.wait_for(self.ws.recv(), RERUN_TIMEOUT))
+            kind = fwd.WhichOneof("type")
+            if kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                element = fwd.delta.new_element
+                if element.WhichOneof("type") == "exception":
+                    self.errors.append(element.exception.message)
+                widget_id = getattr(getattr(element, element.WhichOneof("type")), "id", "")
+                self._found_widget(widget_id, fwd.delta.fragment_id)
+            elif kind == "script_finished" and fwd.script_finished == rerun_early:
+                # The callback asked for another run (st.rerun); the edit isn't done until that one is.
+                self.view_reruns += 1
+            elif kind == "script_finished":
+                return time.perf_counter() - start
+
+    def _found_widget(self, widget_id, fragment_id):
+        # Element ids are "$$ID-<hash>-<key>"; an editor's key is grid_<header>_<revision>.
+        key = widget_id.split("-", 2)[-1]
+        for header in engine.HEADERS:
+            if key.startswith(f"grid_{header}_"):
+                old_id, _ = self.editors.get(header, (widget_id, ""))
+                if old_id != widget_id:
+                    self.edits.pop(old_id, None)  # a new revision drops the old editor's edits
+                self.editors[header] = (widget_id, fragment_id)
+
+    async def edit_header(self, rng):
+        header = engine.HEADERS[rng.integers(len(engine.HEADERS))]
+        widget_id, fragment_id = self.editors[header]
+        row, size = int(rng.integers(EDIT_ROWS)), int(rng.integers(engine.N_SIZES))
+        value = float(rng.integers(0, 200 if row == 0 else 5))
+        rows = self.edits.setdefault(widget_id, {})
+        rows.setdefault(str(row), {})[engine.PIPE_LABELS[size]] = value
+        # The browser sends every widget's current state with each rerun.
+        states = [(wid, json.dumps({"edited_rows": edited, "added_rows": [], "deleted_rows": []}))
+                  for wid, edited in self.edits.items()]
+        return await self.rerun(states, fragment_id)
+
+
+async def run_session(url, seed, edits, think_s, first_render, rerun, sessions, done):
+    import websockets
+
+    rng = np.random.default_rng(seed)
+    async with websockets.connect(url, subprotocols=["streamlit"], max_size=None) as ws:
+        session = Session(ws)
+        sessions.append(session)
+        first_render.append(await session.rerun())
+        for _ in range(edits):
+            await asyncio.sleep(think_s * rng.uniform(0.5, 1.5))
+            rerun.append(await session.edit_header(rng))
+        # Stay connected, like an open browser tab, until every session is done.
+        await done.wait()
+
+
+async def _load_test(url, pid, n_sessions, edits, think_s, seed):
+    # One warm-up session so imports and caches aren't charged to the sessions.
+    warm = asyncio.Event()
+    warm.set()
+    await run_session(url, seed + n_sessions, 1, 0.0, [], [], [], warm)
+    await asyncio.sleep(0.5)
+    base_rss = rss_bytes(pid) if pid else None
+
+    first_render, rerun, sessions = [], [], []
+    done = asyncio.Event()
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(run_session(url, seed + i, edits, think_s, first_render, rerun, sessions, done))
+             for i in range(n_sessions)]
+    while len(rerun) < n_sessions * edits and not any(t.done() for t in tasks):
+        await asyncio.sleep(0.05)
+    wall = time.perf_counter() - start
+    rss = rss_bytes(pid) if pid else None
+    done.set()
+    await asyncio.gather(*tasks)
+
+    summary = {
+        "sessions": n_sessions,
+        "edits_per_session": edits,
+        "wall_s": wall,
+        "reruns_per_s": len(rerun) / wall if wall else 0.0,
+        "first_render_s": percentiles(first_render),
+        "edit_rerun_s": percentiles(rerun),
+        "view_reruns": sum(session.view_reruns for session in sessions),
+        "errors": [error for session in sessions for error in session.errors],
+    }
+    if pid:
+        summary.update(rss_base_mb=base_rss / 2 ** 20, rss_mb=rss / 2 ** 20,
+                       per_session_mb=(rss - base_rss) / 2 ** 20 / n_sessions)
+    return summary
+
+
+def load_test(n_sessions, edits, think_ms=0.0, seed=0, url=None, pid=None):
+    """Run the load test (starting a server unless ``url`` is given) and return a summary dict."""
+    proc = None
+    if url is None:
+        port = free_port()
+        proc = start_server(port)
+        url, pid = f"ws://127.0.0.1:{port}/_stcore/stream", proc.pid
+    try:
+        return asyncio.run(_load_test(url, pid, n_sessions, edits, think_ms / 1000, seed))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent sessions editing vent headers.")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--edits", type=int, default=10, help="header edits per session")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause between a session's edits")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="websocket of a running server, e.g. ws://host:8501/_stcore/stream")
+    parser.add_argument("--pid", type=int, help="pid of that server, for the memory reading")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    summary = load_test(args.sessions, args.edits, args.think_ms, args.seed, args.url, args.pid)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return 1 if summary["errors"] else 0
+    print(f"{summary['sessions']} sessions × {summary['edits_per_session']} edits in {summary['wall_s']:.1f} s "
+          f"({summary['reruns_per_s']:.1f} reruns/s)")
+    for name in ("first_render_s", "edit_rerun_s"):
+        p = summary[name]
+        print(f"  {name:<15} p50 {p['p50'] * 1000:8.0f} ms   p99 {p['p99'] * 1000:8.0f} ms")
+    print(f"  {summary['view_reruns']} edit(s) also reran the tabs showing shared values")
+    if "per_session_mb" in summary:
+        print(f"  server RSS {summary['rss_base_mb']:.0f} MB -> {summary['rss_mb']:.0f} MB "
+              f"({summary['per_session_mb']:.2f} MB per session)")
+    for error in summary["errors"]:
+        print(f"  error: {error}")
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
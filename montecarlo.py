@@ -0,0 +1,96 @@
+"""Monte Carlo uncertainty mode for PPIVFR against vent capacity.
+
+Each input is either a number or a distribution spec such as
+``{"dist": "triangular", "low": 20, "mode": 30, "high": 50}``. Samples are
+drawn and pushed through the engine's Tab 2/Tab 3 PPIVFR math and capacity
+formulas in chunks, so 10^6 samples stay within a fixed memory budget.
+"""
+import numpy as np
+
+import engine
+
+# Parameter names each distribution takes.
+DISTRIBUTIONS = {
+    "fixed": ["value"],
+    "uniform": ["low", "high"],
+    "triangular": ["low", "mode", "high"],
+    "normal": ["mean", "std"],
+    "lognormal": ["mean", "sigma"],
+}
+
+# Inputs that can be given as distributions.
+SIMULATION_INPUTS = [
+    "oil_production", "oil_pressure", "surge_percent", "promax_flash", "promax_mw",
+    "water_production", "water_surge_percent", "promax_water_flash", "promax_water_mw",
+    "am_liq_flow", "am_bp_pres", "am_src_drw_tk",
+    "thief_prv_input", "leaking_safety", "nps_length",
+]
+
+PERCENTILES = (5, 50, 95, 99)
+CHUNK_SIZE = 1 << 17
+
+
+def sample(spec, size, rng):
+    """Draw ``size`` samples of one input; plain numbers are held fixed."""
+    if not isinstance(spec, dict):
+        return np.full(size, spec, dtype=float)
+    dist = spec.get("dist", "fixed")
+    if dist == "fixed":
+        return np.full(size, spec["value"], dtype=float)
+    if dist == "uniform":
+        return rng.uniform(spec["low"], spec["high"], size)
+    if dist == "triangular":
+        if spec["low"] == spec["high"]:
+            return np.full(size, spec["low"], dtype=float)
+        return rng.triangular(spec["low"], spec["mode"], spec["high"], size)
+    if dist == "normal":
+        return rng.normal(spec["mean"], spec["std"], size)
+    if dist == "lognormal":
+        # Parameterised by the arithmetic mean of the quantity itself.
+        mu = np.log(spec["mean"]) - spec["sigma"] ** 2 / 2
+        return rng.lognormal(mu, spec["sigma"], size)
+    raise ValueError(f"Unknown distribution {dist!r}; expected one of {sorted(DISTRIBUTIONS)}")
+
+
+def spec_from_row(dist, value, low=None, mode=None, high=None, spread=None):
+    """Build a spec from the uncertainty table's generic columns."""
+    if dist in (None, "", "fixed"):
+        return value
+    if dist == "uniform":
+        return {"dist": dist, "low": low, "high": high}
+    if dist == "triangular":
+        return {"dist": dist, "low": low, "mode": value if mode is None else mode, "high": high}
+    if dist == "normal":
+        return {"dist": dist, "mean": value, "std": spread}
+    if dist == "lognormal":
+        return {"dist": dist, "mean": value, "sigma": spread}
+    raise ValueError(f"Unknown distribution {dist!r}; expected one of {sorted(DISTRIBUTIONS)}")
+
+
+def simulate(inputs, n_samples=200_000, seed=None, chunk_size=CHUNK_SIZE, percentiles=PERCENTILES):
+    """Run the simulation and summarise it.
+
+    ``inputs`` maps names from ``SIMULATION_INPUTS`` to numbers or specs;
+    ``nps_length`` is the 3" NPS equivalent length of the vent path
+    (e.g. Flare1 wfittings). Returns a dict with ``p_exceed`` (probability
+    that PPIVFR exceeds capacity × sqrt(design pressure)), ``percentiles``
+    of each output, and the sampled ``margin`` array for plotting.
+    """
+    rng = np.random.default_rng(seed)
+    total_ppivfr = np.empty(n_samples)
+    capacity_flow = np.empty(n_samples)
+    for start in range(0, n_samples, chunk_size):
+        stop = min(start + chunk_size, n_samples)
+        samples = {name: sample(spec, stop - start, rng) for name, spec in inputs.items()}
+        total_ppivfr[start:stop], capacity_flow[start:stop] = engine.ppivfr_and_capacity_flow(samples)
+
+    margin = capacity_flow - total_ppivfr
+    outputs = {"Total PPIVFR (mmscfd)": total_ppivfr, "Capacity at Design Pressure (mmscfd)": capacity_flow,
+               "Margin (mmscfd)": margin}
+    return {
+        "n_samples": n_samples,
+        "p_exceed": float(np.mean(margin < 0)) if n_samples else 0.0,
+        "percentiles": {name: dict(zip(percentiles, np.percentile(values, percentiles).tolist()))
+                        for name, values in outputs.items()},
+        "margin": margin,
+    }
@@ -0,0 +1,186 @@
+"""Closed vent network solver.
+
+Models a facility as sources (tank batteries injecting their PPIVFR),
+junctions, pipe segments and control devices, and solves for the flow split
+and node pressures together instead of treating each header on its own.
+
+Every branch obeys the same square-root law the header tabs use: a run of
+``L`` ft of 3" NPS has capacity ``C = sqrt(CAPACITY_K / L)`` and passes
+``Q = C * sqrt(dP)`` (MMSCFD, psi). A control device is a branch from its
+inlet node to atmosphere with the Flare1 ``le_ft`` equivalent length. Mass
+balance at every node gives a nonlinear system in the node pressures whose
+Jacobian is a weighted graph Laplacian; it is solved with damped Newton
+steps and a sparse direct solve per step, until the largest mass-balance
+error is a small fraction of the total injected flow or no step along the
+Newton direction reduces it any further (the floating-point floor).
+"""
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import spsolve
+
+import engine
+
+ATMOSPHERE = -1
+# Below this pressure difference (psi) a branch is treated as linear so the
+# Jacobian stays finite at zero flow.
+LINEAR_BAND = 1e-8
+# Zero-length branches (a header nobody has filled in yet) are direct
+# connections; give them a token length so the conductance stays finite.
+MIN_LENGTH = 1e-3
+
+
+class VentNetwork:
+    """A vent network built up node by node; call ``solve()`` when complete."""
+
+    def __init__(self):
+        self.nodes = {}
+        self.node_flow = []
+        self.node_kind = []
+        self.branches = []
+        self.branch_from = []
+        self.branch_to = []
+        self.branch_length = []
+        self.branch_kind = []
+
+    def _node(self, name, kind, flow=0.0):
+        if name in self.nodes:
+            raise ValueError(f"Duplicate node {name!r}")
+        self.nodes[name] = len(self.node_flow)
+        self.node_flow.append(float(flow))
+        self.node_kind.append(kind)
+        return self
+
+    def add_source(self, name, flow):
+        """A vapor source, e.g. a tank battery, emitting ``flow`` MMSCFD."""
+        return self._node(name, "source", flow)
+
+    def add_junction(self, name):
+        return self._node(name, "junction")
+
+    def _branch(self, name, from_node, to_index, nps_length, kind):
+        if nps_length < 0:
+            raise ValueError(f"Branch {name!r} has a negative 3\" NPS length")
+        self.branches.append(name)
+        self.branch_from.append(self.nodes[from_node])
+        self.branch_to.append(to_index)
+        self.branch_length.append(max(float(nps_length), MIN_LENGTH))
+        self.branch_kind.append(kind)
+        return self
+
+    def add_pipe(self, name, from_node, to_node, nps_length):
+        """A pipe segment given directly as feet of 3" NPS."""
+        return self._branch(name, from_node, self.nodes[to_node], nps_length, "pipe")
+
+    def add_header(self, name, from_node, to_node, developed_length, fitting_counts=None,
+                   knockout_diams=None, specialty_cvs=None):
+        """A pipe segment described like a header tab (per-size arrays)."""
+        _, total_pipe_nps = engine.header_lengths(developed_length, fitting_counts, knockout_diams, specialty_cvs)
+        return self.add_pipe(name, from_node, to_node, float(np.sum(total_pipe_nps)))
+
+    def add_control_device(self, name, node, rated_capacity, extra_nps_length=0.0):
+        """A flare/combustor/VRU at ``node`` discharging to atmosphere.
+
+        ``extra_nps_length`` adds piping between ``node`` and the device,
+        e.g. the Flare1 header.
+        """
+        le_ft = float(engine.control_device_le(rated_capacity)) + extra_nps_length
+        return self._branch(name, node, ATMOSPHERE, le_ft, "device")
+
+    def solve(self, tol=1e-9, max_iter=100):
+        """Solve for node pressures and branch flows; returns a ``NetworkSolution``.
+
+        ``tol`` is the allowed mass-balance error at any node relative to the
+        total injected flow.
+        """
+        n = len(self.node_flow)
+        a = np.array(self.branch_from, dtype=int)
+        b = np.array(self.branch_to, dtype=int)
+        conductance = np.sqrt(engine.CAPACITY_K / np.array(self.branch_length))
+        injection = np.array(self.node_flow)
+        if not (b == ATMOSPHERE).any():
+            raise ValueError("Network has no control device; nothing can leave it")
+
+        # Incidence matrix (branches x nodes) with the atmosphere column dropped.
+        rows = np.concatenate([np.arange(len(a)), np.flatnonzero(b != ATMOSPHERE)])
+        cols = np.concatenate([a, b[b != ATMOSPHERE]])
+        vals = np.concatenate([np.ones(len(a)), -np.ones(int((b != ATMOSPHERE).sum()))])
+        incidence = csr_matrix((vals, (rows, cols)), shape=(len(a), n))
+
+        # Every node needs a path to atmosphere (index n here) or the system is singular.
+        to = np.where(b == ATMOSPHERE, n, b)
+        graph = coo_matrix((np.ones(len(a)), (a, to)), shape=(n + 1, n + 1))
+        _, labels = connected_components(graph, directed=False)
+        stranded = [name for name, i in self.nodes.items() if labels[i] != labels[n]]
+        if stranded:
+            raise ValueError(f"No path to a control device from: {', '.join(stranded)}")
+
+        def flows(p):
+            dp = incidence @ p
+            mag = np.abs(dp)
+            root = np.sqrt(np.maximum(mag, LINEAR_BAND))
+            q = np.where(mag < LINEAR_BAND, conductance * dp / np.sqrt(LINEAR_BAND), conductance * np.sign(dp) * root)
+            dq = np.where(mag < LINEAR_BAND, conductance / np.sqrt(LINEAR_BAND), conductance / (2 * root))
+            return q, dq
+
+        def residual(q):
+            return incidence.T @ q - injection
+
+        # Start from the linear (laminar) solution, squared onto the
+        # square-root law's scale; the line search takes care of the rest.
+        laplacian = (incidence.T @ incidence.multiply(conductance[:, None])).tocsc()
+        p = np.maximum(spsolve(laplacian, injection), 0.0) ** 2 if n else np.zeros(0)
+        q, dq = flows(p)
+        r = residual(q)
+        iterations = 0
+        limit = tol * max(np.abs(injection).sum(), 1e-12)
+        while np.abs(r).max(initial=0.0) > limit and iterations < max_iter:
+            jacobian = (incidence.T @ incidence.multiply(dq[:, None])).tocsc()
+            step = spsolve(jacobian, -r)
+            # Halve the step until the residual goes down.
+            t = 1.0
+            norm = np.linalg.norm(r)
+            while t > 1e-6:
+                q_new, dq_new = flows(p + t * step)
+                r_new = residual(q_new)
+                if np.linalg.norm(r_new) < norm:
+                    break
+                t /= 2
+            else:
+                break  # the line search stalled: rounding error, not the model, is left
+            p, q, dq, r = p + t * step, q_new, dq_new, r_new
+            iterations += 1
+        max_residual = float(np.abs(r).max(initial=0.0))
+        return NetworkSolution(self, p, q, iterations, max_residual, max_residual <= limit)
+
+
+class NetworkSolution:
+    """Node pressures (osig) and branch flows (MMSCFD) of a solved network.
+
+    ``converged`` is False when the solver stopped (out of steps, or unable to
+    reduce the residual) with a mass-balance error above its tolerance.
+    """
+
+    def __init__(self, network, pressure_psi, flow, iterations, max_residual, converged=True):
+        self.network = network
+        self.pressure_osig = np.asarray(pressure_psi) * 16
+        self.flow = np.asarray(flow)
+        self.iterations = iterations
+        self.max_residual = max_residual
+        self.converged = converged
+
+    def node_pressures(self):
+        return {name: float(self.pressure_osig[i]) for name, i in self.network.nodes.items()}
+
+    def branch_flows(self):
+        return {name: float(q) for name, q in zip(self.network.branches, self.flow)}
+
+    def device_flows(self):
+        """Flow split across control devices."""
+        return {name: float(q) for name, q, kind in zip(self.network.branches, self.flow, self.network.branch_kind)
+                if kind == "device"}
+
+    def overpressured(self, design_pressure):
+        """Source nodes whose pressure exceeds ``design_pressure`` (osig)."""
+        return [name for name, i in self.network.nodes.items()
+                if self.network.node_kind[i] == "source" and self.pressure_osig[i] > design_pressure]
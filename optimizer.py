@@ -0,0 +1,137 @@
+"""Header pipe-size optimizer.
+
+Given the design flow (total PPIVFR) and design pressure, choose one of the
+eight pipe sizes for every segment of a header so that the header's total
+3" NPS equivalent length stays within what the design pressure allows, at the
+lowest pipe cost. Each segment is a developed length plus a fitting template.
+
+Designs are built one segment at a time. After each segment only the
+Pareto front of partial designs by (3" NPS length so far, cost so far) is
+kept: a partial design that is both longer and dearer than another can never
+finish ahead of it, and partial designs that tie on both (e.g. two identical
+segments with their sizes swapped) are kept once. Partial designs that bust
+the limit even with every later segment at its shortest are dropped too, so
+the work grows with the size of the front rather than 8 ** n_segments.
+"""
+import numpy as np
+import pandas as pd
+
+import engine
+
+# Installed cost per foot by size. Rough relative figures for ranking only;
+# pass your own ``cost_per_ft`` for real estimates.
+DEFAULT_COST_PER_FT = {
+    '1.5"': 12.0,
+    '2"': 15.0,
+    '3"': 22.0,
+    '4"': 30.0,
+    '6"': 48.0,
+    '8"': 70.0,
+    '10"': 95.0,
+    '12"': 120.0,
+}
+
+MAX_FRONT = 1_000_000  # partial designs kept between segments
+
+
+class OptimizerError(ValueError):
+    """A search whose cost/length front grows too large to keep."""
+
+
+def segment_tables(segments, cost_per_ft=DEFAULT_COST_PER_FT):
+    """Per-segment ``(nps_length, cost)`` arrays, each ``(n_segments, N_SIZES)``.
+
+    ``segments`` is a list of dicts with ``length`` (developed ft) and an
+    optional ``fittings`` mapping of fitting name or slug to quantity.
+    """
+    n = len(segments)
+    developed = np.zeros((n, engine.N_SIZES))
+    counts = np.zeros((n, engine.N_FITTINGS, engine.N_SIZES))
+    for s, segment in enumerate(segments):
+        developed[s] = float(segment.get("length", 0.0) or 0.0)
+        for name, qty in (segment.get("fittings") or {}).items():
+            i = engine.FITTING_NAMES.index(name) if name in engine.FITTING_NAMES else engine.FITTING_SLUGS.index(name)
+            counts[s, i, :] = float(qty or 0.0)
+    _, nps_length = engine.header_lengths(developed, counts)
+    cost = developed * np.array([cost_per_ft[label] for label in engine.PIPE_LABELS])
+    return nps_length, cost
+
+
+def pareto_front(nps_length, cost):
+    """Indices of the ``(nps_length, cost)`` points no other point beats, cheapest first.
+
+    A point is dropped when another is no longer and no more expensive; of
+    identical points only the first is kept.
+    """
+    order = np.lexsort((nps_length, cost))
+    length = nps_length[order]
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = length[1:] < np.minimum.accumulate(length)[:-1]
+    return order[keep]
+
+
+def non_dominated(nps_length, cost):
+    """Size indices worth considering for one segment, smallest size first."""
+    return np.sort(pareto_front(nps_length, cost))
+
+
+def optimize_header(segments, flow, design_pressure, cost_per_ft=DEFAULT_COST_PER_FT,
+                    fixed_nps_length=0.0, top_n=20, max_front=MAX_FRONT):
+    """Rank the cheapest size assignments that pass ``flow`` within ``design_pressure``.
+
+    ``flow`` is in MMSCFD and ``design_pressure`` in osig. ``fixed_nps_length``
+    adds 3" NPS length that is not being sized (e.g. the control device Le).
+    Returns a DataFrame with one row per design, cheapest first, each design
+    shorter than every cheaper one, and the number of partial designs that
+    were scored in ``df.attrs["candidates"]``. Raises ``OptimizerError`` if
+    more than ``max_front`` designs stay on the front after any segment.
+    """
+    nps_length, cost = segment_tables(segments, cost_per_ft)
+    limit = float(engine.max_nps_length(flow, design_pressure)) - fixed_nps_length
+    options = [non_dominated(nps_length[s], cost[s]) for s in range(len(segments))]
+    # Shortest length the segments after each one can still add.
+    shortest = np.array([nps_length[s, o].min() for s, o in enumerate(options)])
+    after = shortest[::-1].cumsum()[::-1] - shortest
+
+    # Front of partial designs over the segments so far, with back-pointers:
+    # stages[s] holds each kept design's parent on the previous front and the
+    # size it gives segment s.
+    front_length = np.zeros(1 if segments else 0)
+    front_cost = np.zeros(len(front_length))
+    stages = []
+    candidates = 0
+    for s, o in enumerate(options):
+        length = (front_length[:, None] + nps_length[s, o]).ravel()
+        price = (front_cost[:, None] + cost[s, o]).ravel()
+        candidates += len(length)
+        feasible = np.flatnonzero(length + after[s] <= limit)
+        keep = feasible[pareto_front(length[feasible], price[feasible])]
+        if len(keep) > max_front:
+            raise OptimizerError(f"{len(keep):,} designs on the cost/length front after segment {s + 1}, "
+                                 f"over the limit of {max_front:,}; merge segments that will share a size")
+        parent, digit = np.divmod(keep, len(o))
+        stages.append((parent, o[digit]))
+        front_length, front_cost = length[keep], price[keep]
+
+    rows = []
+    for rank, i in enumerate(range(min(top_n, len(front_length))), start=1):
+        sizes = [None] * len(segments)
+        node = i
+        for s in range(len(segments) - 1, -1, -1):
+            parent, size = stages[s]
+            sizes[s] = engine.PIPE_LABELS[size[node]]
+            node = parent[node]
+        total_length = front_length[i] + fixed_nps_length
+        row = {"Rank": rank}
+        row.update({f"Segment {s + 1}": size for s, size in enumerate(sizes)})
+        row.update({
+            "Cost": front_cost[i],
+            "Total Length (ft) of 3\" NPS": total_length,
+            "Capacity (MMSCFD/SQRT(psi))": float(engine.capacity_from_length(total_length)),
+            "Pressure Drop (osig)": float(engine.pressure_drop(flow, total_length)),
+        })
+        rows.append(row)
+    result = pd.DataFrame(rows)
+    result.attrs["candidates"] = candidates
+    result.attrs["candidates_unpruned"] = engine.N_SIZES ** len(segments)
+    return result
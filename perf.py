@@ -0,0 +1,204 @@
+"""Optional hot-path instrumentation for the app.
+
+Off unless the server is started with ``CVS_PERF=1``; when off, ``timed``
+returns functions unchanged and ``section`` is a null context, so there is
+no cost on the normal path. When on, every rerun of a tab (full script or
+fragment) records its wall time and the number of widgets it created, the
+Mermaid render is timed on its own, and the session_state size is recorded
+whenever the debug tab measures it (pickling every value is too slow to do
+on each rerun). The last ``RECENT`` records of the ``CVS_PERF_SESSIONS``
+most recently active sessions are kept in memory for the debug tab; every
+record is appended to ``CVS_PERF_FILE``:
+
+* ``*.jsonl`` (default ``cvs_perf.jsonl``) — one JSON object per record,
+  rotated at ``CVS_PERF_MAX_BYTES`` with ``CVS_PERF_BACKUPS`` old files kept.
+* ``*.prom`` — Prometheus text exposition, rewritten after every record
+  (point node_exporter's textfile collector at it).
+"""
+import contextlib
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+
+ENABLED = os.environ.get("CVS_PERF", "") not in ("", "0", "false", "False")
+PERF_FILE = os.environ.get("CVS_PERF_FILE", "cvs_perf.jsonl")
+MAX_BYTES = int(os.environ.get("CVS_PERF_MAX_BYTES", 10 * 1024 * 1024))
+BACKUPS = int(os.environ.get("CVS_PERF_BACKUPS", 5))
+RECENT = 500  # records kept per session for the debug tab
+SESSIONS = int(os.environ.get("CVS_PERF_SESSIONS", 100))
+
+_lock = threading.Lock()
+_recent = OrderedDict()  # session -> deque of records, least recently active first
+_run_started = {}
+# Prometheus series: (metric, section) -> value
+_totals = defaultdict(float)
+_last = {}
+_logger = None
+
+
+def _context():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    return get_script_run_ctx()
+
+
+def _widget_count(ctx):
+    """Widgets registered so far in this run (None if Streamlit doesn't say)."""
+    ids = getattr(getattr(ctx, "shared", ctx), "widget_ids_this_run", None)
+    if ids is None:
+        return None
+    return len(ids.snapshot()) if hasattr(ids, "snapshot") else len(ids)
+
+
+def session_state_sizes(state):
+    """Pickled size (bytes) of each session_state value; unpicklable values use getsizeof."""
+    sizes = {}
+    for key in list(state.keys()):
+        try:
+            sizes[str(key)] = len(pickle.dumps(state[key], protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            sizes[str(key)] = sys.getsizeof(state[key])
+    return sizes
+
+
+def measure_session_state(state):
+    """``session_state_sizes`` for the current session, recorded as a ``session_state`` record."""
+    start = time.perf_counter()
+    sizes = session_state_sizes(state)
+    if ENABLED:
+        record("session_state", time.perf_counter() - start,
+               session_state_bytes=sum(sizes.values()), session_state_keys=len(sizes))
+    return sizes
+
+
+def _write(record):
+    global _logger
+    if PERF_FILE.endswith(".prom"):
+        _write_prometheus(record)
+        return
+    if _logger is None:
+        handler = logging.handlers.RotatingFileHandler(PERF_FILE, maxBytes=MAX_BYTES, backupCount=BACKUPS)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger = logging.getLogger("cvs.perf")
+        _logger.propagate = False
+        _logger.setLevel(logging.INFO)
+        _logger.addHandler(handler)
+    _logger.info(json.dumps(record))
+
+
+def _write_prometheus(record):
+    section = record["section"]
+    _totals[("cvs_section_seconds_total", section)] += record["wall_ms"] / 1000
+    _totals[("cvs_section_runs_total", section)] += 1
+    if record.get("widgets") is not None:
+        _last[("cvs_section_widgets", section)] = record["widgets"]
+    if record.get("session_state_bytes") is not None:
+        _last[("cvs_session_state_bytes", "")] = record["session_state_bytes"]
+    _last[("cvs_section_last_seconds", section)] = record["wall_ms"] / 1000
+
+    lines = []
+    for series, kind in ((_totals, "counter"), (_last, "gauge")):
+        for name in sorted({metric for metric, _ in series}):
+            lines.append(f"# TYPE {name} {kind}")
+            for (metric, label), value in sorted(series.items()):
+                if metric == name:
+                    labels = f'{{section="{label}"}}' if label else ""
+                    lines.append(f"{name}{labels} {value:.6g}")
+    tmp = f"{PERF_FILE}.tmp"
+    with open(tmp, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, PERF_FILE)
+
+
+def _session_records(session):
+    """The session's record deque, evicting the least recently active session when over ``SESSIONS``."""
+    records = _recent.get(session)
+    if records is not None:
+        _recent.move_to_end(session)
+        return records
+    records = _recent[session] = deque(maxlen=RECENT)
+    while len(_recent) > SESSIONS:
+        evicted, _ = _recent.popitem(last=False)
+        _run_started.pop(evicted, None)
+    return records
+
+
+def record(section, wall_s, widgets=None, **extra):
+    """Store a record for the current session and append it to the metrics file."""
+    ctx = _context()
+    rec = {"ts": round(time.time(), 3), "session": getattr(ctx, "session_id", ""), "section": section,
+           "wall_ms": round(wall_s * 1000, 3), "widgets": widgets, **extra}
+    with _lock:
+        _session_records(rec["session"]).append(rec)
+        try:
+            _write(rec)
+        except OSError:
+            pass  # instrumentation must never break the app
+    return rec
+
+
+@contextlib.contextmanager
+def _timed_section(name):
+    ctx = _context()
+    before = _widget_count(ctx)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - start
+        after = _widget_count(ctx)
+        record(name, wall, None if before is None or after is None else after - before)
+
+
+def section(name):
+    """Context manager timing a block (a null context when instrumentation is off)."""
+    return _timed_section(name) if ENABLED else contextlib.nullcontext()
+
+
+def timed(name=None):
+    """Decorator timing every call, e.g. each rerun of a tab fragment.
+
+    Put it under ``@st.fragment`` so fragment reruns are timed too. The
+    first positional argument, if any, is appended to the name.
+    """
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _timed_section(f"{label}[{args[0]}]" if args else label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def start_run():
+    """Call at the top of the script."""
+    if ENABLED:
+        _run_started[getattr(_context(), "session_id", "")] = time.perf_counter()
+
+
+def finish_run():
+    """Call at the end of the script: records the full rerun."""
+    if not ENABLED:
+        return
+    ctx = _context()
+    start = _run_started.pop(getattr(ctx, "session_id", ""), None)
+    if start is None:
+        return
+    record("rerun", time.perf_counter() - start, _widget_count(ctx))
+
+
+def recent(session_id=None):
+    """Recent records for a session (the current one by default)."""
+    session_id = getattr(_context(), "session_id", "") if session_id is None else session_id
+    with _lock:
+        return list(_recent.get(session_id, ()))
@@ -0,0 +1,165 @@
+"""Process flow diagram of the facility, as Mermaid flowchart text.
+
+The diagram is built from the facility model: each process stage (inlet
+separators, heater treaters, VRTs) with its unit count and operating
+pressure, the oil and water tank batteries, the vent headers and the
+control device. Tanks, headers and the device are annotated with the
+computed PPIVFR, 3" NPS lengths and capacities.
+
+Generation is split in two. The *topology* is which stages exist, which are
+drawn unit by unit, and whether there is a water battery. It becomes a
+Mermaid skeleton with ``$placeholders``, cached by topology, so changing a
+count, a pressure or a flow only refills labels. A stage with more than
+``EXPAND_LIMIT`` units is drawn as one "× n" node, and stages connect
+group-to-group rather than unit-to-unit. That keeps the edge count linear
+and a facility with hundreds of units readable.
+"""
+import functools
+import hashlib
+from string import Template
+
+import engine
+
+EXPAND_LIMIT = 8
+# The PFD tab's inputs (display-only, saved in a project's ``ui``).
+DEFAULTS = {
+    "pfd_inlet_seps": 2,
+    "pfd_inlet_sep_psig": 25.0,
+    "pfd_ht": 1,
+    "pfd_ht_psig": 50.0,
+    "pfd_vrt": 1,
+    "pfd_vrt_psig": 10.0,
+}
+# Each stage's (count, pressure) input.
+STAGE_INPUTS = {
+    "sep": ("pfd_inlet_seps", "pfd_inlet_sep_psig"),
+    "ht": ("pfd_ht", "pfd_ht_psig"),
+    "vrt": ("pfd_vrt", "pfd_vrt_psig"),
+}
+STAGES = [
+    # (key, unit label, group label, vapor destination)
+    ("sep", "Inlet Sep", "Inlet Separators", "To Sales/Flare"),
+    ("ht", "HT", "Heater Treaters", "To Sales/Flare"),
+    ("vrt", "VRT", "VRTs", "To MP Flare"),
+]
+# Vent path from the tank batteries to the control device: (key, from, to).
+HEADERS = [
+    ("vent1", "oil_tanks", "vent_junction"),
+    ("vent2", "water_tanks", "vent_junction"),
+    ("flare", "vent_junction", "flare_inlet"),
+    ("flare1", "flare_inlet", "device"),
+]
+STYLES = """
+    classDef vaporNode fill:#ffe6e6,color:#d62728,stroke:#d62728;
+    classDef tankNode fill:#f5f5dc,stroke:#8b7355,stroke-width:2px;
+    classDef deviceNode fill:#fff3cd,stroke:#d62728,stroke-width:2px;
+    linkStyle default stroke-width:2px;
+"""
+
+
+def _text(value):
+    """Label text safe inside a quoted Mermaid label."""
+    return str(value).replace('"', "#quot;").replace("$", "#36;")
+
+
+def topology(counts, water_tanks):
+    """Hashable topology: ``(stages, water)`` where each stage is ``(key, units drawn or 0 if collapsed)``."""
+    stages = tuple((key, counts[key] if counts[key] <= EXPAND_LIMIT else 0)
+                   for key, *_ in STAGES if counts.get(key, 0) > 0)
+    return stages, bool(water_tanks)
+
+
+def topology_hash(topo):
+    return hashlib.sha1(repr(topo).encode()).hexdigest()[:12]
+
+
+@functools.lru_cache(maxsize=64)
+def skeleton(topo):
+    """Mermaid text for a topology, with ``$name`` placeholders for every label."""
+    stages, water = topo
+    info = {key: (unit, group, vapor) for key, unit, group, vapor in STAGES}
+    lines = ["flowchart LR"]
+    for key, drawn in stages:
+        unit, _, vapor = info[key]
+        if drawn:
+            lines.append(f'    subgraph {key}["$label_{key}"]')
+            lines.append("        direction TB")
+            lines += [f'        {key}{i}["{unit} {i}"]' for i in range(1, drawn + 1)]
+            lines.append("    end")
+        else:
+            lines.append(f'    {key}["$label_{key}"]')
+        lines.append(f'    {key}_vapor["{vapor}"]:::vaporNode')
+        lines.append(f"    {key} -.-> {key}_vapor")
+
+    lines.append('    oil_tanks[("$label_oil_tanks")]:::tankNode')
+    if water:
+        lines.append('    water_tanks[("$label_water_tanks")]:::tankNode')
+
+    # Liquid: each stage feeds the next, the last feeds the oil tanks.
+    chain = [key for key, _ in stages] + ["oil_tanks"]
+    lines += [f"    {a} --> {b}" for a, b in zip(chain, chain[1:])]
+    if water:
+        links = [key for key, _ in stages if key in ("sep", "ht")]
+        lines += [f"    {key} --> water_tanks" for key in links]
+        if links:
+            # Links are numbered in order: one vapor link per stage, the chain, then these.
+            first = len(stages) + len(chain) - 1
+            lines.append(f"    linkStyle {','.join(str(first + i) for i in range(len(links)))} "
+                         "stroke:#1f77b4,stroke-width:2px;")
+
+    # Vapor from the tanks through the vent headers to the control device.
+    lines.append('    vent_junction(("Vent Junction"))')
+    lines.append('    flare_inlet(("Flare Inlet"))')
+    lines.append('    device{{"$label_device"}}:::deviceNode')
+    for header, start, end in HEADERS:
+        if start == "water_tanks" and not water:
+            continue
+        lines.append(f'    {start} -.->|"$label_{header}"| {end}')
+    lines.append(STYLES)
+    return "\n".join(lines)
+
+
+def diagram(counts, pressures, tanks, headers, device):
+    """Mermaid text for the facility; returns ``(text, topology_hash)``.
+
+    ``counts`` and ``pressures`` (psig) are keyed by stage (``sep``, ``ht``,
+    ``vrt``). ``tanks`` maps ``oil``/``water`` to ``(qty, size_bbl,
+    ppivfr)``; ``headers`` maps each header to ``(total_nps_ft, capacity)``;
+    ``device`` is ``(model, rated_capacity, red_capacity, flow_at_design)``.
+    """
+    topo = topology(counts, tanks["water"][0])
+    labels = {}
+    for key, _, group, _ in STAGES:
+        if counts.get(key, 0) > 0:
+            labels[f"label_{key}"] = _text(f"{group} × {counts[key]}<br/>{pressures[key]:g} psig")
+    for key in ("oil", "water"):
+        qty, size, ppivfr = tanks[key]
+        labels[f"label_{key}_tanks"] = _text(f"{key.title()} Tanks<br/>{qty} × {size} bbl<br/>{ppivfr:.5f} mmscfd")
+    for header, (total_nps, capacity) in headers.items():
+        labels[f"label_{header}"] = _text(f"{header}: {total_nps:.1f} ft 3in NPS<br/>C = {capacity:.4f}")
+    model, rated, red_capacity, flow = device
+    labels["label_device"] = _text(f"{model}<br/>rated {rated:.3f} · red. {red_capacity:.4f}<br/>"
+                                   f"{flow:.5f} mmscfd at design")
+    return Template(skeleton(topo)).safe_substitute(labels), topology_hash(topo)
+
+
+def facility(graph, ui):
+    """``diagram``'s arguments for a site graph and the PFD inputs/``cd_model`` in ``ui``."""
+    ui = {**DEFAULTS, **ui}
+    counts = {stage: int(ui[count]) for stage, (count, _) in STAGE_INPUTS.items()}
+    pressures = {stage: float(ui[psig]) for stage, (_, psig) in STAGE_INPUTS.items()}
+    red_capacity, design_pressure = graph.get("flare1_red_capacity", "design_pressure")
+    tanks = {
+        "oil": (*graph.get("oil_tank_qty", "oil_tank_size"), float(graph["oil_ppivfr"])),
+        "water": (*graph.get("water_tank_qty", "water_tank_size"), float(graph["water_ppivfr"])),
+    }
+    headers = {h: (float(graph[f"{h}_total_nps"]), float(graph[f"{h}_capacity"])) for h in engine.HEADERS}
+    device = (ui.get("cd_model", ""), float(graph["cd_capacity"]), float(red_capacity),
+              float(engine.flow_capacity(red_capacity, design_pressure)))
+    return counts, pressures, tanks, headers, device
+
+
+def height_px(counts):
+    """Component height that fits the tallest drawn stage."""
+    tallest = max([c for c in counts.values() if c <= EXPAND_LIMIT] + [1])
+    return min(250 + 60 * tallest, 900)
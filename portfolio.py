@@ -0,0 +1,186 @@
+"""Fleet portfolio: one results table for every assessed site.
+
+A batch results file (or a site table, which is evaluated on the way in) is
+read a chunk at a time on a background thread into a single DataFrame with
+text columns stored as categoricals. Frames are cached by file content, so
+every session looking at the same file shares one copy. The Portfolio tab
+only ever renders one page: ``query`` filters, sorts and slices on the
+server and returns just that page plus the match count.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import batch
+import engine
+
+MARGIN = "capacity_margin"
+MODEL = "control_device_model"
+ID_COLUMNS = batch.DEFAULT_ID_COLUMNS
+CHUNK_SIZE = 20_000
+CACHE_ENTRIES = 2  # whole fleets, so keep very few
+RESULT_LABELS = {
+    MARGIN: "Capacity Margin (mmscfd)",
+    "total_ppivfr": "Total PPIVFR (mmscfd, SG=1)",
+    "design_pressure": "Design Pressure (osig)",
+    "flare1_red_capacity": "Flare1 Red. Capacity MMSCFD/SQRT(psig)",
+    **{f"{header}_capacity": f"{header} Capacity MMSCFD/SQRT(psig)" for header in engine.HEADERS},
+    "max_oil_production": "Max Oil Production (bbl/day)",
+    "oil_production_headroom": "Oil Production Headroom (bbl/day)",
+    "max_water_production": "Max Water Production (bbl/day)",
+    "water_production_headroom": "Water Production Headroom (bbl/day)",
+}
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_key(source):
+    """Content digest of an upload, or (path, size, mtime) for a file on the server."""
+    if isinstance(source, (str, os.PathLike)):
+        stat = os.stat(source)
+        return ("path", os.fspath(source), stat.st_size, stat.st_mtime_ns)
+    return ("data", hashlib.sha1(source.getbuffer()).hexdigest())
+
+
+def _cached(key):
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    return None
+
+
+def _store(key, frame):
+    with _cache_lock:
+        _cache[key] = frame
+        while len(_cache) > CACHE_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def _results_chunk(chunk):
+    """A chunk of batch results; site tables are evaluated first."""
+    if MARGIN not in chunk.columns:
+        chunk = batch.evaluate_frame(chunk, ID_COLUMNS, max_production=True)
+    for name in ID_COLUMNS:
+        if name in chunk.columns:
+            chunk[name] = chunk[name].astype("string")
+    return chunk
+
+
+def _file_size(source):
+    try:
+        return os.fstat(source.fileno()).st_size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def read_portfolio(source, chunksize=CHUNK_SIZE, progress=None):
+    """Read a results file or site table into one columnar DataFrame.
+
+    ``source`` is a path or a file object (CSV or Parquet, see
+    ``batch.iter_chunks``). ``progress(fraction)`` is called after every
+    chunk when the total size is known.
+    """
+    if isinstance(source, (str, os.PathLike)) and os.path.isfile(source) and progress:
+        # Read through a file object so progress can follow its position.
+        with open(source, "rb") as f:
+            return read_portfolio(f, chunksize, progress)
+    total = getattr(source, "size", None) or _file_size(source)
+    chunks = []
+    for chunk in batch.iter_chunks(source, chunksize):
+        chunks.append(_results_chunk(chunk))
+        if progress and total and hasattr(source, "tell"):
+            progress(min(source.tell() / total, 1.0))
+    frame = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=ID_COLUMNS + [MARGIN])
+    for name in ID_COLUMNS:
+        if name in frame.columns:
+            frame[name] = frame[name].astype("category")
+    if "site_id" not in frame.columns:
+        frame.insert(0, "site_id", pd.Categorical(frame.index.astype(str)))
+    return frame
+
+
+class LoadJob:
+    """Reads a portfolio on a background thread; poll ``done``, ``progress``, ``frame`` and ``error``."""
+
+    def __init__(self, source, name=""):
+        self.name = name or getattr(source, "name", os.fspath(source) if isinstance(source, (str, os.PathLike)) else "")
+        self.error = None
+        self._key = _cache_key(source)
+        self.frame = _cached(self._key)
+        self.progress = 0.0 if self.frame is None else 1.0
+        self._thread = None
+        if self.frame is None:
+            self._thread = threading.Thread(target=self._run, args=(source,), daemon=True)
+            self._thread.start()
+
+    @property
+    def done(self):
+        return self._thread is None or not self._thread.is_alive()
+
+    def _run(self, source):
+        def report(fraction):
+            self.progress = fraction
+
+        try:
+            frame = read_portfolio(source, progress=report)
+        except (Exception, SystemExit) as exc:  # batch exits for a missing optional reader (pyarrow)
+            self.error = str(exc) or type(exc).__name__
+            return
+        _store(self._key, frame)
+        self.progress = 1.0
+        self.frame = frame
+
+
+def numeric_columns(frame):
+    return [name for name in frame.columns if pd.api.types.is_numeric_dtype(frame[name])]
+
+
+def query(frame, models=None, site_text="", ranges=None, sort_by=MARGIN, ascending=True, page=0, page_size=50):
+    """One page of ``frame`` after filtering and sorting; returns ``(page_frame, n_matching)``.
+
+    ``models`` keeps only those control device models, ``site_text`` is a
+    case-insensitive substring of ``site_id``, and ``ranges`` maps numeric
+    columns to inclusive ``(low, high)`` bounds (either may be None). Only
+    the matching rows are sorted, and only the page is copied.
+    """
+    mask = np.ones(len(frame), dtype=bool)
+    if models and MODEL in frame.columns:
+        mask &= frame[MODEL].isin(models).to_numpy()
+    if site_text:
+        mask &= frame["site_id"].astype(str).str.contains(site_text, case=False, regex=False).to_numpy()
+    for name, (low, high) in (ranges or {}).items():
+        values = frame[name].to_numpy(dtype=float)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+    rows = np.flatnonzero(mask)
+    if sort_by in frame.columns and len(rows):
+        keys = frame[sort_by].iloc[rows]
+        keys = keys.to_numpy(dtype=float) if pd.api.types.is_numeric_dtype(keys) else keys.astype(str).to_numpy()
+        order = np.argsort(keys, kind="stable")
+        rows = rows[order if ascending else order[::-1]]
+    start = page * page_size
+    return frame.iloc[rows[start:start + page_size]], len(rows)
+
+
+def model_summary(frame):
+    """Per control device model: site count, undersized sites (margin < 0) and margin spread."""
+    if MODEL not in frame.columns or MARGIN not in frame.columns:
+        return pd.DataFrame(columns=["sites", "undersized", "undersized_fraction", "min_margin", "median_margin"])
+    grouped = frame.groupby(MODEL, observed=True)[MARGIN]
+    summary = pd.DataFrame({
+        "sites": grouped.size(),
+        "undersized": (frame[MARGIN] < 0).groupby(frame[MODEL], observed=True).sum(),
+        "min_margin": grouped.min(),
+        "median_margin": grouped.median(),
+    })
+    summary.insert(2, "undersized_fraction", summary["undersized"] / summary["sites"])
+    return summary.sort_values(["undersized_fraction", "min_margin"], ascending=[False, True])
+
@@ -0,0 +1,164 @@
+"""Project files: the full app input set in one small, versioned JSON document.
+
+    {
+      "format": "cvs-project", "version": 1,
+      "inputs": {"oil_production": 350.0, "promax_flash": null, ...},
+      "layout": {"fields": ["dev", "tee_run", ...], "sizes": ["1.5in", ...]},
+      "headers": {"vent1": [[...8 sizes...], ...one row per field...], ...},
+      "ui": {"cd_model": "...", ...},
+      "scenarios": {"Add 2 tanks": {"oil_tank_qty": 9, ...}, ...}
+    }
+
+``inputs`` uses the ``engine.SITE_DEFAULTS`` names, so a project is one row
+of a batch site table (``site_row``); ``null`` means "not given" (NaN).
+Each header is a single fields × sizes array, and ``layout`` names its rows
+and columns so files stay readable if the order ever changes. ``ui`` holds
+display-only values (model name, notes, PFD counts) that the calculations
+don't use. ``scenarios`` is optional: named sets of changed inputs, keyed by
+input or flattened header column name (see ``scenarios.py``).
+"""
+import json
+import math
+import os
+
+import numpy as np
+
+import engine
+
+FORMAT = "cvs-project"
+VERSION = 1
+SUFFIX = ".cvs.json"
+HEADER_FIELDS = ["dev"] + engine.FITTING_SLUGS + engine.KNOCKOUT_SLUGS + engine.SPECIALTY_SLUGS
+
+
+class ProjectError(ValueError):
+    """A file that isn't a project this version can read."""
+
+
+def _json_value(value):
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return None if math.isnan(value) else float(value)
+    return value
+
+
+def new_project(inputs, headers, ui=None, scenarios=None):
+    """Build a project dict from input values, header arrays, display-only values and scenarios."""
+    project = {
+        "format": FORMAT,
+        "version": VERSION,
+        "inputs": {name: _json_value(inputs.get(name, default)) for name, default in engine.SITE_DEFAULTS.items()},
+        "layout": {"fields": HEADER_FIELDS, "sizes": engine.SIZE_SLUGS},
+        "headers": {header: np.asarray(headers[header], dtype=float).round(6).tolist()
+                    for header in engine.HEADERS if header in headers},
+        "ui": {key: _json_value(value) for key, value in (ui or {}).items()},
+    }
+    if scenarios:
+        project["scenarios"] = {name: {input_name: _json_value(value) for input_name, value in deltas.items()}
+                                for name, deltas in scenarios.items()}
+    return project
+
+
+def dumps(project):
+    return json.dumps(project, separators=(",", ":"), allow_nan=False)
+
+
+def loads(text):
+    """Parse and validate a project; returns ``(inputs, headers, ui)``.
+
+    Missing inputs take their defaults, ``null`` becomes NaN, and header
+    arrays are returned as ``(len(HEADER_FIELDS), N_SIZES)`` float arrays in
+    this version's layout.
+    """
+    try:
+        project = json.loads(text)
+    except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+        raise ProjectError(f"Not a project file: {exc}") from exc
+    if not isinstance(project, dict) or project.get("format") != FORMAT:
+        raise ProjectError("Not a project file")
+    if not isinstance(project.get("version"), int) or project["version"] > VERSION:
+        raise ProjectError(f"Project version {project.get('version')!r} is newer than this app ({VERSION})")
+
+    for key in ("inputs", "layout", "headers", "ui"):
+        if not isinstance(project.get(key, {}), dict):
+            raise ProjectError(f"Project {key!r} must be an object")
+
+    inputs = dict(engine.SITE_DEFAULTS)
+    for name, value in project.get("inputs", {}).items():
+        if name in inputs:
+            inputs[name] = _input_value(name, value)
+
+    layout = project.get("layout", {})
+    fields = layout.get("fields", HEADER_FIELDS)
+    sizes = layout.get("sizes", engine.SIZE_SLUGS)
+    if not isinstance(fields, list) or not isinstance(sizes, list):
+        raise ProjectError("Project layout must list the header fields and sizes")
+    rows = [fields.index(f) if f in fields else None for f in HEADER_FIELDS]
+    cols = [sizes.index(s) if s in sizes else None for s in engine.SIZE_SLUGS]
+    headers = {}
+    for header, values in project.get("headers", {}).items():
+        if header not in engine.HEADERS:
+            continue
+        try:
+            values = np.asarray(values, dtype=float).reshape(len(fields), len(sizes))
+        except (TypeError, ValueError):
+            raise ProjectError(f"Header {header!r} must be {len(fields)} rows of {len(sizes)} numbers") from None
+        grid = np.zeros((len(HEADER_FIELDS), engine.N_SIZES))
+        for i, r in enumerate(rows):
+            for j, c in enumerate(cols):
+                if r is not None and c is not None:
+                    grid[i, j] = values[r, c]
+        headers[header] = np.nan_to_num(grid)
+    return inputs, headers, project.get("ui", {})
+
+
+def _input_value(name, value):
+    """An input as a float (``null`` is NaN), or its default for a count or flag left ``null``."""
+    default = engine.SITE_DEFAULTS[name]
+    try:
+        value = math.nan if value is None else float(value)
+    except (TypeError, ValueError):
+        raise ProjectError(f"Input {name!r} must be a number, got {value!r}") from None
+    if isinstance(default, (bool, int)) and not math.isfinite(value):
+        return default
+    return value
+
+
+def loads_scenarios(text):
+    """Scenarios of a project ``loads`` accepted: ``{name: {input: value}}``, ``{}`` if it has none."""
+    scenarios = json.loads(text).get("scenarios") or {}
+    if not isinstance(scenarios, dict) or not all(isinstance(deltas, dict) for deltas in scenarios.values()):
+        raise ProjectError("Project scenarios must map each name to its changed inputs")
+    return scenarios
+
+
+def save(path, project):
+    with open(path, "w") as f:
+        f.write(dumps(project))
+
+
+def load(path):
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def site_row(inputs, headers):
+    """One batch site-table row (``engine.SITE_DEFAULTS`` names + flattened header columns)."""
+    row = dict(inputs)
+    for header, grid in headers.items():
+        row.update(zip(engine.header_columns(header), np.asarray(grid, dtype=float).ravel()))
+    return row
+
+
+def project_paths(path):
+    """Project files at ``path``: the file itself, or every ``*.cvs.json`` in a directory."""
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(SUFFIX))
+    return [path]
+
+
+def is_project_path(path):
+    return isinstance(path, (str, os.PathLike)) and (os.path.isdir(path) or str(path).endswith(SUFFIX))
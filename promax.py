@@ -0,0 +1,364 @@
+"""Import PROMAX results for every site from a directory of exports.
+
+    python promax.py scan exports/
+    python promax.py show exports/ SITE-0042
+
+Each export is one stream of one site, named ``<site_id>_oil.csv`` or
+``<site_id>_water.xlsx`` (``-``, ``.`` or a space also separate the stream),
+or ``oil.csv``/``water.csv`` inside a directory named for the site. CSV, TSV
+and text exports are read as delimited rows; ``.xlsx``/``.xlsm`` need
+``openpyxl``. Rows are matched by label: the flash gas ratio (a "flash" or
+"GOR" row in SCF/BBL), the vapor molecular weight, and, when present, the
+component table under a "Composition" or "Component" row (stored as mole
+percent).
+
+Parsed results go into a SQLite index in ``CVS_CACHE_DIR`` keyed by file
+path, with each file's mtime and size, so a rescan re-parses only new or
+changed files (and files that failed last time). The scanned directory is
+then held in memory by site id, so the app and ``batch.py --promax`` look a
+site up with one dict access.
+"""
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import stagecache
+
+INDEX_PATH = os.path.join(stagecache.CACHE_DIR, "promax_index.sqlite")
+SUFFIXES = (".csv", ".tsv", ".txt", ".xlsx", ".xlsm")
+STREAMS = ("oil", "water")
+# Site columns filled from the index, by stream and record field.
+SITE_COLUMNS = {
+    ("oil", "flash"): "promax_flash",
+    ("oil", "mw"): "promax_mw",
+    ("water", "flash"): "promax_water_flash",
+    ("water", "mw"): "promax_water_mw",
+}
+PARALLEL_FROM = 32  # changed files before parsing moves to a process pool
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    site_id TEXT NOT NULL,
+    stream TEXT NOT NULL,
+    flash REAL,
+    mw REAL,
+    composition TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS files_site ON files (site_id, stream);
+"""
+
+FLASH_LABEL = re.compile(r"flash|\bgor\b|gas[- /]?(oil|water|liquid)[- ]ratio", re.I)
+SCF_PER_BBL = re.compile(r"scf\s*/\s*(bbl|stb)", re.I)
+MW_LABEL = re.compile(r"mol(ecular|\.)?\s*(weight|wt)|\bmw\b", re.I)
+LIQUID = re.compile(r"liquid|oil phase|water phase", re.I)
+COMPOSITION_LABEL = re.compile(r"^(composition|components?)\b", re.I)
+STEM = re.compile(r"^(?P<site>.+?)[ _.-](?P<stream>oil|water)$", re.I)
+
+
+# -----------------------------
+# Parsing
+# -----------------------------
+def site_stream(path):
+    """``(site_id, stream)`` from an export's file name (stream defaults to oil)."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    match = STEM.match(stem)
+    if match:
+        return match["site"], match["stream"].lower()
+    if stem.lower() in STREAMS:
+        return os.path.basename(os.path.dirname(os.path.abspath(path))), stem.lower()
+    return stem, "oil"
+
+
+def _number(cell):
+    if cell is None or isinstance(cell, bool):
+        return None
+    if isinstance(cell, (int, float)):
+        return None if math.isnan(cell) else float(cell)
+    try:
+        return float(str(cell).replace(",", "").strip())
+    except ValueError:
+        return None
+
+
+def read_rows(path):
+    """Every row of an export as a list of cells (all sheets, for workbooks)."""
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        try:
+            import openpyxl
+        except ImportError:
+            raise ValueError("reading .xlsx exports requires openpyxl (pip install openpyxl)") from None
+        book = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            return [list(row) for sheet in book.worksheets for row in sheet.iter_rows(values_only=True)]
+        finally:
+            book.close()
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+        text = f.read()
+    # Whichever delimiter the start of the file uses most (csv.Sniffer guesses
+    # wrong on short two-column reports).
+    sample = text[:4096]
+    delimiter = max(",\t;", key=sample.count)
+    return list(csv.reader(io.StringIO(text), delimiter=delimiter))
+
+
+def parse_rows(rows):
+    """Flash (SCF/BBL), vapor MW and composition (mole %) from export rows.
+
+    A label is the first text cell of a row and its value the first number
+    after it. Missing values are NaN; a missing composition is ``{}``.
+    """
+    flash = mw = np.nan
+    composition = {}
+    in_composition = False
+    for row in rows:
+        cells = [cell for cell in row if cell is not None and str(cell).strip() != ""]
+        if not cells:
+            in_composition = False
+            continue
+        label_at = next((i for i, cell in enumerate(cells) if _number(cell) is None), None)
+        if label_at is None:
+            continue
+        label = str(cells[label_at]).strip()
+        text = " ".join(str(cell) for cell in cells)
+        value = next((v for v in map(_number, cells[label_at + 1:]) if v is not None), None)
+        if COMPOSITION_LABEL.match(label):
+            in_composition = True
+            continue
+        if in_composition:
+            if value is None:
+                in_composition = False
+            else:
+                composition[label] = value
+                continue
+        if value is None:
+            continue
+        # MW first: "Flash Gas Molecular Weight" is a vapor MW, not a flash ratio.
+        if MW_LABEL.search(label):
+            if np.isnan(mw) and not LIQUID.search(label):
+                mw = value
+        elif np.isnan(flash) and FLASH_LABEL.search(label) and (SCF_PER_BBL.search(text) or "scf" not in text.lower()):
+            flash = value
+    if composition and sum(composition.values()) <= 1.0 + 1e-6:
+        composition = {name: 100.0 * fraction for name, fraction in composition.items()}
+    return flash, mw, composition
+
+
+def parse_file(path):
+    """Index record for one export; a file that can't be read gets an ``error``."""
+    site_id, stream = site_stream(path)
+    record = {"path": path, "site_id": site_id, "stream": stream, "flash": np.nan, "mw": np.nan,
+              "composition": {}, "error": None}
+    try:
+        record["flash"], record["mw"], record["composition"] = parse_rows(read_rows(path))
+    except (OSError, ValueError, csv.Error, KeyError) as exc:
+        record["error"] = f"{type(exc).__name__}: {exc}"
+    else:
+        if np.isnan(record["flash"]) and np.isnan(record["mw"]):
+            record["error"] = "no flash or vapor MW found"
+    return record
+
+
+def export_paths(directory):
+    found = []
+    for root, _, names in os.walk(directory):
+        found.extend(os.path.join(root, name) for name in names
+                     if name.lower().endswith(SUFFIXES) and not name.startswith(("~$", ".")))
+    return sorted(found)
+
+
+# -----------------------------
+# Index
+# -----------------------------
+def _nan(value):
+    return np.nan if value is None else value
+
+
+def _null(value):
+    return None if value != value else value
+
+
+class PromaxIndex:
+    """The parsed exports under one directory, looked up by site id."""
+
+    def __init__(self, directory, index_path=INDEX_PATH):
+        self.directory = os.path.abspath(directory)
+        self.index_path = index_path
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        db = sqlite3.connect(self.index_path, timeout=10, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(SCHEMA)
+        return db
+
+    def _under(self, db, columns):
+        # Paths under the directory, as an index range scan on the primary key.
+        prefix = os.path.join(self.directory, "")
+        return db.execute(f"SELECT {columns} FROM files WHERE path >= ? AND path < ?",
+                          (prefix, prefix + "\U0010ffff"))
+
+    def refresh(self, workers=None):
+        """Parse new and changed exports; returns ``{parsed, unchanged, removed, errors}`` counts.
+
+        ``errors`` counts the files parsed this time that failed.
+        """
+        with self._lock:
+            db = self._connect()
+            try:
+                # Failed files are retried, like good ones, only once they change.
+                known = {path: (mtime, size) for path, mtime, size in self._under(db, "path, mtime_ns, size")}
+                todo, stats = [], {}
+                for path in export_paths(self.directory):
+                    stat = os.stat(path)
+                    stats[path] = (stat.st_mtime_ns, stat.st_size)
+                    if known.get(path) != stats[path]:
+                        todo.append(path)
+                removed = [path for path in known if path not in stats]
+                records = self._parse(todo, workers)
+                db.execute("BEGIN")
+                db.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in removed])
+                db.executemany(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(r["path"], *stats[r["path"]], r["site_id"], r["stream"], _null(r["flash"]), _null(r["mw"]),
+                      json.dumps(r["composition"]), r["error"]) for r in records])
+                db.execute("COMMIT")
+                self._load(db)
+            finally:
+                db.close()
+        return {"parsed": len(todo), "unchanged": len(stats) - len(todo), "removed": len(removed),
+                "errors": sum(r["error"] is not None for r in records)}
+
+    @staticmethod
+    def _parse(paths, workers):
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(paths) < PARALLEL_FROM:
+            return [parse_file(path) for path in paths]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(parse_file, paths, chunksize=16))
+
+    def load(self):
+        """Read the index for this directory into memory without scanning it."""
+        with self._lock:
+            db = self._connect()
+            try:
+                self._load(db)
+            finally:
+                db.close()
+
+    def _load(self, db):
+        sites = {}
+        rows = self._under(db, "path, mtime_ns, site_id, stream, flash, mw, composition, error")
+        # Oldest first, so the newest export of a site's stream wins.
+        for path, mtime, site_id, stream, flash, mw, composition, error in sorted(rows, key=lambda r: r[1]):
+            if error is None:
+                sites.setdefault(site_id, {})[stream] = {
+                    "path": path, "flash": _nan(flash), "mw": _nan(mw), "composition": json.loads(composition)}
+        self._sites = sites
+
+    def lookup(self, site_id):
+        """``{stream: {"path", "flash", "mw", "composition"}}`` for a site (``{}`` if none)."""
+        return self._sites.get(str(site_id).strip(), {})
+
+    def sites(self):
+        return sorted(self._sites)
+
+    def errors(self):
+        """``(path, error)`` for every export under the directory that failed to parse."""
+        db = self._connect()
+        try:
+            return [(path, error) for path, error in self._under(db, "path, error") if error is not None]
+        finally:
+            db.close()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def shared(directory, refresh=True):
+    """The process-wide index of ``directory``, scanned (or just loaded) on first use."""
+    key = os.path.abspath(directory)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = PromaxIndex(key)
+            if refresh:
+                index.refresh()
+            else:
+                index.load()
+    return index
+
+
+def join_sites(df, index, site_column="site_id"):
+    """Fill a site table's missing PROMAX inputs from ``index`` by ``site_column``.
+
+    Like ``catalog.join_sites``: values already given are kept, and each
+    distinct site is looked up once.
+    """
+    if site_column not in df.columns:
+        return df
+    keys = df[site_column].astype("string").str.strip()
+    codes, uniques = keys.factorize()
+    found = [index.lookup(site) for site in uniques]
+    df = df.copy()
+    for (stream, field), site_column_name in SITE_COLUMNS.items():
+        # codes of -1 (no site id) index the appended NaN.
+        values = np.array([f.get(stream, {}).get(field, np.nan) for f in found] + [np.nan], dtype=float)[codes]
+        if site_column_name in df.columns:
+            given = np.asarray(df[site_column_name].map(_number).astype(float), dtype=float)
+        else:
+            given = np.full(len(df), np.nan)
+        df[site_column_name] = np.where(np.isnan(given), values, given)
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index a directory of PROMAX exports.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("scan", help="parse new and changed exports into the index")
+    p.add_argument("directory")
+    p.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    p = sub.add_parser("show", help="print a site's indexed PROMAX data")
+    p.add_argument("directory")
+    p.add_argument("site_id")
+    args = parser.parse_args(argv)
+
+    index = PromaxIndex(args.directory)
+    if args.command == "scan":
+        counts = index.refresh(args.workers)
+        errors = index.errors()
+        for path, error in errors:
+            print(f"{path}: {error}", file=sys.stderr)
+        print(f"{counts['parsed']:,} parsed, {counts['unchanged']:,} unchanged, {counts['removed']:,} removed, "
+              f"{len(errors):,} failed; {len(index.sites()):,} sites", file=sys.stderr)
+        return 1 if errors else 0
+    index.load()
+    streams = index.lookup(args.site_id)
+    if not streams:
+        print(f"{args.site_id}: not in the index (run scan first?)", file=sys.stderr)
+        return 1
+    for stream, record in sorted(streams.items()):
+        print(f"{stream:<6} flash {record['flash']:10.3f} SCF/BBL  MW {record['mw']:8.3f}  {record['path']}")
+        for name, percent in record["composition"].items():
+            print(f"         {name:<24} {percent:8.4f} mol%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
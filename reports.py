@@ -0,0 +1,619 @@
+"""Site reports for regulatory submissions, as PDF and XLSX, from project files.
+
+    python reports.py site.cvs.json out/
+    python reports.py projects/ out/ --format pdf,xlsx --workers 8
+
+A report has the Summary of Results (Tab 8), the Control Device Output
+(Flare1), a per-pipe-size breakdown of every vent header, and the process
+flow diagram. The PDF has three pages and draws the PFD as blocks. The XLSX
+has one sheet per section, and its PFD sheet holds the unit table and the
+Mermaid text.
+
+Neither format needs a library. Everything that doesn't depend on the site
+is compiled once per process into byte strings with value slots (``template()``):
+
+- PDF: page content streams, font and page objects
+- XLSX: package parts, styles and sheet rows
+
+Rendering a report fills the slots and joins the bytes, which takes
+milliseconds. The bulk mode runs projects on a process pool, so each worker
+compiles the template once and reuses it.
+"""
+import argparse
+import functools
+import io
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+import depgraph
+import engine
+import pfd
+import projects
+
+FORMATS = ("pdf", "xlsx")
+HEADER_TITLES = {
+    "vent1": "MAIN TANK VENT HEADER1",
+    "vent2": "MAIN TANK VENT HEADER2",
+    "flare": "FlareVent",
+    "flare1": "Flare1",
+}
+# (section title, [(label, value name, format)]) — shared by both formats.
+SUMMARY = [
+    ("PPIVFR Summary", [
+        ("Oil PPIVFR (mmscfd, SG=1)", "oil_ppivfr", "{:.5f}"),
+        ("Water PPIVFR (mmscfd, SG=1)", "water_ppivfr", "{:.5f}"),
+        ("Other PPIVFR (mmscfd, SG=1)", "other_ppivfr", "{:.5f}"),
+        ("Total PPIVFR (mmscfd, SG=1)", "total_ppivfr", "{:.5f}"),
+    ]),
+    ("Thermal & Pressure Details", [
+        ("Total Thermal PPIVFR (mmscfd)", "total_thermal_ppivfr", "{:.5f}"),
+        ("Minimum Thief Hatch/PRV (osig)", "thief_prv_input", "{:.2f}"),
+        ("Design Pressure (osig)", "design_pressure", "{:.2f}"),
+    ]),
+    ("Control Device Output", [
+        ("Control Device Make/Model", "cd_model", "{}"),
+        ("Flare Capacity MMSCFD/SQRT(psig), SG=1", "cd_capacity", "{:.3f}"),
+        ('Total Length (ft) of 3" NPS of Flare Vent', "flare1_total_nps", "{:.2f}"),
+        ('Le, ft (3" pipe) of Flare/Comb', "flare1_le_ft", "{:.2f}"),
+        ('wfittings, ft 3" pipe', "flare1_wfittings_ft", "{:.2f}"),
+        ("Red. Capacity MMSCFD/SQRT(psig), SG=1", "flare1_red_capacity", "{:.5f}"),
+        ("Turn ON (oz)", "cd_turn_on", "{:.1f}"),
+        ("Turn OFF (oz)", "cd_turn_off", "{:.1f}"),
+        ("Flow Capacity at Design Pressure (mmscfd)", "flow_at_design", "{:.5f}"),
+        ("Capacity Margin (mmscfd)", "capacity_margin", "{:.5f}"),
+    ]),
+    ("Vent Headers", [
+        row for h, title in HEADER_TITLES.items() for row in (
+            (f'{title}: Total Length (ft) of 3" NPS', f"{h}_total_nps", "{:.2f}"),
+            (f"{title}: Capacity (MMSCFD/SQRT(psi))", f"{h}_capacity", "{:.5f}"),
+        )
+    ]),
+]
+BREAKDOWN_COLUMNS = [
+    ("Developed Length (ft)", "dev"),
+    ("Total Equivalent Length (ft)", "total_pipe"),
+    ('Length of 3" NPS (ft)', "total_pipe_nps"),
+]
+SCALARS = sorted({name for _, rows in SUMMARY for _, name, _ in rows})
+
+
+def report_values(inputs, headers, ui):
+    """Every value a report shows, computed from a project's inputs."""
+    graph = depgraph.site_graph()
+    graph.set(**{name: inputs[name] for name in engine.SITE_DEFAULTS},
+              **{f"header_{h}": grid for h, grid in headers.items()})
+    counts, pressures, tanks, header_values, device = pfd.facility(graph, ui)
+    values = {"cd_model": device[0], "flow_at_design": device[3]}
+    values.update({name: float(graph[name]) for name in SCALARS if name not in values})
+    breakdown = {h: {"dev": np.asarray(graph[f"header_{h}"], dtype=float)[0],
+                     "total_pipe": np.asarray(graph[f"{h}_total_pipe"], dtype=float),
+                     "total_pipe_nps": np.asarray(graph[f"{h}_total_pipe_nps"], dtype=float)}
+                 for h in engine.HEADERS}
+    return values, breakdown, (counts, pressures, tanks, header_values, device)
+
+
+def _format(fmt, value):
+    if isinstance(value, float) and np.isnan(value):
+        return ""
+    return fmt.format(value)
+
+
+# -----------------------------
+# PDF
+# -----------------------------
+PAGE_W, PAGE_H, MARGIN = 612, 792, 54
+# Helvetica advance widths (1/1000 em) for ASCII 32–126; used to centre and right-align text.
+_HELVETICA = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278, 556, 556, 556, 556, 556, 556,
+    556, 556, 556, 556, 278, 278, 584, 584, 584, 556, 1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667,
+    556, 833, 722, 778, 667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556, 333, 556,
+    556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556, 556, 556, 333, 500, 278, 556, 500, 722,
+    500, 500, 500, 334, 260, 334, 584,
+]
+
+
+def text_width(text, size):
+    return sum(_HELVETICA[ord(c) - 32] if 32 <= ord(c) < 127 else 556 for c in text) * size / 1000
+
+
+def _pdf_string(text):
+    data = text.encode("latin-1", "replace")
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _text_op(x, y, text, size=10, bold=False, align="left"):
+    if align == "right":
+        x -= text_width(text, size)
+    elif align == "center":
+        x -= text_width(text, size) / 2
+    return b"BT /F%d %g Tf %.2f %.2f Td %s Tj ET\n" % (2 if bold else 1, size, x, y, _pdf_string(text))
+
+
+class _Page:
+    """Content stream ops, static bytes interleaved with value slots."""
+
+    def __init__(self):
+        self.parts = []
+
+    def op(self, data):
+        if self.parts and isinstance(self.parts[-1], bytes):
+            self.parts[-1] += data
+        else:
+            self.parts.append(data)
+
+    def text(self, x, y, text, size=10, bold=False, align="left"):
+        self.op(_text_op(x, y, text, size, bold, align))
+
+    def slot(self, x, y, name, fmt, size=10, align="right"):
+        self.parts.append((x, y, name, fmt, size, align))
+
+    def line(self, x1, y1, x2, y2, width=0.5):
+        self.op(b"%g w %.2f %.2f m %.2f %.2f l S\n" % (width, x1, y1, x2, y2))
+
+    def render(self, values, extra=b""):
+        return b"".join(part if isinstance(part, bytes) else
+                        _text_op(part[0], part[1], _format(part[3], values[part[2]]), part[4], align=part[5])
+                        for part in self.parts) + extra
+
+
+def _summary_page():
+    page = _Page()
+    y = PAGE_H - MARGIN
+    page.text(MARGIN, y, "Closed Vent System Assessment", 16, bold=True)
+    page.slot(PAGE_W - MARGIN, y, "site_id", "{}", 12)
+    y -= 30
+    for title, rows in SUMMARY:
+        page.text(MARGIN, y, title, 12, bold=True)
+        page.line(MARGIN, y - 4, PAGE_W - MARGIN, y - 4)
+        y -= 18
+        for label, name, fmt in rows:
+            page.text(MARGIN + 8, y, label)
+            page.slot(PAGE_W - MARGIN, y, name, fmt)
+            y -= 14
+        y -= 10
+    return page
+
+
+def _breakdown_page():
+    page = _Page()
+    y = PAGE_H - MARGIN
+    page.text(MARGIN, y, "Vent Header Breakdown by Pipe Size", 16, bold=True)
+    y -= 28
+    columns = [PAGE_W - MARGIN - 150 * (len(BREAKDOWN_COLUMNS) - 1 - i) for i in range(len(BREAKDOWN_COLUMNS))]
+    for h, title in HEADER_TITLES.items():
+        page.text(MARGIN, y, title, 12, bold=True)
+        y -= 15
+        page.text(MARGIN + 8, y, "Pipe Size", 9, bold=True)
+        for x, (label, _) in zip(columns, BREAKDOWN_COLUMNS):
+            page.text(x, y, label, 9, bold=True, align="right")
+        page.line(MARGIN, y - 3, PAGE_W - MARGIN, y - 3)
+        y -= 13
+        for i, size in enumerate(engine.PIPE_LABELS):
+            page.text(MARGIN + 8, y, size, 9)
+            for x, (_, field) in zip(columns, BREAKDOWN_COLUMNS):
+                page.slot(x, y, f"{h}.{field}.{i}", "{:.2f}", 9)
+            y -= 12
+        page.text(MARGIN + 8, y, "Total", 9, bold=True)
+        for x, (_, field) in zip(columns, BREAKDOWN_COLUMNS):
+            page.slot(x, y, f"{h}.{field}.total", "{:.2f}", 9)
+        y -= 22
+    return page
+
+
+def _pfd_page():
+    page = _Page()
+    page.text(MARGIN, PAGE_H - MARGIN, "Process Flow Diagram", 16, bold=True)
+    return page
+
+
+def _box(x, y, w, lines, dashed=False):
+    """A box centred on ``x`` with its top at ``y``; returns (ops, bottom y)."""
+    h = 8 + 12 * len(lines)
+    ops = b"[3 2] 0 d " if dashed else b""
+    ops += b"0.8 w %.2f %.2f %.2f %.2f re S [] 0 d\n" % (x - w / 2, y - h, w, h)
+    for i, text in enumerate(lines):
+        ops += _text_op(x, y - 14 - 12 * i, text, 9, bold=i == 0, align="center")
+    return ops, y - h
+
+
+def _arrow(x1, y1, x2, y2, dashed=False):
+    ops = b"[3 2] 0 d " if dashed else b""
+    ops += b"0.8 w %.2f %.2f m %.2f %.2f l S [] 0 d\n" % (x1, y1, x2, y2)
+    # Arrowhead: a small filled triangle pointing along the line.
+    dx, dy = x2 - x1, y2 - y1
+    length = max((dx * dx + dy * dy) ** 0.5, 1e-9)
+    ux, uy = dx / length, dy / length
+    bx, by = x2 - 6 * ux, y2 - 6 * uy
+    ops += b"%.2f %.2f m %.2f %.2f l %.2f %.2f l f\n" % (x2, y2, bx - 3 * uy, by + 3 * ux, bx + 3 * uy, by - 3 * ux)
+    return ops
+
+
+def pfd_ops(counts, pressures, tanks, headers, device):
+    """PDF drawing ops for the facility: stages, tanks, vent path and control device."""
+    groups = {key: group for key, _, group, _ in pfd.STAGES}
+    vapor = {key: dest for key, _, _, dest in pfd.STAGES}
+    stages = [key for key, *_ in pfd.STAGES if counts.get(key, 0) > 0]
+    boxes = [(groups[key], [groups[key], f"\xd7 {counts[key]}", f"{pressures[key]:g} psig"]) for key in stages]
+    qty, size, ppivfr = tanks["oil"]
+    boxes.append(("Oil Tanks", ["Oil Tanks", f"{qty:g} \xd7 {size:g} bbl", f"{ppivfr:.5f} mmscfd"]))
+    width = PAGE_W - 2 * MARGIN
+    step = width / len(boxes)
+    box_w = min(step - 24, 130)
+    ops, top = b"", PAGE_H - MARGIN - 90
+    centres = [MARGIN + step * (i + 0.5) for i in range(len(boxes))]
+    bottoms = []
+    for i, (x, (_, lines)) in enumerate(zip(centres, boxes)):
+        box, bottom = _box(x, top, box_w, lines)
+        ops += box
+        bottoms.append(bottom)
+        if i < len(stages):
+            ops += _text_op(x, top + 40, vapor[stages[i]], 8, align="center")
+            ops += _arrow(x, top, x, top + 34, dashed=True)
+        if i:
+            ops += _arrow(centres[i - 1] + box_w / 2, top - 20, x - box_w / 2, top - 20)
+
+    # Water battery under the first stages, fed by separators and treaters.
+    water_top = min(bottoms) - 50
+    qty, size, ppivfr = tanks["water"]
+    oil_x = centres[-1]
+    vent_y = water_top - 120
+    if qty:
+        water_x = centres[0]
+        box, water_bottom = _box(water_x, water_top, box_w, ["Water Tanks", f"{qty:g} \xd7 {size:g} bbl",
+                                                           f"{ppivfr:.5f} mmscfd"])
+        ops += box
+        for i, key in enumerate(stages):
+            if key in ("sep", "ht"):
+                ops += b"0 0 0.7 RG " + _arrow(centres[i], bottoms[i], water_x, water_top) + b"0 G\n"
+        vent_y = water_bottom - 60
+
+    # Vent path: tanks -> vent junction -> flare inlet -> control device.
+    total_nps, capacity = headers["flare1"]
+    model, rated, red_capacity, flow = device
+    path = [
+        ("Vent Junction", []),
+        ("Flare Inlet", []),
+        (model or "Control Device", [f"rated {rated:.3f}", f"red. {red_capacity:.4f}", f"{flow:.5f} mmscfd"]),
+    ]
+    xs = [MARGIN + width * f for f in (0.2, 0.5, 0.82)]
+    for x, (title, lines) in zip(xs, path):
+        ops += _box(x, vent_y, 120, [title] + lines)[0]
+    ops += _arrow(oil_x, bottoms[-1], xs[0] + 20, vent_y, dashed=True)
+    ops += _text_op((oil_x + xs[0]) / 2 + 26, (bottoms[-1] + vent_y) / 2, "vent1", 8)
+    if qty:
+        ops += _arrow(centres[0], water_bottom, xs[0] - 20, vent_y, dashed=True)
+        ops += _text_op((centres[0] + xs[0]) / 2 - 34, (water_bottom + vent_y) / 2, "vent2", 8)
+    for (x1, x2), header in zip(((xs[0], xs[1]), (xs[1], xs[2])), ("flare", "flare1")):
+        ops += _arrow(x1 + 60, vent_y - 10, x2 - 60, vent_y - 10, dashed=True)
+        ops += _text_op((x1 + x2) / 2, vent_y - 4, header, 8, align="center")
+
+    # Legend: each header's 3" NPS length and capacity.
+    y = vent_y - 90
+    ops += _text_op(MARGIN, y, "Vent Headers", 10, bold=True)
+    for header in engine.HEADERS:
+        if header == "vent2" and not qty:
+            continue
+        y -= 13
+        total_nps, capacity = headers[header]
+        ops += _text_op(MARGIN + 8, y, f"{header}  {HEADER_TITLES[header]}", 9)
+        ops += _text_op(MARGIN + 260, y, f'{total_nps:.2f} ft of 3" NPS', 9, align="right")
+        ops += _text_op(PAGE_W - MARGIN, y, f"capacity {capacity:.5f} MMSCFD/SQRT(psi)", 9, align="right")
+    return ops
+
+
+class PdfTemplate:
+    """The PDF's fixed objects and page streams, compiled once."""
+
+    FONTS = (b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+             b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+
+    def __init__(self):
+        self.pages = [_summary_page(), _breakdown_page(), _pfd_page()]
+        n = len(self.pages)
+        # Objects: 1 catalog, 2 page tree, 3-4 fonts, then (page, content) per page.
+        page_ids = [5 + 2 * i for i in range(n)]
+        self.fixed = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % p for p in page_ids), n),
+            *self.FONTS,
+        ]
+        self.page_objects = [
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R /F2 4 0 R >> >>"
+            b" /Contents %d 0 R >>" % (PAGE_W, PAGE_H, p + 1) for p in page_ids]
+
+    def render(self, values, pfd_extra):
+        streams = [page.render(values, pfd_extra if i == len(self.pages) - 1 else b"")
+                   for i, page in enumerate(self.pages)]
+        objects = list(self.fixed)
+        for page, stream in zip(self.page_objects, streams):
+            objects += [page, b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream) + 1, stream)]
+        out = io.BytesIO()
+        out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(out.tell())
+            out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = out.tell()
+        out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        out.write(b"".join(b"%010d 00000 n \n" % offset for offset in offsets))
+        out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+        return out.getvalue()
+
+
+# -----------------------------
+# XLSX
+# -----------------------------
+_XLSX_STATIC = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '{sheets}</Types>'),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+        'officeDocument" Target="xl/workbook.xml"/></Relationships>'),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>{sheets}</sheets>'
+        '</workbook>'),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{sheets}'
+        '<Relationship Id="rIdStyles" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+        'styles" Target="styles.xml"/></Relationships>'),
+    # Style 0 plain, 1 bold, 2 "0.00000", 3 "0.00".
+    "xl/styles.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<numFmts count="2"><numFmt numFmtId="164" formatCode="0.00000"/><numFmt numFmtId="165" formatCode="0.00"/>'
+        '</numFmts><fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/>'
+        '</fill></fills><borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+        '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles></styleSheet>'),
+}
+SHEET_XML = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+             '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+             '<cols><col min="1" max="1" width="48" customWidth="1"/><col min="2" max="8" width="22" customWidth="1"/>'
+             '</cols><sheetData>{rows}</sheetData></worksheet>')
+_STYLE = {"{:.5f}": 2, "{:.2f}": 3, "{:.3f}": 2, "{:.1f}": 3}
+
+
+def _column(i):
+    return chr(ord("A") + i)
+
+
+def _text_cell(ref, text, bold=False):
+    style = ' s="1"' if bold else ""
+    return f'<c r="{ref}" t="inlineStr"{style}><is><t xml:space="preserve">{escape(str(text))}</t></is></c>'
+
+
+def _value_cell(ref, value, style=0):
+    if isinstance(value, str):
+        return _text_cell(ref, value)
+    if value is None or not np.isfinite(value):
+        return ""
+    return f'<c r="{ref}" s="{style}"><v>{float(value)!r}</v></c>'
+
+
+class _Sheet:
+    """Sheet rows with value slots: a list of XML strings and ``(ref, name, style)`` slots."""
+
+    def __init__(self, name):
+        self.name = name
+        self.parts = []
+        self.row = 0
+
+    def add(self, *cells):
+        """Append a row; each cell is text, ``("bold", text)`` or ``("slot", name, style)``."""
+        self.row += 1
+        xml = [f'<row r="{self.row}">']
+        for i, cell in enumerate(cells):
+            ref = f"{_column(i)}{self.row}"
+            if isinstance(cell, tuple) and cell[0] == "slot":
+                self.parts.append("".join(xml))
+                self.parts.append((ref, cell[1], cell[2]))
+                xml = []
+            elif isinstance(cell, tuple):
+                xml.append(_text_cell(ref, cell[1], bold=True))
+            elif cell is not None:
+                xml.append(_text_cell(ref, cell))
+        xml.append("</row>")
+        self.parts.append("".join(xml))
+
+    def compile(self):
+        # Adjacent static strings merged; the sheet wrapper split around the rows.
+        head, tail = SHEET_XML.split("{rows}")
+        merged = [head]
+        for part in self.parts + [tail]:
+            if isinstance(part, str) and isinstance(merged[-1], str):
+                merged[-1] += part
+            else:
+                merged.append(part)
+        self.parts = [part.encode() if isinstance(part, str) else part for part in merged]
+
+    def render(self, values, extra_rows=""):
+        parts = [part if isinstance(part, bytes) else _value_cell(part[0], values[part[1]], part[2]).encode()
+                 for part in self.parts]
+        if extra_rows:
+            parts.insert(-1, extra_rows.encode())
+        return b"".join(parts)
+
+
+class XlsxTemplate:
+    """The workbook's package parts and sheet rows, compiled once."""
+
+    def __init__(self):
+        summary = _Sheet("Summary")
+        summary.add(("bold", "Closed Vent System Assessment"), ("slot", "site_id", 0))
+        for title, rows in SUMMARY:
+            summary.add()
+            summary.add(("bold", title))
+            for label, name, fmt in rows:
+                summary.add(label, ("slot", name, _STYLE.get(fmt, 0)))
+        breakdown = _Sheet("Header Breakdown")
+        for h, title in HEADER_TITLES.items():
+            breakdown.add(("bold", title))
+            breakdown.add(("bold", "Pipe Size"), *[("bold", label) for label, _ in BREAKDOWN_COLUMNS])
+            for i, size in enumerate(engine.PIPE_LABELS):
+                breakdown.add(size, *[("slot", f"{h}.{field}.{i}", 3) for _, field in BREAKDOWN_COLUMNS])
+            breakdown.add(("bold", "Total"), *[("slot", f"{h}.{field}.total", 3) for _, field in BREAKDOWN_COLUMNS])
+            breakdown.add()
+        self.pfd_name = "PFD"
+        self.sheets = [summary, breakdown]
+        for sheet in self.sheets:
+            sheet.compile()
+        names = [sheet.name for sheet in self.sheets] + [self.pfd_name]
+        self.static = {
+            "[Content_Types].xml": _XLSX_STATIC["[Content_Types].xml"].format(sheets="".join(
+                f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="application/'
+                f'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>' for i in range(1, len(names) + 1))),
+            "_rels/.rels": _XLSX_STATIC["_rels/.rels"],
+            "xl/workbook.xml": _XLSX_STATIC["xl/workbook.xml"].format(sheets="".join(
+                f'<sheet name="{escape(name)}" sheetId="{i}" r:id="rId{i}"/>' for i, name in enumerate(names, 1))),
+            "xl/_rels/workbook.xml.rels": _XLSX_STATIC["xl/_rels/workbook.xml.rels"].format(sheets="".join(
+                f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                f'relationships/worksheet" Target="worksheets/sheet{i}.xml"/>' for i in range(1, len(names) + 1))),
+            "xl/styles.xml": _XLSX_STATIC["xl/styles.xml"],
+        }
+        self.static = {name: text.encode() for name, text in self.static.items()}
+
+    def render(self, values, facility):
+        counts, pressures, tanks, headers, device = facility
+        diagram, _ = pfd.diagram(counts, pressures, tanks, headers, device)
+        pfd_sheet = _Sheet(self.pfd_name)
+        pfd_sheet.add(("bold", "Unit"), ("bold", "Count"), ("bold", "Max Operating Pressure (psig)"))
+        for key, _, group, _ in pfd.STAGES:
+            pfd_sheet.add(group, ("slot", f"count.{key}", 0), ("slot", f"psig.{key}", 3))
+        pfd_sheet.add()
+        pfd_sheet.add(("bold", "Mermaid (paste into any Mermaid renderer)"))
+        for line in diagram.splitlines():
+            pfd_sheet.add(line)
+        pfd_sheet.compile()
+        pfd_values = {**{f"count.{k}": counts[k] for k in counts}, **{f"psig.{k}": pressures[k] for k in pressures}}
+
+        out = io.BytesIO()
+        with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+            for name, data in self.static.items():
+                z.writestr(name, data)
+            for i, sheet in enumerate(self.sheets, start=1):
+                z.writestr(f"xl/worksheets/sheet{i}.xml", sheet.render(values))
+            z.writestr(f"xl/worksheets/sheet{len(self.sheets) + 1}.xml", pfd_sheet.render(pfd_values))
+        return out.getvalue()
+
+
+@functools.lru_cache(maxsize=None)
+def template(fmt):
+    """The compiled template for ``fmt`` (once per process)."""
+    return {"pdf": PdfTemplate, "xlsx": XlsxTemplate}[fmt]()
+
+
+def _slot_values(site_id, values, breakdown):
+    slots = {"site_id": site_id, **values}
+    for h, fields in breakdown.items():
+        for field, array in fields.items():
+            slots.update({f"{h}.{field}.{i}": float(v) for i, v in enumerate(array)})
+            slots[f"{h}.{field}.total"] = float(np.sum(array))
+    return slots
+
+
+def render(inputs, headers, ui, fmt="pdf", site_id=""):
+    """One report as bytes, in ``fmt`` (``pdf`` or ``xlsx``)."""
+    values, breakdown, facility = report_values(inputs, headers, ui)
+    slots = _slot_values(site_id, values, breakdown)
+    if fmt == "pdf":
+        return template("pdf").render(slots, pfd_ops(*facility))
+    return template("xlsx").render(slots, facility)
+
+
+def site_id(path):
+    return os.path.basename(path)[:-len(projects.SUFFIX)] if path.endswith(projects.SUFFIX) else \
+        os.path.splitext(os.path.basename(path))[0]
+
+
+def render_project(path, output_dir, formats=FORMATS):
+    """Write a project's reports; returns ``(path, written paths, error)``."""
+    try:
+        inputs, headers, ui = projects.load(path)
+        written = []
+        for fmt in formats:
+            out = os.path.join(output_dir, f"{site_id(path)}.{fmt}")
+            with open(out, "wb") as f:
+                f.write(render(inputs, headers, ui, fmt, site_id(path)))
+            written.append(out)
+    except (OSError, projects.ProjectError, ValueError, KeyError) as exc:
+        return path, [], f"{type(exc).__name__}: {exc}"
+    return path, written, None
+
+
+def run(input_path, output_dir, formats=FORMATS, workers=None, progress=None):
+    """Render reports for every project at ``input_path``; returns ``(reports, errors)``."""
+    paths = projects.project_paths(input_path)
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    args = (paths, [output_dir] * len(paths), [tuple(formats)] * len(paths))
+    done, errors = 0, []
+    start = time.perf_counter()
+    pool = None
+    if workers == 1 or len(paths) < 2:
+        results = map(render_project, *args)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(render_project, *args, chunksize=16)
+    try:
+        for path, written, error in results:
+            done += len(written)
+            if error:
+                errors.append((path, error))
+            if progress:
+                progress(done, len(paths) * len(formats), time.perf_counter() - start)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return done, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render site reports (PDF/XLSX) from project files.")
+    parser.add_argument("input", help="project file, or directory of *.cvs.json projects")
+    parser.add_argument("output", help="directory to write <site_id>.pdf / .xlsx into")
+    parser.add_argument("--format", default=",".join(FORMATS), help="comma-separated: pdf, xlsx (default: both)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+    formats = [fmt for fmt in args.format.split(",") if fmt]
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        parser.error(f"unknown format(s): {', '.join(sorted(unknown))}")
+
+    def progress(done, total, elapsed):
+        rate = done / elapsed if elapsed else 0.0
+        print(f"\r{done:,}/{total:,} reports  {rate:,.0f}/s", end="", file=sys.stderr, flush=True)
+
+    done, errors = run(args.input, args.output, formats, args.workers, progress)
+    for path, error in errors:
+        print(f"\n{path}: {error}", end="", file=sys.stderr)
+    print(f"\n{done:,} reports written to {args.output}, {len(errors):,} projects failed", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""SCADA history check: rolling PPIVFR against vent capacity.
+
+Reads minute- or hour-level oil/water production and separator pressure
+histories (CSV or Parquet) a chunk at a time, turns them into a rolling
+PPIVFR series with the Tab 2 flash formulas, and counts how often and for
+how long it exceeds the vent capacity at design pressure. Only the rolling
+window's tail and a handful of counters are carried between chunks, so
+peak memory does not depend on file length.
+
+    python scada.py history.parquet --capacity 0.299 --design-pressure 5.4 --window 60min
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import batch
+import engine
+
+DEFAULT_COLUMNS = {
+    "timestamp": "timestamp",
+    "oil_rate": "oil_rate",  # bbl/day
+    "water_rate": "water_rate",  # bbl/day
+    "oil_pressure": "separator_pressure",  # psig, last stage
+}
+CHUNK_SIZE = 500_000
+
+
+class ExceedanceCounter:
+    """Running tally of threshold exceedances across chunks (durations in ns)."""
+
+    def __init__(self):
+        self.samples = 0
+        self.exceed_samples = 0
+        self.events = 0
+        self.exceed_ns = 0
+        self.longest_ns = 0
+        self.peak_ppivfr = 0.0
+        self.peak_time = None
+        self._in_event = False
+        self._event_ns = 0
+
+    def update(self, exceed, durations_ns, ppivfr, times):
+        if not len(exceed):
+            return
+        self.samples += len(exceed)
+        self.exceed_samples += int(exceed.sum())
+        self.exceed_ns += int(durations_ns[exceed].sum())
+        i = int(np.argmax(ppivfr))
+        if ppivfr[i] > self.peak_ppivfr:
+            self.peak_ppivfr, self.peak_time = float(ppivfr[i]), pd.Timestamp(times[i])
+
+        # Events are runs of consecutive exceeding samples. Run 0 is the one
+        # (if any) still open from the previous chunk.
+        starts = exceed & ~np.concatenate([[self._in_event], exceed[:-1]])
+        self.events += int(starts.sum())
+        run_id = np.cumsum(starts)
+        run_ns = np.bincount(run_id[exceed], weights=durations_ns[exceed], minlength=run_id[-1] + 1)
+        run_ns[0] += self._event_ns if self._in_event else 0
+        self.longest_ns = max(self.longest_ns, int(run_ns.max()))
+        self._in_event = bool(exceed[-1])
+        self._event_ns = int(run_ns[-1]) if self._in_event else 0
+
+    def summary(self):
+        return {
+            "samples": self.samples,
+            "exceed_samples": self.exceed_samples,
+            "exceed_fraction": self.exceed_samples / self.samples if self.samples else 0.0,
+            "events": self.events,
+            "exceed_duration": pd.Timedelta(self.exceed_ns, unit="ns"),
+            "longest_event": pd.Timedelta(self.longest_ns, unit="ns"),
+            "peak_ppivfr": self.peak_ppivfr,
+            "peak_time": self.peak_time,
+        }
+
+
+def ppivfr_series(df, columns=DEFAULT_COLUMNS, promax=None, other_ppivfr=0.0):
+    """Instantaneous PPIVFR (MMSCFD) for each row; no surge factor, the data is the surge."""
+    promax = promax or {}
+    oil_flash = engine.oil_flash_working(df[columns["oil_pressure"]].to_numpy(dtype=float),
+                                         promax.get("promax_flash", np.nan), promax.get("promax_mw", np.nan))
+    water_flash = engine.water_flash_working(promax.get("promax_water_flash", np.nan),
+                                             promax.get("promax_water_mw", np.nan))
+    oil = engine.stream_ppivfr(oil_flash, df[columns["oil_rate"]].to_numpy(dtype=float), 0.0)
+    water = engine.stream_ppivfr(water_flash, df[columns["water_rate"]].to_numpy(dtype=float), 0.0)
+    return np.nan_to_num(oil) + np.nan_to_num(water) + other_ppivfr
+
+
+def check_history(source, capacity, design_pressure, window="60min", columns=DEFAULT_COLUMNS,
+                  promax=None, other_ppivfr=0.0, chunksize=CHUNK_SIZE, resample="1h"):
+    """Stream a history file and compare its rolling PPIVFR with capacity.
+
+    ``capacity`` is MMSCFD/SQRT(psi) (e.g. Flare1 reduced capacity) and
+    ``design_pressure`` osig. The rows must be in time order. Returns
+    ``(summary, profile)`` where ``profile`` is the rolling PPIVFR maximum
+    per ``resample`` period, small enough to plot for any file length.
+    """
+    threshold = float(engine.flow_capacity(capacity, design_pressure))
+    window = pd.Timedelta(window)
+    counter = ExceedanceCounter()
+    profiles = []
+    tail = None
+    last_time = None
+    usecols = list(dict.fromkeys(columns.values()))
+
+    for chunk in batch.iter_chunks(source, chunksize, usecols):
+        chunk = chunk.rename(columns={v: k for k, v in columns.items()})
+        chunk["timestamp"] = pd.to_datetime(chunk["timestamp"])
+        chunk["ppivfr"] = ppivfr_series(chunk, {k: k for k in columns}, promax, other_ppivfr)
+        n_new = len(chunk)
+
+        # Prepend the previous chunk's last window so the rolling mean is continuous.
+        frame = chunk[["timestamp", "ppivfr"]] if tail is None else pd.concat([tail, chunk[["timestamp", "ppivfr"]]])
+        rolling = frame.rolling(window, on="timestamp")["ppivfr"].mean().to_numpy()[-n_new:]
+        tail = frame[frame["timestamp"] > frame["timestamp"].iloc[-1] - window]
+
+        # Each sample lasts from the previous timestamp to its own.
+        times = chunk["timestamp"].to_numpy()
+        previous = np.concatenate([[last_time if last_time is not None else times[0]], times[:-1]])
+        durations_ns = (times - previous).astype("timedelta64[ns]").astype(np.int64)
+        last_time = times[-1]
+
+        counter.update(rolling > threshold, durations_ns, rolling, times)
+        profiles.append(pd.Series(rolling, index=chunk["timestamp"]).resample(resample).max())
+
+    summary = counter.summary()
+    summary["threshold"] = threshold
+    profile = pd.concat(profiles).groupby(level=0).max() if profiles else pd.Series(dtype=float)
+    return summary, profile.rename("Rolling PPIVFR (mmscfd)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check a SCADA history's rolling PPIVFR against vent capacity.")
+    parser.add_argument("history", help="CSV or Parquet with timestamp, oil/water rate (bbl/day) and separator pressure")
+    parser.add_argument("--capacity", type=float, required=True, help="vent capacity, MMSCFD/SQRT(psi)")
+    parser.add_argument("--design-pressure", type=float, required=True, help="design pressure, osig")
+    parser.add_argument("--window", default="60min", help="rolling window (default: 60min)")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    for name, default in DEFAULT_COLUMNS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}-column", dest=name, default=default)
+    args = parser.parse_args(argv)
+
+    columns = {name: getattr(args, name) for name in DEFAULT_COLUMNS}
+    summary, _ = check_history(args.history, args.capacity, args.design_pressure, args.window,
+                               columns, chunksize=args.chunksize)
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
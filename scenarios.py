@@ -0,0 +1,169 @@
+"""Named MOC scenarios: changes to a base input set, compared side by side.
+
+    python scenarios.py site.cvs.json
+
+A scenario is a name plus the inputs it changes, using the batch site-table
+names (``engine.SITE_DEFAULTS`` and flattened header cells). For example,
+"add two 500 bbl tanks and swap the 2" globe valve for a ball valve" is::
+
+    {"oil_tank_qty": 9, "flare1_globe_valve_2in": 0, "flare1_ball_valve_2in": 1}
+
+Only the deltas are stored, in the project file (see ``projects.py``), so a
+scenario follows later edits to the base. The base graph is computed once.
+Each scenario recomputes only the nodes downstream of its deltas; a valve
+swap re-sums one header and the Flare1 capacity and reuses the PPIVFR and
+the other headers. A node that several scenarios change is computed once
+for all of them, stacked (``depgraph.Graph.evaluate_variants``), so
+comparing twenty scenarios costs about as much as computing one.
+"""
+import argparse
+import math
+import sys
+
+import numpy as np
+import pandas as pd
+
+import depgraph
+import engine
+import projects
+
+HEADER_CELLS = {column: (header, index) for header in engine.HEADERS
+                for index, column in enumerate(engine.header_columns(header))}
+INPUT_NAMES = [*engine.SITE_DEFAULTS, *HEADER_CELLS]
+TABLE_COLUMNS = ["Scenario", "Input", "Value"]
+COMPARE = {
+    "oil_ppivfr": "Oil PPIVFR (mmscfd)",
+    "water_ppivfr": "Water PPIVFR (mmscfd)",
+    "other_ppivfr": "Other PPIVFR (mmscfd)",
+    "total_ppivfr": "Total PPIVFR (mmscfd)",
+    "total_thermal_ppivfr": "Total Thermal PPIVFR (mmscfd)",
+    **{f"{header}_total_nps": f"{header} Total Length (ft) of 3\" NPS" for header in engine.HEADERS},
+    "design_pressure": "Design Pressure (osig)",
+    "flare1_red_capacity": "Flare1 Red. Capacity MMSCFD/SQRT(psig)",
+    "capacity_margin": "Capacity Margin (mmscfd)",
+}
+
+
+BASE = "Base"
+DELTA_SUFFIX = " Δ"
+
+
+class ScenarioError(ValueError):
+    """A scenario that names an unknown input, gives a value that isn't a number, or can't be a column name."""
+
+
+def check_name(name):
+    """``name``, if it can't collide with ``compare``'s ``Base`` and ``<name> Δ`` columns."""
+    if name == BASE or name.endswith(DELTA_SUFFIX):
+        raise ScenarioError(f"{name!r} can't be a scenario name: {BASE!r} and names ending in "
+                            f"{DELTA_SUFFIX.strip()!r} are comparison columns")
+    return name
+
+
+def validate(deltas):
+    """``deltas`` with known names and numeric values (``None`` is NaN, a header cell's is 0)."""
+    checked = {}
+    for name, value in deltas.items():
+        if name not in HEADER_CELLS and name not in engine.SITE_DEFAULTS:
+            raise ScenarioError(f"unknown input {name!r}")
+        try:
+            value = math.nan if value is None else float(value)
+        except (TypeError, ValueError):
+            raise ScenarioError(f"{name}: expected a number, got {value!r}") from None
+        if name in HEADER_CELLS:
+            checked[name] = 0.0 if math.isnan(value) else value
+        elif isinstance(engine.SITE_DEFAULTS[name], (bool, int)) and not math.isnan(value):
+            checked[name] = type(engine.SITE_DEFAULTS[name])(value)
+        else:
+            checked[name] = value
+    return checked
+
+
+def table(named):
+    """Scenarios as one ``Scenario``/``Input``/``Value`` row per changed input (the app's editor)."""
+    rows = [(name, input_name, value) for name, deltas in named.items() for input_name, value in deltas.items()]
+    return pd.DataFrame(rows, columns=TABLE_COLUMNS).astype({"Value": float})
+
+
+def from_table(frame):
+    """Scenarios from ``table`` rows, in first-seen order; rows without a name or input are skipped."""
+    named = {}
+    for name, input_name, value in frame[TABLE_COLUMNS].itertuples(index=False):
+        if isinstance(name, str) and name.strip() and isinstance(input_name, str) and input_name:
+            named.setdefault(name.strip(), {})[input_name] = None if pd.isna(value) else float(value)
+    return named
+
+
+def graph_inputs(graph, deltas):
+    """``Graph.set`` arguments that apply validated ``deltas`` on top of ``graph``'s inputs."""
+    values = {}
+    for name, value in deltas.items():
+        if name not in HEADER_CELLS:
+            values[name] = value
+            continue
+        header, index = HEADER_CELLS[name]
+        key = f"header_{header}"
+        if key not in values:
+            values[key] = np.array(graph[key], dtype=float)  # a copy: the base grid is shared
+        values[key].flat[index] = value
+    return values
+
+
+def base_graph(inputs, headers):
+    """A site graph for a project's inputs and header arrays."""
+    graph = depgraph.site_graph()
+    graph.set(**{name: inputs[name] for name in engine.SITE_DEFAULTS},
+              **{f"header_{header}": grid for header, grid in headers.items()})
+    return graph
+
+
+def compare(base, scenarios, nodes=COMPARE):
+    """Side-by-side ``nodes`` for the base graph and each named scenario.
+
+    Returns ``(frame, recomputed)``. The frame has one row per node (labelled
+    from ``nodes``), a ``Base`` column, and for each scenario its values and
+    ``<name> Δ``, the change from the base. ``recomputed`` maps each scenario
+    to the nodes it had to recompute.
+    """
+    names = list(nodes)
+    for name in scenarios:
+        check_name(name)
+    variants = [graph_inputs(base, validate(deltas)) for deltas in scenarios.values()]
+    values, recomputed = base.evaluate_variants(variants, names)
+    base_values = np.array(base.get(*names), dtype=float)
+    scenario_values = np.array(values, dtype=float).reshape(len(values), len(names))
+    blocks = np.empty((len(names), 1 + 2 * len(values)))
+    blocks[:, 0] = base_values
+    blocks[:, 1::2] = scenario_values.T
+    blocks[:, 2::2] = scenario_values.T - base_values[:, None]
+    columns = [BASE] + [column for name in scenarios for column in (name, f"{name}{DELTA_SUFFIX}")]
+    frame = pd.DataFrame(blocks, index=[nodes[node] for node in names], columns=columns)
+    return frame, dict(zip(scenarios, recomputed))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare a project's scenarios with its base inputs.")
+    parser.add_argument("project", help="project file (*.cvs.json)")
+    parser.add_argument("--csv", help="also write the comparison to this CSV file")
+    args = parser.parse_args(argv)
+
+    with open(args.project, "rb") as f:
+        text = f.read()
+    inputs, headers, _ = projects.loads(text)
+    scenarios = projects.loads_scenarios(text)
+    if not scenarios:
+        sys.exit(f"{args.project} has no scenarios.")
+    try:
+        frame, recomputed = compare(base_graph(inputs, headers), scenarios)
+    except ScenarioError as exc:
+        sys.exit(str(exc))
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(frame.to_string(float_format=lambda value: f"{value:.5f}"))
+    for name, nodes in recomputed.items():
+        print(f"{name}: recomputed {len(nodes)} of {len(depgraph.SITE_NODES)} nodes", file=sys.stderr)
+    if args.csv:
+        frame.to_csv(args.csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Content-addressed cache for calculation stages, shared by sessions and processes.
+
+    total_pipe = stagecache.cached("header_total_pipe")(total_pipe)
+
+A stage's result is stored under a SHA-256 of the stage name, the code that
+computes it and a canonical encoding of its arguments (numbers as float64,
+so ``7`` and ``7.0`` or an int and a float grid hash the same; object arrays
+item by item). Hashing and a lookup cost tens of microseconds, so only
+stages that do real array work are worth caching. Lookups try
+a process-wide in-memory LRU first, so every session on a server shares it,
+then a SQLite file in ``CVS_CACHE_DIR`` that every process on the machine
+shares. The file is kept under ``CVS_CACHE_MAX_BYTES`` by evicting the least
+recently used entries. Hits and misses are counted per stage, both for this
+process and (in the file) across all of them.
+
+``CVS_CACHE=0`` turns caching off, ``CVS_CACHE=memory`` keeps only the
+in-process tier. A disk error switches the disk tier off for the rest of
+the process; the cache never fails a calculation.
+"""
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import sqlite3
+import struct
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+import engine
+
+MODE = os.environ.get("CVS_CACHE", "disk").lower()
+ENABLED = MODE not in ("0", "off", "false")
+CACHE_DIR = os.environ.get("CVS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "cvs"))
+MAX_BYTES = int(os.environ.get("CVS_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+MEMORY_ENTRIES = int(os.environ.get("CVS_CACHE_MEMORY_ENTRIES", 4096))
+EVICT_TO = 0.8  # evict down to this fraction of MAX_BYTES
+EVICT_EVERY = 64  # puts between size checks (or sooner after large puts)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    stage TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+CREATE TABLE IF NOT EXISTS stats (
+    stage TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def _encode(value, h):
+    """Feed a canonical encoding of ``value`` to hash ``h``."""
+    if isinstance(value, (bool, int, float, np.number, np.bool_)):
+        value = float(value)
+        h.update(b"f" + struct.pack("<d", np.nan if value != value else value + 0.0))  # one NaN, no -0.0
+    elif isinstance(value, np.ndarray) and value.dtype.hasobject:
+        # tobytes() of an object array is its pointers; encode the items instead.
+        h.update(f"o{value.shape}".encode())
+        for item in value.ravel():
+            _encode(item, h)
+    elif isinstance(value, np.ndarray):
+        if value.dtype.kind in "biuf":
+            value = np.ascontiguousarray(value, dtype=np.float64) + 0.0
+            value[np.isnan(value)] = np.nan
+        h.update(f"a{value.dtype.str}{value.shape}".encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, str):
+        data = value.encode()
+        h.update(b"s" + struct.pack("<q", len(data)) + data)
+    elif value is None:
+        h.update(b"n")
+    elif isinstance(value, (list, tuple)):
+        h.update(b"l" + struct.pack("<q", len(value)))
+        for item in value:
+            _encode(item, h)
+    elif isinstance(value, dict):
+        h.update(b"d" + struct.pack("<q", len(value)))
+        for name in sorted(value):
+            _encode(str(name), h)
+            _encode(value[name], h)
+    else:
+        raise TypeError(f"can't hash {type(value).__name__} for the stage cache")
+
+
+def code_version(fn):
+    """Digest of ``fn``'s source and the engine module, so formula changes miss."""
+    h = hashlib.sha256()
+    try:
+        h.update(inspect.getsource(fn).encode())
+    except (OSError, TypeError):
+        h.update(fn.__qualname__.encode())
+    with open(engine.__file__, "rb") as f:
+        h.update(f.read())
+    return h.hexdigest()
+
+
+def cache_key(stage, version, args, kwargs):
+    h = hashlib.sha256()
+    _encode(stage, h)
+    _encode(version, h)
+    _encode(list(args), h)
+    _encode(kwargs, h)
+    return h.hexdigest()
+
+
+def _frozen(value):
+    """A result with its arrays read-only (sessions share one object); views are copied first."""
+    if isinstance(value, np.ndarray):
+        value = value.copy() if value.base is not None else value
+        value.setflags(write=False)
+    elif isinstance(value, tuple):
+        value = tuple(_frozen(item) for item in value)
+    return value
+
+
+class StageCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES, memory_entries=MEMORY_ENTRIES,
+                 disk=MODE != "memory"):
+        self.path = os.path.join(directory, "stagecache.sqlite") if disk else None
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._puts = 0
+        self._bytes_since_check = 0
+        self.counts = Counter()  # (stage, "memory_hits" | "disk_hits" | "misses") -> n, this process
+
+    # -- disk tier --------------------------------------------------------
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None and self.path is not None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(SCHEMA)
+            self._local.db = db
+        return db
+
+    def _disk(self, action, *args):
+        """Run a disk action; on any disk error stop using the disk tier."""
+        if self.path is None:
+            return None
+        try:
+            return action(self._db(), *args)
+        except (sqlite3.Error, OSError, pickle.PickleError):
+            self.path = None
+            return None
+
+    @staticmethod
+    def _disk_get(db, key, stage):
+        row = db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        column = "misses" if row is None else "hits"
+        db.execute(f"INSERT INTO stats (stage, {column}) VALUES (?, 1) "
+                   f"ON CONFLICT (stage) DO UPDATE SET {column} = {column} + 1", (stage,))
+        if row is None:
+            return None
+        db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        return (pickle.loads(row[0]),)
+
+    def _disk_put(self, db, key, stage, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                   (key, stage, blob, len(blob), time.time()))
+        self._puts += 1
+        self._bytes_since_check += len(blob)
+        if self._puts % EVICT_EVERY == 0 or self._bytes_since_check > (1 - EVICT_TO) * self.max_bytes:
+            self._bytes_since_check = 0
+            self._evict(db)
+
+    def _evict(self, db):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - EVICT_TO * self.max_bytes
+        doomed = []
+        for key, size in db.execute("SELECT key, size FROM entries ORDER BY last_access"):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        db.executemany("DELETE FROM entries WHERE key = ?", doomed)
+
+    # -- lookups ----------------------------------------------------------
+    def get_or_compute(self, stage, key, compute):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.counts[stage, "memory_hits"] += 1
+                return self._memory[key]
+        found = self._disk(self._disk_get, key, stage)
+        if found is not None:
+            value = _frozen(found[0])
+            self.counts[stage, "disk_hits"] += 1
+        else:
+            value = _frozen(compute())
+            self.counts[stage, "misses"] += 1
+            self._disk(self._disk_put, key, stage, value)
+        with self._lock:
+            self._memory[key] = value
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+        return value
+
+    def stats(self):
+        """Per-stage counters: this process's hits by tier and misses, and the shared file's totals."""
+        stages = {}
+        for (stage, kind), n in self.counts.items():
+            stages.setdefault(stage, {})[kind] = n
+        shared = self._disk(lambda db: db.execute("SELECT stage, hits, misses FROM stats").fetchall()) or []
+        for stage, hits, misses in shared:
+            stages.setdefault(stage, {}).update(shared_hits=hits, shared_misses=misses)
+        return stages
+
+    def disk_usage(self):
+        """``(entries, bytes)`` in the shared file."""
+        return self._disk(lambda db: db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()) \
+            or (0, 0)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        self.counts.clear()
+        self._disk(lambda db: db.executescript("DELETE FROM entries; DELETE FROM stats;"))
+
+
+_cache = None
+
+
+def shared():
+    """The process-wide cache (created on first use)."""
+    global _cache
+    if _cache is None:
+        _cache = StageCache()
+    return _cache
+
+
+def cached(stage):
+    """Decorator caching a stage function by its arguments (a no-op when caching is off)."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        version = code_version(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = cache_key(stage, version, args, kwargs)
+            return shared().get_or_compute(stage, key, lambda: fn(*args, **kwargs))
+        return wrapper
+    return decorate
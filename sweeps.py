@@ -0,0 +1,49 @@
+"""What-if sensitivity sweeps.
+
+Vary one or two inputs over a grid with everything else held fixed and
+return the capacity margin (capacity flow at design pressure minus total
+PPIVFR) for every grid point in a single broadcast pass through the engine.
+The vent path is the Flare1 control device plus its header, so the control
+device capacity and the Flare1 3" NPS length can be swept too.
+"""
+import numpy as np
+
+import engine
+
+SWEEP_INPUTS = {
+    "thief_prv_input": "Minimum Thief Hatch/PRV (osig)",
+    "leaking_safety": "Leaking Safety Factor (osig)",
+    "oil_production": "Oil Production (bbl/day)",
+    "oil_pressure": "Oil Pressure - Last Stage (psig)",
+    "surge_percent": "Surge Percent (%)",
+    "water_production": "Water Production (bbl/day)",
+    "water_surge_percent": "Surge Percent (Water) (%)",
+    "cd_capacity": "Flare Capacity MMSCFD/SQRT(psig), SG=1",
+    "flare1_total_nps": "Flare1 Total Length (ft) of 3\" NPS",
+}
+
+
+def margin(inputs):
+    """Capacity margin (MMSCFD) for inputs that may be broadcastable arrays."""
+    inputs = dict(inputs)
+    le_ft = engine.control_device_le(inputs.pop("cd_capacity", engine.SITE_DEFAULTS["cd_capacity"]))
+    inputs["nps_length"] = le_ft + np.asarray(inputs.pop("flare1_total_nps", 0.0))
+    total_ppivfr, capacity_flow = engine.ppivfr_and_capacity_flow(inputs)
+    return capacity_flow - total_ppivfr
+
+
+def margin_grid(fixed, x_name, x_values, y_name=None, y_values=None):
+    """Margin over a 1-D or 2-D grid.
+
+    Returns an array shaped ``(len(x_values),)`` or, when ``y_name`` is
+    given, ``(len(y_values), len(x_values))`` (rows follow y).
+    """
+    inputs = dict(fixed)
+    x_values = np.asarray(x_values, dtype=float)
+    if y_name is None:
+        inputs[x_name] = x_values
+        return np.broadcast_to(margin(inputs), x_values.shape)
+    y_values = np.asarray(y_values, dtype=float)
+    inputs[x_name] = x_values[None, :]
+    inputs[y_name] = y_values[:, None]
+    return np.broadcast_to(margin(inputs), (len(y_values), len(x_values)))
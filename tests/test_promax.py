@@ -0,0 +1,38 @@
+import math
+
+import pytest
+
+import promax
+
+MW_ROW = ["Flash Gas Molecular Weight", "32.5"]
+FLASH_ROW = ["Flash Gas Ratio", "45.2", "SCF/BBL"]
+
+
+@pytest.mark.parametrize("rows", [[MW_ROW, FLASH_ROW], [FLASH_ROW, MW_ROW]], ids=["mw-first", "flash-first"])
+def test_flash_gas_mw_is_not_read_as_flash(rows):
+    flash, mw, composition = promax.parse_rows(rows)
+    assert flash == 45.2
+    assert mw == 32.5
+    assert composition == {}
+
+
+def test_liquid_mw_is_ignored():
+    flash, mw, _ = promax.parse_rows([["Liquid Molecular Weight", "180"], FLASH_ROW])
+    assert flash == 45.2
+    assert math.isnan(mw)
+
+
+def test_failed_export_is_retried_only_when_it_changes(tmp_path):
+    exports = tmp_path / "exports"
+    exports.mkdir()
+    bad = exports / "1001.csv"
+    bad.write_text("Liquid Molecular Weight,180\n")
+    index = promax.PromaxIndex(exports, index_path=str(tmp_path / "index.sqlite"))
+
+    assert index.refresh(workers=1)["errors"] == 1
+    assert index.refresh(workers=1) == {"parsed": 0, "unchanged": 1, "removed": 0, "errors": 0}
+
+    bad.write_text("Flash Gas Ratio,45.2,SCF/BBL\n")
+    assert index.refresh(workers=1)["parsed"] == 1
+    assert index.errors() == []
+    assert index.lookup("1001")["oil"]["flash"] == 45.2
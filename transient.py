@@ -0,0 +1,245 @@
+"""Transient tank vapor-space pressure during separator dumps.
+
+The vapor space of a tank battery is treated as an isothermal ideal-gas
+volume: ``dP/dt = k (q_in - q_out)`` with ``k = 14.696 psi / V`` (SCF in,
+psi out). Inflow is the Main Process flash + working volume of the liquid
+arriving — oil only while the separator dumps, water continuously — and
+outflow is the vent capacity law ``q_out = C sqrt(P)`` while the control
+device is on. The device turns on at ``turn_on_oz`` and off at
+``turn_off_oz``; with a turn-on of 0 it is always on.
+
+With constant inflow and device state the ODE has a closed form, and
+pressure is monotone in between events (dump start/end, device on/off).
+So instead of stepping every second the simulator jumps each scenario from
+one event to the next, all scenarios at once as arrays, and computes time
+above the hatch setting exactly within each segment. ``dense_trace``
+evaluates the same solution on a 1-second grid for plotting.
+"""
+import numpy as np
+from scipy.special import lambertw
+
+import engine
+
+STANDARD_PRESSURE_PSIA = 14.696
+CUBIC_FT_PER_BBL = 5.615
+SECONDS_PER_DAY = 86_400
+# Longest device on/off pattern, in dumps, recognised as a periodic steady state.
+LIMIT_CYCLE_DUMPS = 4
+
+
+def _solve_y_plus_log_y(x):
+    """Solve ``y + ln(y) = x`` for ``y > 0`` (Newton, safe for large ``x``)."""
+    x = np.asarray(x, dtype=float)
+    y = np.where(x > 1, x - np.log(np.maximum(x, 1.0)), np.maximum(np.exp(np.minimum(x, 1.0)), 1e-300))
+    for _ in range(20):
+        y, previous = np.maximum(y - (y + np.log(y) - x) * y / (1 + y), 1e-300), y
+        if np.all(np.abs(y - previous) <= 1e-15 * y):
+            break
+    return y
+
+
+class DumpScenarios:
+    """Scenario parameters, broadcast to a common shape ``(n,)``.
+
+    Rates are bbl/day averaged over the day; oil arrives in dumps of
+    ``dump_seconds`` every ``dump_period_s``. Pressures are osig and
+    ``capacity`` is MMSCFD/SQRT(psi) of the vent path (e.g. Flare1 reduced
+    capacity).
+    """
+
+    def __init__(self, oil_production, water_production, capacity, thief_prv, turn_on_oz=0.0, turn_off_oz=0.0,
+                 dump_period_s=900.0, dump_seconds=60.0, tank_qty=7, tank_size=500, fill_fraction=0.5,
+                 oil_pressure=5.0, promax_flash=np.nan, promax_mw=np.nan,
+                 promax_water_flash=np.nan, promax_water_mw=np.nan):
+        values = np.broadcast_arrays(*[np.asarray(v, dtype=float) for v in (
+            oil_production, water_production, capacity, thief_prv, turn_on_oz, turn_off_oz,
+            dump_period_s, dump_seconds, tank_qty, tank_size, fill_fraction,
+            oil_pressure, promax_flash, promax_mw, promax_water_flash, promax_water_mw)])
+        (oil_production, water_production, capacity, thief_prv, turn_on_oz, turn_off_oz,
+         dump_period_s, dump_seconds, tank_qty, tank_size, fill_fraction,
+         oil_pressure, promax_flash, promax_mw, promax_water_flash, promax_water_mw) = (np.atleast_1d(v) for v in values)
+
+        oil_flash = engine.oil_flash_working(oil_pressure, promax_flash, promax_mw)
+        water_flash = engine.water_flash_working(promax_water_flash, promax_water_mw)
+        self.period = dump_period_s
+        self.dump = np.minimum(dump_seconds, dump_period_s)
+        # SCF/s of vapor: water steadily, oil concentrated into the dumps.
+        self.q_base = water_flash * water_production / SECONDS_PER_DAY
+        self.q_dump = self.q_base + oil_flash * oil_production * (self.period / self.dump) / SECONDS_PER_DAY
+        self.k = STANDARD_PRESSURE_PSIA / (tank_qty * tank_size * CUBIC_FT_PER_BBL * (1 - fill_fraction))
+        self.c = capacity * 1_000_000 / SECONDS_PER_DAY
+        self.hatch = thief_prv / 16
+        self.on_p = turn_on_oz / 16
+        self.off_p = np.minimum(turn_off_oz / 16, self.on_p)
+        self.always_on = turn_on_oz <= 0
+        self.n = len(self.k)
+
+
+def _time_to(p0, target, q, k, c, on):
+    """Time for pressure to go from ``p0`` to ``target`` psi in a segment (inf if never)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Device off: linear rise.
+        t_off = np.where((q > 0) & (target >= p0), (target - p0) / (k * q), np.inf)
+
+        # Device on: monotone approach to u_eq = q/c.
+        u0, u = np.sqrt(p0), np.sqrt(np.maximum(target, 0.0))
+        u_eq = q / c
+        between = ((u0 <= u) & (u < u_eq)) | ((u_eq < u) & (u <= u0))
+        t_log = (2 / (k * c)) * ((u0 - u) + u_eq * np.log((u_eq - u0) / (u_eq - u)))
+        t_lin = 2 * (u0 - u) / (k * c)
+        t_on = np.where(u_eq > 0, t_log, t_lin)
+        t_on = np.where(between | ((u_eq == 0) & (u <= u0)), np.maximum(t_on, 0.0), np.inf)
+    return np.where(on, t_on, t_off)
+
+
+def _advance(p0, dt, q, k, c, on):
+    """Pressure after ``dt`` seconds of a segment."""
+    p_off = p0 + k * q * dt
+
+    u0 = np.sqrt(p0)
+    safe_c = np.where(c > 0, c, 1.0)
+    u_eq = q / safe_c
+    tau = k * safe_c * dt / 2
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        r0 = np.where(u_eq > 0, (u_eq - u0) / u_eq, 0.0)
+        big_r = tau / u_eq + r0 - np.log(np.abs(r0))
+        r = np.zeros(np.shape(r0))
+        # Rising towards u_eq (r0 > 0): r = -W0(-e^-R).
+        rising = r0 > 0
+        if rising.any():
+            r[rising] = -lambertw(-np.exp(-big_r[rising])).real
+        # Falling towards u_eq (r0 < 0): r = -y with y + ln y = -R.
+        falling = r0 < 0
+        if falling.any():
+            r[falling] = -_solve_y_plus_log_y(-big_r[falling])
+        u_on = np.where(u_eq > 0, u_eq * (1 - r), np.maximum(u0 - tau, 0.0))
+    u_on = np.where(c > 0, u_on, np.sqrt(p_off))
+    return np.where(on, u_on ** 2, p_off)
+
+
+def simulate(scenarios, duration_s=SECONDS_PER_DAY, trace=(), rtol=1e-7):
+    """Simulate every scenario and return per-scenario results.
+
+    Once a scenario starts a dump cycle in the same state as the previous
+    one it has reached its periodic steady state, and the remaining whole
+    cycles are added in one go rather than re-simulated (``rtol`` is the
+    relative pressure match that counts as the same state).
+
+    Returns a dict of arrays: ``peak_osig``, ``seconds_above_hatch``,
+    ``seconds_device_on``, ``final_osig``, plus ``events`` (event steps
+    taken) and ``breakpoints`` — ``{i: (t, p_psi, on, q)}`` arrays for each
+    scenario index in ``trace``, for ``dense_trace``.
+    """
+    s = scenarios
+    n = s.n
+    t = np.zeros(n)
+    p = np.zeros(n)
+    on = s.always_on.copy()
+    cycle = np.zeros(n)
+    dumping = s.dump > 0
+    peak = np.zeros(n)
+    above = np.zeros(n)
+    device_on = np.zeros(n)
+    # State at the start of the last few dump cycles, by cycle number % LIMIT_CYCLE_DUMPS.
+    hist_p = np.full((LIMIT_CYCLE_DUMPS, n), -1.0)
+    hist_on = np.zeros((LIMIT_CYCLE_DUMPS, n), dtype=bool)
+    hist_above = np.zeros((LIMIT_CYCLE_DUMPS, n))
+    hist_device_on = np.zeros((LIMIT_CYCLE_DUMPS, n))
+    events = 0
+    points = {i: [(0.0, 0.0, bool(on[i]), float(s.q_dump[i] if dumping[i] else s.q_base[i]))] for i in trace}
+    cycle_points = {i: {} for i in trace}
+
+    active = np.flatnonzero(t < duration_s)
+    while len(active):
+        idx = active
+        ti, pi, oni, cyc, dmp = t[idx], p[idx], on[idx], cycle[idx], dumping[idx]
+        k, c, hatch, always_on = s.k[idx], s.c[idx], s.hatch[idx], s.always_on[idx]
+        q = np.where(dmp, s.q_dump[idx], s.q_base[idx])
+
+        # Next dump boundary, device switch, or end of simulation.
+        boundary = np.where(dmp, cyc * s.period[idx] + s.dump[idx], (cyc + 1) * s.period[idx])
+        switch_p = np.where(oni, s.off_p[idx], s.on_p[idx])
+        t_switch = np.where(always_on, np.inf, _time_to(pi, switch_p, q, k, c, oni))
+        # Off and already at/above turn-on (e.g. on_p == off_p): switch now.
+        t_switch = np.where(~oni & ~always_on & (pi >= s.on_p[idx]), 0.0, t_switch)
+        dt = np.maximum(np.minimum(np.minimum(boundary, duration_s) - ti, t_switch), 0.0)
+        switched = t_switch <= dt
+        p_end = switch_p.copy()
+        x = ~switched
+        if x.any():
+            p_end[x] = _advance(pi[x], dt[x], q[x], k[x], c[x], oni[x])
+
+        # Pressure is monotone within a segment, so its endpoints bound it.
+        peak[idx] = np.maximum(peak[idx], p_end)
+        start_above, end_above = pi >= hatch, p_end >= hatch
+        seg_above = np.where(start_above & end_above, dt, 0.0)
+        crossed = start_above != end_above
+        if crossed.any():
+            x = crossed
+            t_hatch = np.minimum(_time_to(pi[x], hatch[x], q[x], k[x], c[x], oni[x]), dt[x])
+            seg_above[x] = np.where(end_above[x], dt[x] - t_hatch, t_hatch)
+        above[idx] += seg_above
+        device_on[idx] += np.where(oni, dt, 0.0)
+
+        at_boundary = (ti + dt >= boundary) & ~switched
+        new_cycle = at_boundary & ~dmp
+        t[idx] = np.where(at_boundary, boundary, ti + dt)
+        p[idx] = p_end
+        on[idx] = oni ^ switched
+        cycle[idx] = cyc + new_cycle
+        dumping[idx] = dmp ^ at_boundary
+        events += 1
+
+        for i in trace:
+            if t[i] > points[i][-1][0] or on[i] != points[i][-1][2]:
+                points[i].append((float(t[i]), float(p[i]), bool(on[i]),
+                                  float(s.q_dump[i] if dumping[i] else s.q_base[i])))
+
+        # Periodic steady state: a cycle that starts in the same state as
+        # one ``j`` dumps ago repeats every ``j`` dumps from here on.
+        starts = idx[new_cycle]
+        if len(starts):
+            slots = cycle[starts].astype(int) % LIMIT_CYCLE_DUMPS
+            lag_slots = (slots - np.arange(1, LIMIT_CYCLE_DUMPS + 1)[:, None]) % LIMIT_CYCLE_DUMPS
+            past_p = hist_p[lag_slots, starts]
+            same = ((np.abs(p[starts] - past_p) <= rtol * np.maximum(p[starts], 1e-12))
+                    & (on[starts] == hist_on[lag_slots, starts]))
+            lag = np.argmax(same, axis=0)
+            repeat = same.any(axis=0)
+            rows, cols = lag[repeat], starts[repeat]
+            span = (rows + 1) * s.period[cols]
+            skip = np.floor((duration_s - t[cols]) / span)
+            for i in np.intersect1d(cols, list(trace)) if trace else ():
+                j = int(np.flatnonzero(cols == i)[0])
+                last = points[i][cycle_points[i][int(cycle[i]) - rows[j] - 1] + 1:]
+                points[i].extend((pt[0] + m * span[j], *pt[1:]) for m in range(1, int(skip[j]) + 1) for pt in last)
+            above[cols] += skip * (above[cols] - hist_above[lag_slots[rows, repeat], cols])
+            device_on[cols] += skip * (device_on[cols] - hist_device_on[lag_slots[rows, repeat], cols])
+            t[cols] += skip * span
+            cycle[cols] += skip * (rows + 1)
+            hist_p[:, cols] = -1.0  # history no longer lines up with the cycle count
+
+            hist_p[slots, starts], hist_on[slots, starts] = p[starts], on[starts]
+            hist_above[slots, starts], hist_device_on[slots, starts] = above[starts], device_on[starts]
+            for i in np.intersect1d(starts, list(trace)) if trace else ():
+                cycle_points[i][int(cycle[i])] = len(points[i]) - 1
+
+        active = idx[t[idx] < duration_s]
+
+    return {
+        "peak_osig": peak * 16,
+        "seconds_above_hatch": above,
+        "seconds_device_on": device_on,
+        "final_osig": p * 16,
+        "events": events,
+        "breakpoints": {i: tuple(np.array(col) for col in zip(*pts)) for i, pts in points.items()},
+    }
+
+
+def dense_trace(scenarios, breakpoints, i, step_s=1.0):
+    """Pressure (osig) of scenario ``i`` on a ``step_s`` grid from its breakpoints."""
+    times, pressures, on, q = breakpoints
+    grid = np.arange(0.0, times[-1] + step_s / 2, step_s)
+    seg = np.clip(np.searchsorted(times, grid, side="right") - 1, 0, len(times) - 1)
+    p = _advance(pressures[seg], grid - times[seg], q[seg], scenarios.k[i], scenarios.c[i], on[seg])
+    return grid, p * 16
@@ -0,0 +1,327 @@
+"""Migrate legacy CVS Excel workbooks into project files.
+
+    python workbooks.py archive/ report.csv --projects migrated/ --workers 8
+
+Every ``*.xlsx``/``*.xlsm`` under ``archive/`` is opened read-only with cached
+values (``openpyxl``, ``read_only=True, data_only=True``), and the cells
+named in a cell map are read into the app's inputs: the Tank Layout and Main
+Process values, and each header's block of developed lengths, fitting counts,
+knockout diameters and specialty-valve Cv. The inputs are recomputed with
+``engine.evaluate_sites`` and compared with the results the workbook itself
+shows; any result that differs by more than ``--rtol`` is flagged.
+
+``report.csv`` has one row per workbook: ``status`` (``ok``, ``mismatch`` or
+``error``), the names of the disagreeing results, the recomputed results and
+the workbook's own values (``xl_`` prefix). With ``--projects`` each workbook
+is also saved as a ``*.cvs.json`` project, so ``batch.py`` and the app can
+use the migrated archive directly.
+
+``DEFAULT_CELL_MAP`` is the layout of the current workbook revision; pass a
+JSON file of the same shape with ``--cell-map`` for other revisions::
+
+    {"inputs": {"oil_production": "Main Process!C4", ...},
+     "headers": {"vent1": "MAIN TANK VENT!C6", ...},
+     "results": {"total_ppivfr": "Summary of Results!C7", ...},
+     "ui": {"cd_model": "Flare1!C4"}}
+
+A header address is the top-left cell of its block: one row per
+``projects.HEADER_FIELDS`` field, one column per pipe size (1.5" to 12").
+Workbooks are handled on a process pool and the report is written in input
+order as results arrive.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import engine
+import projects
+
+SUFFIXES = (".xlsx", ".xlsm")
+RTOL = 1e-3
+# Results below this are compared as equal to zero (rounding in the sheet).
+ATOL = 1e-6
+
+DEFAULT_CELL_MAP = {
+    "inputs": {
+        "oil_tank_qty": "Tank Layout!C4",
+        "oil_tank_size": "Tank Layout!C5",
+        "oil_tank_rating": "Tank Layout!C6",
+        "water_tank_qty": "Tank Layout!F4",
+        "water_tank_size": "Tank Layout!F5",
+        "water_tank_rating": "Tank Layout!F6",
+        "thief_prv_input": "Tank Layout!C8",
+        "leaking_safety": "Tank Layout!F8",
+        "oil_production": "Main Process!C4",
+        "oil_pressure": "Main Process!C5",
+        "surge_percent": "Main Process!C6",
+        "promax_flash": "Main Process!C7",
+        "promax_mw": "Main Process!C8",
+        "water_production": "Main Process!F4",
+        "water_pressure": "Main Process!F5",
+        "water_surge_percent": "Main Process!F6",
+        "promax_water_flash": "Main Process!F7",
+        "promax_water_mw": "Main Process!F8",
+        "am_liq_flow": "Add to Main Process!C4",
+        "am_bp_pres": "Add to Main Process!C5",
+        "am_src_drw_tk": "Add to Main Process!C6",
+        "cd_capacity": "Flare1!C5",
+        "cd_turn_on": "Flare1!C6",
+        "cd_turn_off": "Flare1!C7",
+    },
+    "headers": {
+        "vent1": "MAIN TANK VENT!C6",
+        "vent2": "MAIN TANK VENT HEADER2!C6",
+        "flare": "FlareVent!C6",
+        "flare1": "Flare1!C12",
+    },
+    "results": {
+        "oil_ppivfr": "Summary of Results!C4",
+        "water_ppivfr": "Summary of Results!C5",
+        "other_ppivfr": "Summary of Results!C6",
+        "total_ppivfr": "Summary of Results!C7",
+        "total_thermal_ppivfr": "Summary of Results!C8",
+        "design_pressure": "Summary of Results!C10",
+        "vent1_capacity": "MAIN TANK VENT!C34",
+        "vent2_capacity": "MAIN TANK VENT HEADER2!C34",
+        "flare_capacity": "FlareVent!C34",
+        "flare1_capacity": "Flare1!C40",
+        "flare1_red_capacity": "Flare1!C42",
+    },
+    "ui": {
+        "cd_model": "Flare1!C4",
+        "tank_notes": "Tank Layout!B11",
+    },
+}
+
+RESULT_NAMES = list(engine.evaluate_sites({}, 1))
+TRUE_TEXT = {"true", "yes", "y", "x", "1"}
+
+
+def _require_openpyxl():
+    try:
+        import openpyxl
+    except ImportError:
+        sys.exit("Reading Excel workbooks requires openpyxl (pip install openpyxl).")
+    return openpyxl
+
+
+def load_cell_map(path=None):
+    if path is None:
+        return DEFAULT_CELL_MAP
+    with open(path) as f:
+        return json.load(f)
+
+
+def split_address(address):
+    """``"Sheet!C6"`` -> ``("Sheet", row, column)``, 1-based."""
+    from openpyxl.utils.cell import coordinate_from_string, column_index_from_string
+
+    sheet, _, cell = address.rpartition("!")
+    letters, row = coordinate_from_string(cell)
+    return sheet, row, column_index_from_string(letters)
+
+
+def _wanted_cells(cell_map):
+    """Every (sheet, row, column) the map reads."""
+    cells = set()
+    for section in ("inputs", "results", "ui"):
+        cells.update(split_address(a) for a in cell_map.get(section, {}).values())
+    for address in cell_map.get("headers", {}).values():
+        sheet, row, col = split_address(address)
+        cells.update((sheet, row + i, col + j)
+                     for i in range(len(projects.HEADER_FIELDS)) for j in range(engine.N_SIZES))
+    return cells
+
+
+def read_cells(path, cells):
+    """Values of ``cells`` from a workbook, reading each sheet in one streaming pass.
+
+    Read-only workbooks can't seek to a cell, so each sheet is scanned once
+    over the bounding box of the cells wanted from it. Missing sheets or
+    cells read as None.
+    """
+    openpyxl = _require_openpyxl()
+    by_sheet = {}
+    for sheet, row, col in cells:
+        by_sheet.setdefault(sheet, []).append((row, col))
+    values = {}
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet, wanted in by_sheet.items():
+            if sheet not in wb.sheetnames:
+                continue
+            rows = [r for r, _ in wanted]
+            cols = [c for _, c in wanted]
+            min_row, min_col = min(rows), min(cols)
+            block = wb[sheet].iter_rows(min_row=min_row, max_row=max(rows), min_col=min_col,
+                                        max_col=max(cols), values_only=True)
+            keep = set(wanted)
+            for r, row_values in enumerate(block, start=min_row):
+                for c, value in enumerate(row_values, start=min_col):
+                    if (r, c) in keep and value is not None:
+                        values[(sheet, r, c)] = value
+    finally:
+        wb.close()
+    return values
+
+
+def _number(value):
+    """A cell as a float: NaN for blanks, text that isn't a number, and Excel errors."""
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).strip().replace(",", ""))
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _flag(value):
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_TEXT
+    return bool(value) and not (isinstance(value, float) and math.isnan(value))
+
+
+def workbook_project(path, cell_map=DEFAULT_CELL_MAP):
+    """Read one workbook; returns ``(inputs, headers, ui, workbook_results)``."""
+    cells = read_cells(path, _wanted_cells(cell_map))
+
+    def cell(address):
+        return cells.get(split_address(address))
+
+    inputs = dict(engine.SITE_DEFAULTS)
+    for name, address in cell_map.get("inputs", {}).items():
+        if name not in inputs:
+            continue
+        value = cell(address)
+        if name == "am_src_drw_tk":
+            inputs[name] = _flag(value)
+        elif name.startswith("promax_"):
+            # Blank PROMAX cells mean "not given", as in the app.
+            inputs[name] = _number(value) if value is not None else math.nan
+        elif value is not None and not math.isnan(_number(value)):
+            inputs[name] = type(engine.SITE_DEFAULTS[name])(_number(value))
+
+    headers = {}
+    for header, address in cell_map.get("headers", {}).items():
+        sheet, row, col = split_address(address)
+        grid = np.array([[_number(cells.get((sheet, row + i, col + j), 0.0)) for j in range(engine.N_SIZES)]
+                         for i in range(len(projects.HEADER_FIELDS))])
+        headers[header] = np.nan_to_num(grid)
+
+    ui = {key: str(cell(address)) for key, address in cell_map.get("ui", {}).items() if cell(address) is not None}
+    results = {name: _number(cell(address)) for name, address in cell_map.get("results", {}).items()}
+    return inputs, headers, ui, results
+
+
+def compare_results(recomputed, workbook, rtol=RTOL, atol=ATOL):
+    """Names of results where the workbook disagrees with the recomputed value."""
+    return [name for name, expected in workbook.items()
+            if name in recomputed and not math.isnan(expected)
+            and not math.isclose(recomputed[name], expected, rel_tol=rtol, abs_tol=atol)]
+
+
+def site_id(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def migrate_workbook(path, cell_map=DEFAULT_CELL_MAP, project_dir=None, rtol=RTOL):
+    """Read, recompute and compare one workbook; returns its report row."""
+    row = {"site_id": site_id(path), "source": path}
+    try:
+        inputs, headers, ui, workbook = workbook_project(path, cell_map)
+        results = engine.evaluate_sites({k: np.atleast_1d(v) for k, v in projects.site_row(inputs, headers).items()}, 1)
+        recomputed = {name: float(values[0]) for name, values in results.items()}
+        if project_dir is not None:
+            project = projects.new_project(inputs, headers, ui)
+            projects.save(os.path.join(project_dir, row["site_id"] + projects.SUFFIX), project)
+    except Exception as exc:  # a broken workbook is reported, not fatal to the run
+        return {**row, "status": "error", "mismatches": "", "error": f"{type(exc).__name__}: {exc}"}
+    mismatches = compare_results(recomputed, workbook, rtol)
+    row.update(status="mismatch" if mismatches else "ok", mismatches=" ".join(mismatches), error="")
+    row.update(recomputed)
+    row.update({f"xl_{name}": value for name, value in workbook.items()})
+    return row
+
+
+def workbook_paths(path):
+    """Workbooks at ``path``: the file itself, or every workbook under a directory."""
+    if not os.path.isdir(path):
+        return [path]
+    found = []
+    for root, _, names in os.walk(path):
+        # Skip Excel's "~$" lock files.
+        found.extend(os.path.join(root, name) for name in names
+                     if name.lower().endswith(SUFFIXES) and not name.startswith("~$"))
+    return sorted(found)
+
+
+def report_columns(cell_map):
+    return (["site_id", "source", "status", "mismatches", "error"] + RESULT_NAMES
+            + [f"xl_{name}" for name in cell_map.get("results", {})])
+
+
+def run(input_path, report_path, project_dir=None, cell_map=DEFAULT_CELL_MAP, workers=None, rtol=RTOL,
+        progress=None):
+    """Migrate every workbook at ``input_path``; returns a ``{status: count}`` dict."""
+    _require_openpyxl()
+    paths = workbook_paths(input_path)
+    workers = workers or os.cpu_count() or 1
+    if project_dir is not None:
+        os.makedirs(project_dir, exist_ok=True)
+    counts = {"ok": 0, "mismatch": 0, "error": 0}
+    start = time.perf_counter()
+    with open(report_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, report_columns(cell_map), restval="")
+        writer.writeheader()
+        args = (paths, [cell_map] * len(paths), [project_dir] * len(paths), [rtol] * len(paths))
+        if workers == 1:
+            rows = map(migrate_workbook, *args)
+            pool = None
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            # Small chunks keep workers busy without holding the archive in memory.
+            rows = pool.map(migrate_workbook, *args, chunksize=8)
+        try:
+            for row in rows:
+                writer.writerow(row)
+                counts[row["status"]] += 1
+                if progress:
+                    progress(sum(counts.values()), len(paths), time.perf_counter() - start)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate legacy CVS Excel workbooks and check their results.")
+    parser.add_argument("input", help="workbook, or directory searched recursively for .xlsx/.xlsm")
+    parser.add_argument("report", help="report CSV, one row per workbook")
+    parser.add_argument("--projects", help="directory to write one project file per workbook")
+    parser.add_argument("--cell-map", help="JSON cell map for a different workbook revision")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--rtol", type=float, default=RTOL, help=f"relative tolerance (default: {RTOL})")
+    args = parser.parse_args(argv)
+
+    def progress(done, total, elapsed):
+        rate = done / elapsed if elapsed else 0.0
+        print(f"\r{done:,}/{total:,} workbooks  {rate:,.1f}/s", end="", file=sys.stderr, flush=True)
+
+    counts = run(args.input, args.report, args.projects, load_cell_map(args.cell_map), args.workers, args.rtol,
+                 progress)
+    print(f"\n{counts['ok']:,} ok, {counts['mismatch']:,} mismatched, {counts['error']:,} failed -> {args.report}",
+          file=sys.stderr)
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())